@@ -1,11 +1,9 @@
-from src.npc import NPC
-from src.ai_call import AIModel, Message
+from src.npc import load_persona
+from src.ai_call import AIModel, ConversationMemory, Message, Purpose, ResponseCache
 
 
 def main():  
-    context = ""
-
-    def do_stuff(msg: str, context: str) -> str:
+    def do_stuff(msg: str):
       """
       This function will be called after the player hits enter.
       Replace this code with whatever action you want to perform.
@@ -14,35 +12,32 @@ def main():
           role='user',
           content=msg,
       )
-      stream = ai_model.chat([system_message, user_message])
+      stream = ai_model.chat(memory.messages(user_message), purpose=Purpose.roleplay)
 
+      reply = ""
       for chunk in stream:
           part = chunk['message']['content']
-          context += part
+          reply += part
           print(part, end='', flush=True)
+      print()
 
-      return context
+      memory.add(user_message, Message(role='assistant', content=reply))
 
-    ai_model = AIModel()
+    ai_model = AIModel(cache=ResponseCache(path='.cache/responses'))
     print("Loading NPC")
-    npc_data = NPC.from_file('game/marlena_graves.json')
+    persona_data = load_persona('game/marlena_graves.json')
+    print(f"Persona is about {persona_data.estimated_tokens} tokens")
 
-    system_message = Message(
-    role='user',
-    content=f"""
+    persona = f"""
 You are roleplaying as the NPC Marlene Graves. Here is her profile:
 
-{npc_data.model_dump_json()}
+{persona_data.text}
 
-Based on this information, describe what happens when the player walks into Marlene's shop. Provide details about her appearance, the shop, her initial attitude toward the player, and anything she might say or do.
+Stay in character and answer as Marlene.
 """
-)
-    stream = ai_model.chat([system_message])
+    memory = ConversationMemory(ai_model, persona)
 
-    for chunk in stream:
-        part = chunk['message']['content']
-        context += part
-        print(part, end='', flush=True)
+    do_stuff("I walk into Marlene's shop. Describe her appearance, the shop, her initial attitude toward me, and anything she might say or do.")
 
     print("------------------------------------------------------") 
     print("Press Enter to perform an action. Type 'quit' to exit.")
@@ -54,13 +49,13 @@ Based on this information, describe what happens when the player walks into Marl
         if user_input.lower() == "quit":
             print("Exiting program. Goodbye!")
             break
-        # Check if the user wants to quit
+        # Show what the NPC remembers
         if user_input.lower() == "context":
-            print(context)
+            print(memory.transcript())
             continue
         
         # Call the do_stuff function
-        context = do_stuff(user_input, context)
+        do_stuff(user_input)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
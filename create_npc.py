@@ -1,14 +1,32 @@
-import json
-from ollama import chat
+import argparse
+import asyncio
 
-from src.ai_call import AIModel
-from src.npc import NPC
+from src.ai_call import AsyncAIModel
+from src.npc import generate_npcs
 
-# Step 1: Read the NPC JSON from file
-with open('prompts/npc_prompt.txt', 'r') as file:
-    npc_data = file.read() 
 
-npc_data = NPC.create(npc_data, AIModel())
-file_name = f'game/{npc_data.name.lower().replace(" ", "_")}.json'
-npc_data.to_file(file_name)
-print(npc_data.model_dump_json())
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(description="Generate NPCs into game/. Set OLLAMA_HOSTS to a comma separated list of URLs to spread the generations over several hosts.")
+    parser.add_argument("--count", type=int, default=1, help="Number of NPCs to generate")
+    parser.add_argument("--theme", action="append", default=[], help="Theme for the NPCs; repeat to cycle through several")
+    parser.add_argument("--concurrency", type=int, default=4, help="Generations in flight at once, across all hosts")
+    parser.add_argument("--directory", default="game", help="Where the NPC files are written")
+    args = parser.parse_args()
+
+    with open('prompts/npc_prompt.txt', 'r') as file:
+        prompt = file.read()
+
+    ai_model = AsyncAIModel(max_concurrency=args.concurrency)
+    result = asyncio.run(generate_npcs(args.count, args.theme, ai_model, prompt, directory=args.directory))
+    for path in result.created:
+        print(path)
+    if result.resumed:
+        print(f"{result.resumed} NPCs were already generated by an earlier run.")
+    for slot, error in result.failed.items():
+        print(f"NPC {slot} failed: {error}")
+    if result.failed:
+        print("Run the same command again to retry the failed NPCs.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,14 @@
 import json
-from ollama import chat, ChatResponse
+from ollama import ChatResponse
 from pydantic import BaseModel
 
+from src.ai_call import AIModel, Message
+
 def default_chat(system_prompt: str, user_prompt: str) -> str:
-    response: ChatResponse = chat(
-            model='llama3.2',
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ]
-        )
+    response: ChatResponse = AIModel().response([
+        Message(role="system", content=system_prompt),
+        Message(role="user", content=user_prompt)
+    ])
     return response.message.content
 
 
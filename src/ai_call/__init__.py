@@ -1 +1,8 @@
 from .ai import *
+from .cache import *
+from .pool import *
+from .router import *
+from .stream_parser import *
+from .memory import *
+from .prompt import *
+from .metrics import *
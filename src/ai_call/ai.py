@@ -1,32 +1,249 @@
 """
-We only use llama3.2 model for now. We can add more models in the future.
+Chat models backed by Ollama. Which model and options a call uses is decided by
+the ModelRouter from the purpose of the call, defaulting to llama3.2.
 """
 
-from typing import Iterator
-from ollama import ChatResponse, chat
+import asyncio
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, TypeVar
+from ollama import ChatResponse
 from pydantic import BaseModel
 
+from .cache import ResponseCache
+from .metrics import CallMetrics, MetricsRegistry, default_registry
+from .pool import AsyncClientPool, ClientPool, default_pool, env_hosts
+from .router import ModelPolicy, ModelRouter, Purpose
+from .stream_parser import StreamValidationError, aparse_stream, parse_stream
+
+T = TypeVar("T", bound=BaseModel)
+
 class Message(BaseModel):
     role: str
     content: str
 
 
+def _purpose(purpose: Optional[Purpose]) -> Optional[str]:
+    return Purpose(purpose).value if purpose is not None else None
+
+
+def _on_final(stream: Iterator[ChatResponse], callback: Callable[[ChatResponse], None]) -> Iterator[ChatResponse]:
+    """
+    Pass a stream through, handing its final chunk to callback.
+    """
+    try:
+        for chunk in stream:
+            if chunk.done:
+                callback(chunk)
+            yield chunk
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+
+
 class AIModel:
-    def __init__(self, model:str='llama3.2'):
+    def __init__(self, model:str='llama3.2', cache: Optional[ResponseCache] = None, pool: Optional[ClientPool] = None, router: Optional[ModelRouter] = None, metrics: Optional[MetricsRegistry] = None):
         self.model = model
+        self.cache = cache
+        self.pool = pool if pool is not None else default_pool()
+        self.router = router if router is not None else ModelRouter()
+        self.metrics = metrics if metrics is not None else default_registry()
 
-    def chat(self, messages: list[Message]) -> Iterator[ChatResponse]:
-        return self._call(messages, stream=True)
-    
-    def response(self, messages: list[Message]) -> ChatResponse:
-        return self._call(messages, stream=False)
+    def chat(self, messages: list[Message], purpose: Optional[Purpose] = None, format: Optional[dict[str, Any]] = None) -> Iterator[ChatResponse]:
+        return self._call(messages, stream=True, purpose=purpose, format=format)
     
-    def _call(self, messages: list[Message], stream: bool) -> ChatResponse | Iterator[ChatResponse]:
+    def response(self, messages: list[Message], purpose: Optional[Purpose] = None) -> ChatResponse:
+        return self._call(messages, stream=False, purpose=purpose)
+
+    def structured(
+        self,
+        messages: list[Message],
+        response_model: type[T],
+        purpose: Optional[Purpose] = None,
+        max_retries: int = 2,
+        on_response: Optional[Callable[[ChatResponse], None]] = None
+    ) -> T:
+        """
+        Generate a response_model instance. The model's JSON schema is passed to
+        Ollama as the format constraint, so the prompt does not need to describe
+        it, and the stream is validated as it arrives. on_response is given the
+        final chunk, with the call's metadata, of every attempt that gets that far.
+        """
+        schema = response_model.model_json_schema()
+        error = None
+        for attempt in range(max_retries):
+            stream = self._call(messages, stream=True, purpose=purpose, format=schema)
+            if on_response is not None:
+                stream = _on_final(stream, on_response)
+            try:
+                result = parse_stream(stream, response_model)
+            except StreamValidationError as e:
+                error = e
+                continue
+            self.record_attempts(purpose, attempt + 1, succeeded=True)
+            return result
+        self.record_attempts(purpose, max_retries, succeeded=False)
+        raise error
+
+    def record_attempts(self, purpose: Optional[Purpose], attempts: int, succeeded: bool):
+        self.metrics.record_attempts(_purpose(purpose), self.router.route(purpose, self.model).model, attempts, succeeded)
+
+    def _call(self, messages: list[Message], stream: bool, purpose: Optional[Purpose] = None, format: Optional[dict[str, Any]] = None) -> ChatResponse | Iterator[ChatResponse]:
+        messages = [m.model_dump() for m in messages]
+        policy = self.router.route(purpose, self.model)
+        call = CallMetrics(_purpose(purpose), policy.model, stream)
+
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(policy.model, messages, options=policy.options or None, format=format)
+            cached = self.cache.get(key)
+            if cached is not None:
+                call.cache_hit = True
+                self.metrics.finish(call)
+                return self.cache.replay(cached) if stream else cached
+
+        try:
+            result = self.pool.chat(
+                model=policy.model,
+                messages=messages,
+                stream=stream,
+                format=format,
+                options=policy.options or None,
+                keep_alive=policy.keep_alive,
+            )
+        except Exception:
+            call.failed = True
+            self.metrics.finish(call)
+            raise
+
+        if stream:
+            if key is not None:
+                result = self.cache.record(key, result)
+            return self.metrics.track(call, result)
+        call.response = result
+        self.metrics.finish(call)
+        if key is not None:
+            self.cache.put(key, result)
+        return result
+
+
+class AsyncAIModel:
+    """
+    Coroutine version of AIModel. At most max_concurrency requests are in flight
+    at once, across all hosts; the rest wait on the semaphore. Calls are spread
+    over the hosts in OLLAMA_HOSTS like AIModel's, unless a host or a pool is
+    given. Use one instance per event loop.
+    """
+    def __init__(self, model:str='llama3.2', max_concurrency: int = 4, cache: Optional[ResponseCache] = None, host: Optional[str] = None, router: Optional[ModelRouter] = None, metrics: Optional[MetricsRegistry] = None, pool: Optional[AsyncClientPool] = None):
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency must be greater than zero.")
+        self.model = model
+        self.cache = cache
+        if pool is None:
+            pool = AsyncClientPool([host] if host else env_hosts())
+        self.pool = pool
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.router = router if router is not None else ModelRouter()
+        self.metrics = metrics if metrics is not None else default_registry()
+
+    async def chat(self, messages: list[Message], purpose: Optional[Purpose] = None, format: Optional[dict[str, Any]] = None) -> AsyncIterator[ChatResponse]:
+        """
+        Stream a response. The concurrency slot is held until the stream is exhausted.
+        """
+        messages = [m.model_dump() for m in messages]
+        policy = self.router.route(purpose, self.model)
+        call = CallMetrics(_purpose(purpose), policy.model, stream=True)
+
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(policy.model, messages, options=policy.options or None, format=format)
+            cached = self.cache.get(key)
+            if cached is not None:
+                call.cache_hit = True
+                self.metrics.finish(call)
+                async for chunk in self.cache.areplay(cached):
+                    yield chunk
+                return
+
+        async with self.semaphore:
+            call.sent()
+            try:
+                stream = await self._send(policy, messages, stream=True, format=format)
+            except Exception:
+                call.failed = True
+                self.metrics.finish(call)
+                raise
+            if key is not None:
+                stream = self.cache.arecord(key, stream)
+            tracked = self.metrics.atrack(call, stream)
+            try:
+                async for chunk in tracked:
+                    yield chunk
+            finally:
+                # Record the call now, not when the abandoned generator is collected.
+                await tracked.aclose()
+
+    async def response(self, messages: list[Message], purpose: Optional[Purpose] = None) -> ChatResponse:
         messages = [m.model_dump() for m in messages]
+        policy = self.router.route(purpose, self.model)
+        call = CallMetrics(_purpose(purpose), policy.model, stream=False)
+
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(policy.model, messages, options=policy.options or None)
+            cached = self.cache.get(key)
+            if cached is not None:
+                call.cache_hit = True
+                self.metrics.finish(call)
+                return cached
+
+        async with self.semaphore:
+            call.sent()
+            try:
+                result = await self._send(policy, messages, stream=False)
+            except Exception:
+                call.failed = True
+                self.metrics.finish(call)
+                raise
+        call.response = result
+        self.metrics.finish(call)
+
+        if key is not None:
+            self.cache.put(key, result)
+        return result
+
+    async def structured(self, messages: list[Message], response_model: type[T], purpose: Optional[Purpose] = None, max_retries: int = 2) -> T:
+        """
+        Coroutine version of AIModel.structured.
+        """
+        schema = response_model.model_json_schema()
+        error = None
+        for attempt in range(max_retries):
+            try:
+                result = await aparse_stream(self.chat(messages, purpose=purpose, format=schema), response_model)
+            except StreamValidationError as e:
+                error = e
+                continue
+            self.record_attempts(purpose, attempt + 1, succeeded=True)
+            return result
+        self.record_attempts(purpose, max_retries, succeeded=False)
+        raise error
+
+    def record_attempts(self, purpose: Optional[Purpose], attempts: int, succeeded: bool):
+        self.metrics.record_attempts(_purpose(purpose), self.router.route(purpose, self.model).model, attempts, succeeded)
+
+    async def gather_responses(self, batch: list[list[Message]], purpose: Optional[Purpose] = None) -> list[ChatResponse]:
+        """
+        Run one request per message list concurrently and return the responses in
+        the same order as the batch.
+        """
+        return await asyncio.gather(*(self.response(messages, purpose=purpose) for messages in batch))
 
-        stream = chat(
-           model='llama3.2',
+    async def _send(self, policy: ModelPolicy, messages: list[dict], stream: bool, format: Optional[dict[str, Any]] = None):
+        return await self.pool.chat(
+            model=policy.model,
             messages=messages,
             stream=stream,
+            format=format,
+            options=policy.options or None,
+            keep_alive=policy.keep_alive,
         )
-        return stream
\ No newline at end of file
@@ -0,0 +1,149 @@
+import asyncio
+from enum import Enum
+from unittest.mock import MagicMock
+
+import pytest
+from ollama import ChatResponse
+from pydantic import BaseModel
+
+from src.ai_call import AIModel, AsyncAIModel, Message, Purpose, StreamValidationError
+
+
+class Intent(str, Enum):
+    move = "move"
+    discuss = "discuss"
+    offtopic = "offtopic"
+
+
+def make_response(content: str, done: bool = True) -> ChatResponse:
+    return ChatResponse.model_validate({
+        "model": "llama3.2",
+        "done": done,
+        "message": {"role": "assistant", "content": content},
+    })
+
+
+class FakeAsyncClient:
+    """
+    Stands in for ollama.AsyncClient and records the peak number of calls in flight.
+    """
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.in_flight = 0
+        self.peak = 0
+        self.calls = 0
+
+    async def chat(self, model, messages, stream=False, **kwargs):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        content = messages[-1]["content"].upper()
+        if not stream:
+            return make_response(content)
+
+        async def chunks():
+            yield make_response(content[:1], done=False)
+            yield make_response(content[1:])
+        return chunks()
+
+
+def test_gather_responses_keeps_order_and_bounds_concurrency():
+    """
+    Test that gather_responses returns results in batch order and never exceeds max_concurrency.
+    """
+    async def run():
+        model = AsyncAIModel(max_concurrency=3)
+        model.pool.clients = [FakeAsyncClient()]
+        batch = [[Message(role="user", content=f"agent {i}")] for i in range(10)]
+        return model, await model.gather_responses(batch)
+
+    model, responses = asyncio.run(run())
+
+    assert [r.message.content for r in responses] == [f"AGENT {i}" for i in range(10)]
+    assert model.pool.clients[0].calls == 10
+    assert model.pool.clients[0].peak == 3
+
+
+def test_async_chat_streams():
+    """
+    Test that the async chat coroutine yields the streamed chunks.
+    """
+    async def run():
+        model = AsyncAIModel()
+        model.pool.clients = [FakeAsyncClient()]
+        return [chunk["message"]["content"] async for chunk in model.chat([Message(role="user", content="hello")])]
+
+    assert "".join(asyncio.run(run())) == "HELLO"
+
+
+class Verdict(BaseModel):
+    intent: Intent
+    square: int
+
+
+def stream_of(text: str):
+    yield make_response(text[:4], done=False)
+    yield make_response(text[4:])
+
+
+def test_structured_passes_schema_as_format():
+    """
+    Test that structured sends the model's JSON schema as the format and returns an instance.
+    """
+    pool = MagicMock()
+    pool.chat.return_value = stream_of('{"intent": "move", "square": 5}')
+    model = AIModel(pool=pool)
+
+    verdict = model.structured([Message(role="user", content="5")], Verdict, purpose=Purpose.intent)
+
+    assert verdict == Verdict(intent=Intent.move, square=5)
+    assert pool.chat.call_args.kwargs["format"] == Verdict.model_json_schema()
+    assert pool.chat.call_args.kwargs["stream"] is True
+
+
+def test_structured_retries_invalid_output():
+    """
+    Test that an invalid generation is retried without a delay.
+    """
+    pool = MagicMock()
+    pool.chat.side_effect = [stream_of('{"intent": "jump", "square": 5}'), stream_of('{"intent": "discuss", "square": 0}')]
+    model = AIModel(pool=pool)
+
+    verdict = model.structured([Message(role="user", content="?")], Verdict)
+
+    assert verdict.intent == Intent.discuss
+    assert pool.chat.call_count == 2
+
+
+def test_structured_gives_up():
+    """
+    Test that the last validation error is raised when every attempt fails.
+    """
+    pool = MagicMock()
+    pool.chat.side_effect = lambda **kwargs: stream_of('{"intent": "jump"}')
+    model = AIModel(pool=pool)
+
+    with pytest.raises(StreamValidationError):
+        model.structured([Message(role="user", content="?")], Verdict, max_retries=3)
+    assert pool.chat.call_count == 3
+
+
+def test_async_structured():
+    """
+    Test the coroutine version of structured.
+    """
+    class FakeClient:
+        async def chat(self, **kwargs):
+            async def chunks():
+                yield make_response('{"intent": "offtopic", ', done=False)
+                yield make_response('"square": 1}')
+            return chunks()
+
+    async def run():
+        model = AsyncAIModel()
+        model.pool.clients = [FakeClient()]
+        return await model.structured([Message(role="user", content="joke")], Verdict)
+
+    assert asyncio.run(run()).intent == Intent.offtopic
@@ -0,0 +1,221 @@
+"""
+Content-addressed cache for chat responses.
+
+Responses are keyed on a hash of the model name and the exact message list,
+so a byte-for-byte repeat of a prompt is answered without going to Ollama.
+The cache is shared between threads (the chat loop and the memory's summary
+worker), so every access to the entries holds a lock.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from ollama import ChatResponse
+
+
+class ResponseCache:
+    def __init__(self, max_entries: int = 256, ttl: Optional[float] = None, path: Optional[str] = None, max_disk_entries: int = 4096):
+        """
+        max_entries bounds the in-memory LRU, ttl (seconds) expires entries and
+        path, when given, keeps a copy of every entry on disk so it survives
+        restarts. The disk copy holds at most max_disk_entries files; the least
+        recently used are deleted first.
+        """
+        if max_entries <= 0:
+            raise ValueError("max_entries must be greater than zero.")
+        if max_disk_entries <= 0:
+            raise ValueError("max_disk_entries must be greater than zero.")
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.RLock()
+        self._disk_entries = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self._prune()
+
+    @staticmethod
+    def key(model: str, messages: list[dict], **params: Any) -> str:
+        """
+        Build the cache key for a call. Extra request parameters that change the
+        output (format, options, ...) are part of the key as well.
+        """
+        payload = {"model": model, "messages": messages}
+        payload.update({name: value for name, value in params.items() if value is not None})
+        encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[ChatResponse]:
+        """
+        Get a cached response, or None if it is missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._load(key)
+            if entry is None or self._expired(entry):
+                if entry is not None:
+                    self.invalidate(key)
+                self.misses += 1
+                return None
+
+            self._remember(key, entry)
+            self.hits += 1
+        return ChatResponse.model_validate(entry["response"])
+
+    def put(self, key: str, response: ChatResponse):
+        """
+        Store a complete (non-streamed) response.
+        """
+        entry = {"created": time.time(), "response": response.model_dump(mode="json")}
+        with self._lock:
+            self._remember(key, entry)
+            if self.path is None:
+                return
+            if not os.path.exists(self._file(key)):
+                self._disk_entries += 1
+            tmp_path = self._file(key) + ".tmp"
+            with open(tmp_path, "w") as file:
+                json.dump(entry, file)
+            os.replace(tmp_path, self._file(key))
+            if self._disk_entries > self.max_disk_entries:
+                self._prune()
+
+    def invalidate(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+            if self.path is not None and os.path.exists(self._file(key)):
+                os.remove(self._file(key))
+                self._disk_entries -= 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self.path is not None:
+                for name in os.listdir(self.path):
+                    if name.endswith(".json"):
+                        os.remove(os.path.join(self.path, name))
+                self._disk_entries = 0
+
+    def replay(self, response: ChatResponse, chunk_size: int = 64) -> Iterator[ChatResponse]:
+        """
+        Turn a cached response back into a stream of chunks, the last one carrying
+        the done flag and the timing metadata, just like a live Ollama stream.
+        """
+        data = response.model_dump()
+        content = data["message"]["content"] or ""
+        pieces = [content[i:i + chunk_size] for i in range(0, len(content), chunk_size)] or [""]
+        for piece in pieces[:-1]:
+            yield ChatResponse.model_validate({
+                "model": data["model"],
+                "created_at": data["created_at"],
+                "done": False,
+                "message": {"role": data["message"]["role"], "content": piece},
+            })
+        data["message"]["content"] = pieces[-1]
+        yield ChatResponse.model_validate(data)
+
+    def record(self, key: str, stream: Iterator[ChatResponse]) -> Iterator[ChatResponse]:
+        """
+        Pass a live stream through unchanged and cache the assembled response once
+        the final chunk has arrived. Streams that are abandoned early are not cached.
+        """
+        parts = []
+        try:
+            for chunk in stream:
+                parts.append(chunk["message"]["content"] or "")
+                if chunk.done:
+                    final = chunk.model_copy(deep=True)
+                    final.message.content = "".join(parts)
+                    self.put(key, final)
+                yield chunk
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+
+    async def areplay(self, response: ChatResponse, chunk_size: int = 64) -> AsyncIterator[ChatResponse]:
+        """
+        Async version of replay for AsyncAIModel.
+        """
+        for chunk in self.replay(response, chunk_size):
+            yield chunk
+
+    async def arecord(self, key: str, stream: AsyncIterator[ChatResponse]) -> AsyncIterator[ChatResponse]:
+        """
+        Async version of record for AsyncAIModel.
+        """
+        parts = []
+        try:
+            async for chunk in stream:
+                parts.append(chunk["message"]["content"] or "")
+                if chunk.done:
+                    final = chunk.model_copy(deep=True)
+                    final.message.content = "".join(parts)
+                    self.put(key, final)
+                yield chunk
+        finally:
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def _prune(self):
+        """
+        Delete expired files, then the least recently used ones until a tenth of
+        max_disk_entries is free, so pruning does not run on every put.
+        """
+        files = []
+        now = time.time()
+        for name in os.listdir(self.path):
+            if not name.endswith(".json"):
+                continue
+            file_path = os.path.join(self.path, name)
+            try:
+                modified = os.stat(file_path).st_mtime
+            except OSError:
+                continue
+            if self.ttl is not None and now - modified > self.ttl:
+                os.remove(file_path)
+            else:
+                files.append((modified, file_path))
+        files.sort()
+        excess = len(files) - self.max_disk_entries
+        if excess > 0:
+            excess += self.max_disk_entries // 10
+            for _, file_path in files[:excess]:
+                os.remove(file_path)
+            files = files[excess:]
+        self._disk_entries = len(files)
+
+    def _remember(self, key: str, entry: dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _expired(self, entry: dict) -> bool:
+        return self.ttl is not None and time.time() - entry["created"] > self.ttl
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.json")
+
+    def _load(self, key: str) -> Optional[dict]:
+        if self.path is None or not os.path.exists(self._file(key)):
+            return None
+        try:
+            with open(self._file(key), "r") as file:
+                entry = json.load(file)
+            # Reads count as use, so the least recently used files are pruned first.
+            os.utime(self._file(key))
+            return entry
+        except (OSError, json.JSONDecodeError):
+            return None
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import threading
+
+import pytest
+from unittest.mock import MagicMock, patch
+from ollama import ChatResponse
+
+from src.ai_call import AIModel, Message, ResponseCache
+
+
+def make_response(content: str, done: bool = True) -> ChatResponse:
+    return ChatResponse.model_validate({
+        "model": "llama3.2",
+        "done": done,
+        "eval_count": 7 if done else None,
+        "message": {"role": "assistant", "content": content},
+    })
+
+
+@pytest.fixture
+def messages():
+    return [Message(role="user", content="5")]
+
+
+def test_key_depends_on_model_and_messages():
+    """
+    Test that the key changes with the model and with the message content.
+    """
+    msgs = [{"role": "user", "content": "5"}]
+    assert ResponseCache.key("llama3.2", msgs) == ResponseCache.key("llama3.2", list(msgs))
+    assert ResponseCache.key("llama3.2", msgs) != ResponseCache.key("llama3.2:1b", msgs)
+    assert ResponseCache.key("llama3.2", msgs) != ResponseCache.key("llama3.2", [{"role": "user", "content": "6"}])
+
+
+def test_lru_eviction():
+    """
+    Test that the least recently used entry is evicted first.
+    """
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", make_response("A"))
+    cache.put("b", make_response("B"))
+    cache.get("a")
+    cache.put("c", make_response("C"))
+
+    assert cache.get("b") is None
+    assert cache.get("a").message.content == "A"
+    assert cache.get("c").message.content == "C"
+
+
+def test_ttl_expiry():
+    """
+    Test that entries older than the ttl are treated as misses.
+    """
+    cache = ResponseCache(ttl=10)
+    with patch("src.ai_call.cache.time.time", return_value=1000.0):
+        cache.put("a", make_response("A"))
+    with patch("src.ai_call.cache.time.time", return_value=1005.0):
+        assert cache.get("a") is not None
+    with patch("src.ai_call.cache.time.time", return_value=1011.0):
+        assert cache.get("a") is None
+
+
+def test_disk_backend_survives_restart(tmp_path):
+    """
+    Test that a new cache pointed at the same directory sees earlier entries.
+    """
+    ResponseCache(path=str(tmp_path)).put("a", make_response("A"))
+    assert ResponseCache(path=str(tmp_path)).get("a").message.content == "A"
+
+
+def test_response_is_cached(messages):
+    """
+    Test that a repeated non-streamed call is answered from the cache.
+    """
+    pool = MagicMock()
+    pool.chat.return_value = make_response("move")
+    model = AIModel(cache=ResponseCache(), pool=pool)
+    first = model.response(messages)
+    second = model.response(messages)
+
+    assert pool.chat.call_count == 1
+    assert first.message.content == second.message.content == "move"
+
+
+def test_stream_is_cached_and_replayed(messages):
+    """
+    Test that a completed stream is cached and replayed as a stream on the next call.
+    """
+    chunks = [make_response("mo", done=False), make_response("ve", done=False), make_response("")]
+    pool = MagicMock()
+    pool.chat.return_value = iter(chunks)
+    model = AIModel(cache=ResponseCache(), pool=pool)
+    live = "".join(chunk["message"]["content"] for chunk in model.chat(messages))
+    replayed = list(model.chat(messages))
+
+    assert pool.chat.call_count == 1
+    assert live == "move"
+    assert "".join(chunk["message"]["content"] for chunk in replayed) == "move"
+    assert replayed[-1].done
+    assert replayed[-1].eval_count == 7
+
+
+def test_abandoned_stream_is_not_cached(messages):
+    """
+    Test that a stream the caller stops reading early is not cached.
+    """
+    cache = ResponseCache()
+    chunks = [make_response("mo", done=False), make_response("ve", done=False), make_response("")]
+    pool = MagicMock()
+    pool.chat.return_value = iter(chunks)
+    model = AIModel(cache=cache, pool=pool)
+    next(iter(model.chat(messages)))
+
+    assert cache.get(cache.key("llama3.2", [m.model_dump() for m in messages])) is None
+
+
+def test_disk_backend_is_bounded(tmp_path):
+    """
+    Test that the disk copy never grows past max_disk_entries and keeps the recently used files.
+    """
+    cache = ResponseCache(path=str(tmp_path), max_disk_entries=10)
+    for i in range(10):
+        cache.put(f"k{i}", make_response(str(i)))
+        os.utime(tmp_path / f"k{i}.json", (1000 + i, 1000 + i))
+    os.utime(tmp_path / "k0.json", (2000, 2000))
+    cache.put("k10", make_response("10"))
+
+    names = {p.name for p in tmp_path.iterdir()}
+    assert len(names) <= 10
+    assert "k0.json" in names and "k10.json" in names
+    assert "k1.json" not in names
+
+    ResponseCache(path=str(tmp_path), max_disk_entries=5)
+    assert len(os.listdir(tmp_path)) <= 5
+
+
+def test_expired_file_is_deleted_on_read(tmp_path):
+    """
+    Test that reading an expired entry from disk removes its file.
+    """
+    with patch("src.ai_call.cache.time.time", return_value=1000.0):
+        ResponseCache(path=str(tmp_path), ttl=10).put("a", make_response("A"))
+    with patch("src.ai_call.cache.time.time", return_value=1011.0):
+        assert ResponseCache(path=str(tmp_path), ttl=10).get("a") is None
+    assert not (tmp_path / "a.json").exists()
+
+
+def test_cache_is_thread_safe():
+    """
+    Test that concurrent puts and gets keep the LRU within its bound.
+    """
+    cache = ResponseCache(max_entries=8)
+    response = make_response("A")
+
+    def work(offset):
+        for i in range(500):
+            cache.put(f"{offset}-{i}", response)
+            cache.get(f"{offset}-{i - 1}")
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache._entries) == 8
+
+
+def test_arecord_closes_the_upstream_stream():
+    """
+    Test that abandoning a recorded async stream closes the stream it wraps.
+    """
+    closed = []
+
+    async def upstream():
+        try:
+            yield make_response("mo", done=False)
+            yield make_response("ve")
+        finally:
+            closed.append(True)
+
+    async def run():
+        recorded = ResponseCache().arecord("k", upstream())
+        await recorded.__anext__()
+        await recorded.aclose()
+
+    asyncio.run(run())
+    assert closed == [True]
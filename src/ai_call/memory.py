@@ -0,0 +1,177 @@
+"""
+Bounded conversation memory for chat loops.
+
+The prompt sent each turn is the pinned persona, a rolling summary of older
+dialogue and the most recent turns, kept under a token budget. Turns that fall
+out of the window are folded into the summary by the LLM, so long sessions
+keep a constant prompt size without forgetting what was said.
+"""
+
+import logging
+import threading
+from collections import deque
+from typing import Optional
+
+from .ai import AIModel, Message
+from .router import Purpose
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count (about four characters per token for English text).
+    """
+    return (len(text) + 3) // 4
+
+
+class ConversationMemory:
+    summary_prompt = """
+You keep the running summary of a roleplay conversation. Merge the new dialogue into the summary.
+Keep names, promises, items, and how the character feels about the player. Use at most {words} words.
+
+Summary so far:
+{summary}
+
+New dialogue:
+{dialogue}
+
+Return only the updated summary.
+"""
+
+    def __init__(self, ai_model: AIModel, persona: str, token_budget: int = 2048, max_turns: int = 12, summary_words: int = 150, background: bool = True):
+        """
+        persona is pinned as the system message. max_turns bounds the ring buffer of
+        recent messages; token_budget bounds the whole prompt. With background set,
+        summaries are written on a worker thread while the player is typing.
+        """
+        self.ai_model = ai_model
+        self.persona = persona
+        self.token_budget = token_budget
+        self.summary_words = summary_words
+        self.background = background
+        self.summary = ""
+        self.turns: deque[Message] = deque(maxlen=max_turns)
+        self._evicted: list[Message] = []
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def system_message(self) -> Message:
+        content = self.persona
+        if self.summary:
+            content += f"\n\nEarlier in this conversation:\n{self.summary}"
+        return Message(role='system', content=content)
+
+    def messages(self, user_message: Message) -> list[Message]:
+        """
+        The prompt for the next turn: persona and summary, the recent turns that fit
+        the budget, then the new user message. Turns evicted to make room are
+        summarized straight away rather than left for the next add.
+        """
+        self.wait()
+        with self._lock:
+            self._fit(estimate_tokens(user_message.content))
+            messages = [self.system_message(), *self.turns, user_message]
+        self._schedule()
+        return messages
+
+    def add(self, *messages: Message):
+        """
+        Record finished messages (the player's and the NPC's). Pass a whole turn at
+        once so its evictions are folded into the summary by a single LLM call.
+        Never blocks on a summary that is being written; new evictions wait and are
+        merged into the next one.
+        """
+        with self._lock:
+            for message in messages:
+                if len(self.turns) == self.turns.maxlen:
+                    self._evicted.append(self.turns[0])
+                self.turns.append(message)
+            self._fit(0)
+        self._schedule()
+
+    def wait(self):
+        """
+        Block until the background summaries, including any queued behind the
+        running one, have finished.
+        """
+        worker = self._worker
+        if worker is not None:
+            worker.join()
+
+    def prompt_tokens(self) -> int:
+        with self._lock:
+            return estimate_tokens(self.system_message().content) + sum(estimate_tokens(m.content) for m in self.turns)
+
+    def transcript(self) -> str:
+        """
+        What the memory currently holds, for display.
+        """
+        with self._lock:
+            lines = [f"[summary] {self.summary}"] if self.summary else []
+            lines += [f"[{m.role}] {m.content}" for m in self.turns]
+        return "\n".join(lines)
+
+    def _fit(self, reserve: int):
+        """
+        Evict the oldest turns until the prompt plus reserve fits the budget. The
+        newest turn is always kept.
+        """
+        used = estimate_tokens(self.system_message().content) + sum(estimate_tokens(m.content) for m in self.turns) + reserve
+        while used > self.token_budget and len(self.turns) > 1:
+            message = self.turns.popleft()
+            self._evicted.append(message)
+            used -= estimate_tokens(message.content)
+
+    def _schedule(self):
+        """
+        Start a summary of the evicted turns unless one is already running, in
+        which case it picks them up when it finishes.
+        """
+        if not self.background:
+            self._summarize()
+            return
+        with self._lock:
+            if not self._evicted or self._worker is not None:
+                return
+            self._worker = threading.Thread(target=self._drain, daemon=True)
+            self._worker.start()
+
+    def _drain(self):
+        try:
+            while True:
+                with self._lock:
+                    if not self._evicted:
+                        self._worker = None
+                        return
+                if not self._summarize():
+                    # The turns are back in _evicted; the next add or prompt tries again.
+                    return
+        finally:
+            with self._lock:
+                if self._worker is threading.current_thread():
+                    self._worker = None
+
+    def _summarize(self) -> bool:
+        """
+        Fold the evicted turns into the summary. If the LLM call fails the turns
+        are put back to be tried again later and False is returned, so a summary
+        never aborts a turn of the conversation.
+        """
+        with self._lock:
+            evicted, self._evicted = self._evicted, []
+            summary = self.summary
+        if not evicted:
+            return True
+
+        dialogue = "\n".join(f"{m.role}: {m.content}" for m in evicted)
+        prompt = self.summary_prompt.format(words=self.summary_words, summary=summary or "(none)", dialogue=dialogue)
+        try:
+            response = self.ai_model.response([Message(role='user', content=prompt)], purpose=Purpose.summary)
+        except Exception as e:
+            logging.warning(f"Could not summarize {len(evicted)} turns, will retry: {e}")
+            with self._lock:
+                self._evicted[:0] = evicted
+            return False
+
+        with self._lock:
+            self.summary = response['message']['content'].strip()
+        return True
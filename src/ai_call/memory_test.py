@@ -0,0 +1,164 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from ollama import ChatResponse
+
+from src.ai_call import AIModel, ConversationMemory, Message, estimate_tokens
+
+
+def make_model() -> AIModel:
+    pool = MagicMock()
+    pool.chat.side_effect = lambda **kwargs: ChatResponse.model_validate({
+        "model": "llama3.2", "done": True,
+        "message": {"role": "assistant", "content": f"summary #{pool.chat.call_count}"},
+    })
+    return AIModel(pool=pool)
+
+
+def talk(memory: ConversationMemory, turns: int, size: int = 40):
+    for i in range(turns):
+        memory.add(Message(role="user", content=f"question {i} " + "x" * size))
+        memory.add(Message(role="assistant", content=f"answer {i} " + "y" * size))
+
+
+def test_recent_turns_are_sent_in_order():
+    """
+    Test that the prompt is persona, recent turns and the new message, in that order.
+    """
+    memory = ConversationMemory(make_model(), "You are Marlena.", background=False)
+    talk(memory, 2)
+
+    messages = memory.messages(Message(role="user", content="hello"))
+    assert messages[0] == Message(role="system", content="You are Marlena.")
+    assert [m.content.split()[:2] for m in messages[1:-1]] == [["question", "0"], ["answer", "0"], ["question", "1"], ["answer", "1"]]
+    assert messages[-1].content == "hello"
+
+
+def test_evicted_turns_are_summarized():
+    """
+    Test that turns pushed out of the ring buffer are folded into the summary.
+    """
+    model = make_model()
+    memory = ConversationMemory(model, "You are Marlena.", max_turns=4, background=False)
+    talk(memory, 3)
+
+    assert len(memory.turns) == 4
+    assert memory.summary.startswith("summary #")
+    assert model.pool.chat.call_args.kwargs["model"] == "llama3.2"
+    assert "question 0" in model.pool.chat.call_args_list[0].kwargs["messages"][0]["content"]
+    assert "Earlier in this conversation" in memory.system_message().content
+
+
+def test_prompt_size_stays_within_budget():
+    """
+    Test that the prompt stays under the token budget however long the session runs.
+    """
+    memory = ConversationMemory(make_model(), "You are Marlena.", token_budget=200, background=False)
+    sizes = []
+    for _ in range(30):
+        talk(memory, 1, size=120)
+        sizes.append(sum(estimate_tokens(m.content) for m in memory.messages(Message(role="user", content="next"))))
+
+    assert max(sizes) <= 200
+    assert sizes[-1] == sizes[-10]
+
+
+def test_background_summary():
+    """
+    Test that summaries written on the worker thread are picked up before the next prompt.
+    """
+    model = make_model()
+    memory = ConversationMemory(model, "You are Marlena.", max_turns=2)
+    talk(memory, 3)
+
+    memory.messages(Message(role="user", content="next"))
+    assert memory.summary.startswith("summary #")
+    assert all(call.kwargs["options"]["num_predict"] == 320 for call in model.pool.chat.call_args_list)
+
+
+def test_one_summary_per_turn():
+    """
+    Test that a turn added in one call is summarized by a single LLM call.
+    """
+    model = make_model()
+    memory = ConversationMemory(model, "You are Marlena.", max_turns=2, background=False)
+    for i in range(3):
+        memory.add(Message(role="user", content=f"question {i}"), Message(role="assistant", content=f"answer {i}"))
+
+    assert model.pool.chat.call_count == 2
+    assert "question 1" in model.pool.chat.call_args.kwargs["messages"][0]["content"]
+
+
+def test_add_does_not_wait_for_a_running_summary():
+    """
+    Test that add returns while a summary is being written and that the turns it
+    evicts are merged into the next summary.
+    """
+    model = make_model()
+    release = threading.Event()
+    respond = model.pool.chat.side_effect
+    model.pool.chat.side_effect = lambda **kwargs: release.wait(5) and respond(**kwargs)
+    memory = ConversationMemory(model, "You are Marlena.", max_turns=2)
+
+    started = time.perf_counter()
+    talk(memory, 4, size=0)
+    assert time.perf_counter() - started < 1
+
+    release.set()
+    memory.wait()
+    # The first summary holds whatever was evicted when it started; the rest is merged into one more.
+    assert model.pool.chat.call_count <= 2
+    dialogue = "".join(call.kwargs["messages"][0]["content"] for call in model.pool.chat.call_args_list)
+    assert all(f"question {i}" in dialogue and f"answer {i}" in dialogue for i in range(3))
+    assert memory.summary.startswith("summary #")
+
+
+def test_turns_evicted_by_messages_are_summarized():
+    """
+    Test that turns pushed out by a long user message reach the summary without
+    waiting for the next add.
+    """
+    model = make_model()
+    memory = ConversationMemory(model, "You are Marlena.", token_budget=100, background=False)
+    talk(memory, 2, size=40)
+
+    memory.messages(Message(role="user", content="z" * 300))
+    assert model.pool.chat.call_count == 1
+    assert "question 0" in model.pool.chat.call_args.kwargs["messages"][0]["content"]
+    assert memory.summary == "summary #1"
+
+
+@pytest.mark.parametrize("background", [True, False])
+def test_failed_summary_is_retried(background):
+    """
+    Test that a summary call that fails keeps its turns for the next one and does not stop the memory.
+    """
+    model = make_model()
+    respond = model.pool.chat.side_effect
+    failures = [ConnectionError("Ollama is down")]
+
+    def chat(**kwargs):
+        if failures:
+            raise failures.pop()
+        return respond(**kwargs)
+
+    model.pool.chat.side_effect = chat
+    memory = ConversationMemory(model, "You are Marlena.", max_turns=2, background=background)
+
+    def turn(i):
+        memory.add(Message(role="user", content=f"question {i}"), Message(role="assistant", content=f"answer {i}"))
+
+    turn(0)
+    turn(1)
+    memory.wait()
+    assert memory.summary == ""
+    assert [m.content.split()[:2] for m in memory._evicted] == [["question", "0"], ["answer", "0"]]
+
+    turn(2)
+    memory.messages(Message(role="user", content="next"))
+    assert memory.summary == "summary #2"
+    assert memory._evicted == []
+    retried = model.pool.chat.call_args_list[1].kwargs["messages"][0]["content"]
+    assert "question 0" in retried and "answer 1" in retried
@@ -0,0 +1,280 @@
+"""
+In-process metrics for LLM calls.
+
+AIModel and AsyncAIModel record every call in a MetricsRegistry: its wall time,
+time to first token (measured on the stream), queue wait, prompt and eval token
+counts and durations as reported by Ollama, tokens per second and model load
+time, plus counters for calls, cache hits and structured-output retries. Every
+metric is labelled with the call's purpose and model, so the hot call sites
+stand out. The registry dumps in Prometheus text format or as JSON.
+"""
+
+import bisect
+import json
+import math
+import threading
+import time
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from ollama import ChatResponse
+
+SECONDS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+TOKEN_BUCKETS = [16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384]
+RATE_BUCKETS = [1, 5, 10, 20, 40, 80, 160, 320, 640, 1280]
+ATTEMPT_BUCKETS = [1, 2, 3, 5, 10]
+
+BUCKETS = {
+    "llm_prompt_tokens": TOKEN_BUCKETS,
+    "llm_eval_tokens": TOKEN_BUCKETS,
+    "llm_prompt_tokens_per_second": RATE_BUCKETS,
+    "llm_eval_tokens_per_second": RATE_BUCKETS,
+    "llm_structured_attempts": ATTEMPT_BUCKETS,
+}
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    def __init__(self, buckets: list[float]):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        """
+        (upper bound, observations at or below it) per bucket, ending with +Inf.
+        """
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + [math.inf], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+class CallMetrics:
+    """
+    What is known about one call. Durations are in seconds; Ollama's own
+    durations (reported in nanoseconds) are converted.
+    """
+    def __init__(self, purpose: Optional[str], model: str, stream: bool):
+        self.purpose = purpose or "none"
+        self.model = model
+        self.stream = stream
+        self.started = time.perf_counter()
+        self.sent_at = self.started
+        self.queued: Optional[float] = None
+        self.ttft: Optional[float] = None
+        self.cache_hit = False
+        self.failed = False
+        self.response: Optional[ChatResponse] = None
+
+    def sent(self):
+        """
+        Mark the end of the wait for a concurrency slot. Time to first token is
+        counted from here.
+        """
+        self.sent_at = time.perf_counter()
+        self.queued = self.sent_at - self.started
+
+    def chunk(self, chunk: ChatResponse):
+        if self.ttft is None and chunk["message"]["content"]:
+            self.ttft = time.perf_counter() - self.sent_at
+        if chunk.done:
+            self.response = chunk
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.histograms: dict[tuple[str, Labels], Histogram] = {}
+        self.counters: dict[tuple[str, Labels], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(BUCKETS.get(name, SECONDS_BUCKETS))
+            histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def histogram(self, name: str, **labels: str) -> Optional[Histogram]:
+        return self.histograms.get((name, tuple(sorted(labels.items()))))
+
+    def counter(self, name: str, **labels: str) -> float:
+        return self.counters.get((name, tuple(sorted(labels.items()))), 0)
+
+    def finish(self, call: CallMetrics):
+        """
+        Record a finished (or abandoned) call.
+        """
+        labels = {"purpose": call.purpose, "model": call.model}
+        self.increment("llm_calls_total", **labels)
+        self.observe("llm_call_seconds", time.perf_counter() - call.started, **labels)
+        if call.cache_hit:
+            self.increment("llm_cache_hits_total", **labels)
+            return
+        if call.failed:
+            self.increment("llm_errors_total", **labels)
+            return
+        if call.queued is not None:
+            self.observe("llm_queue_seconds", call.queued, **labels)
+        if call.ttft is not None:
+            self.observe("llm_ttft_seconds", call.ttft, **labels)
+
+        response = call.response
+        if response is None:
+            # Streams closed before the final chunk (e.g. structured output that
+            # was complete or invalid) carry no Ollama metadata.
+            self.increment("llm_abandoned_streams_total", **labels)
+            return
+        for tokens_name, duration_name, count, duration in (
+            ("llm_prompt_tokens", "llm_prompt_eval_seconds", response.prompt_eval_count, response.prompt_eval_duration),
+            ("llm_eval_tokens", "llm_eval_seconds", response.eval_count, response.eval_duration),
+        ):
+            if count is not None:
+                self.observe(tokens_name, count, **labels)
+            if duration:
+                self.observe(duration_name, duration / 1e9, **labels)
+                if count:
+                    self.observe(f"{tokens_name}_per_second", count / (duration / 1e9), **labels)
+        if response.load_duration:
+            self.observe("llm_load_seconds", response.load_duration / 1e9, **labels)
+
+    def record_attempts(self, purpose: Optional[str], model: str, attempts: int, succeeded: bool):
+        """
+        Record a structured-output call that took attempts generations.
+        """
+        labels = {"purpose": purpose or "none", "model": model}
+        self.observe("llm_structured_attempts", attempts, **labels)
+        if attempts > 1:
+            self.increment("llm_retries_total", attempts - 1, **labels)
+        if not succeeded:
+            self.increment("llm_structured_failures_total", **labels)
+
+    def track(self, call: CallMetrics, stream: Iterator[ChatResponse]) -> Iterator[ChatResponse]:
+        """
+        Pass a stream through, timing the first token and recording the call when
+        the stream ends or is closed.
+        """
+        try:
+            for chunk in stream:
+                call.chunk(chunk)
+                yield chunk
+        except Exception:
+            call.failed = True
+            raise
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+            self.finish(call)
+
+    async def atrack(self, call: CallMetrics, stream: AsyncIterator[ChatResponse]) -> AsyncIterator[ChatResponse]:
+        """
+        Async version of track.
+        """
+        try:
+            async for chunk in stream:
+                call.chunk(chunk)
+                yield chunk
+        except Exception:
+            call.failed = True
+            raise
+        finally:
+            self.finish(call)
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def prometheus(self) -> str:
+        """
+        The metrics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        lines = []
+        typed = set()
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+        for (name, labels), histogram in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            for bound, count in histogram.cumulative():
+                lines.append(f"{name}_bucket{_labels(labels + (('le', _number(bound)),))} {count}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(histogram.sum)}")
+            lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self) -> dict[str, Any]:
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        return {
+            "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in counters],
+            "histograms": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.sum,
+                    "mean": histogram.mean,
+                    "buckets": [[_number(bound), count] for bound, count in histogram.cumulative()],
+                }
+                for (name, labels), histogram in histograms
+            ],
+        }
+
+    def dump(self, path: str):
+        """
+        Write the metrics to path, as JSON when it ends in .json and in the
+        Prometheus text format otherwise.
+        """
+        text = json.dumps(self.to_json(), indent=2) if path.endswith(".json") else self.prometheus()
+        with open(path, "w") as file:
+            file.write(text)
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+_default_registry = MetricsRegistry()
+
+
+def default_registry() -> MetricsRegistry:
+    """
+    The process-wide registry used by every AIModel that is not given one.
+    """
+    return _default_registry
@@ -0,0 +1,129 @@
+import asyncio
+import json
+from enum import Enum
+from unittest.mock import MagicMock
+
+from ollama import ChatResponse
+from pydantic import BaseModel
+
+from src.ai_call import AIModel, AsyncAIModel, Message, MetricsRegistry, Purpose, ResponseCache
+
+
+class Intent(str, Enum):
+    move = "move"
+    discuss = "discuss"
+
+
+class Verdict(BaseModel):
+    intent: Intent
+
+
+def final_chunk(content: str = "") -> ChatResponse:
+    return ChatResponse.model_validate({
+        "model": "llama3.2:1b",
+        "done": True,
+        "prompt_eval_count": 200,
+        "prompt_eval_duration": 100_000_000,
+        "eval_count": 50,
+        "eval_duration": 500_000_000,
+        "load_duration": 1_000_000,
+        "message": {"role": "assistant", "content": content},
+    })
+
+
+def stream_of(text: str):
+    yield ChatResponse.model_validate({"model": "llama3.2:1b", "done": False, "message": {"role": "assistant", "content": text}})
+    yield final_chunk()
+
+
+def test_streamed_call_is_recorded():
+    """
+    Test that token counts, durations, rates and time to first token are recorded per purpose and model.
+    """
+    pool = MagicMock()
+    pool.chat.return_value = stream_of("Hello")
+    metrics = MetricsRegistry()
+    model = AIModel(pool=pool, metrics=metrics)
+
+    assert "".join(chunk["message"]["content"] for chunk in model.chat([Message(role="user", content="hi")], purpose=Purpose.intent)) == "Hello"
+
+    labels = {"purpose": "intent", "model": "llama3.2:1b"}
+    assert metrics.counter("llm_calls_total", **labels) == 1
+    assert metrics.histogram("llm_ttft_seconds", **labels).count == 1
+    assert metrics.histogram("llm_prompt_tokens", **labels).sum == 200
+    assert metrics.histogram("llm_eval_seconds", **labels).sum == 0.5
+    assert metrics.histogram("llm_eval_tokens_per_second", **labels).sum == 100
+    assert metrics.histogram("llm_prompt_eval_seconds", **labels).sum == 0.1
+
+
+def test_retries_and_cache_hits_are_counted():
+    """
+    Test that structured retries and cache hits show up as counters.
+    """
+    pool = MagicMock()
+    pool.chat.side_effect = lambda **kwargs: stream_of('{"intent": "jump"}') if pool.chat.call_count == 1 else stream_of('{"intent": "move"}')
+    metrics = MetricsRegistry()
+    model = AIModel(pool=pool, metrics=metrics, cache=ResponseCache())
+    messages = [Message(role="user", content="5")]
+
+    assert model.structured(messages, Verdict, purpose=Purpose.intent).intent == Intent.move
+    assert model.structured(messages, Verdict, purpose=Purpose.intent).intent == Intent.move
+
+    labels = {"purpose": "intent", "model": "llama3.2:1b"}
+    assert pool.chat.call_count == 2
+    assert metrics.counter("llm_retries_total", **labels) == 1
+    assert metrics.counter("llm_cache_hits_total", **labels) == 1
+    assert metrics.counter("llm_calls_total", **labels) == 3
+    attempts = metrics.histogram("llm_structured_attempts", **labels)
+    assert (attempts.count, attempts.sum) == (2, 3)
+    # The final chunk of the successful stream was read, so its tokens were recorded.
+    assert metrics.histogram("llm_eval_tokens", **labels).count == 1
+
+
+def test_async_calls_record_queue_wait():
+    """
+    Test that async calls record the wait for a concurrency slot as well as the call.
+    """
+    class FakeClient:
+        async def chat(self, **kwargs):
+            async def chunks():
+                await asyncio.sleep(0.01)
+                yield ChatResponse.model_validate({"model": "llama3.2", "done": False, "message": {"role": "assistant", "content": '{"intent": '}})
+                yield final_chunk('"discuss"}')
+            return chunks()
+
+    metrics = MetricsRegistry()
+
+    async def run():
+        model = AsyncAIModel(max_concurrency=1, metrics=metrics)
+        model.pool.clients = [FakeClient()]
+        return await asyncio.gather(*(model.structured([Message(role="user", content="?")], Verdict) for _ in range(3)))
+
+    assert [verdict.intent for verdict in asyncio.run(run())] == [Intent.discuss] * 3
+    labels = {"purpose": "none", "model": "llama3.2"}
+    assert metrics.counter("llm_calls_total", **labels) == 3
+    assert metrics.histogram("llm_queue_seconds", **labels).sum >= 0.02
+    assert metrics.histogram("llm_eval_tokens", **labels).count == 3
+
+
+def test_dumps():
+    """
+    Test the Prometheus text and JSON dumps.
+    """
+    metrics = MetricsRegistry()
+    metrics.observe("llm_ttft_seconds", 0.2, purpose="roleplay", model="llama3.2")
+    metrics.observe("llm_ttft_seconds", 3, purpose="roleplay", model="llama3.2")
+    metrics.increment("llm_calls_total", 2, purpose="roleplay", model="llama3.2")
+
+    text = metrics.prometheus()
+    assert "# TYPE llm_ttft_seconds histogram" in text
+    assert 'llm_ttft_seconds_bucket{model="llama3.2",purpose="roleplay",le="0.25"} 1' in text
+    assert 'llm_ttft_seconds_bucket{model="llama3.2",purpose="roleplay",le="+Inf"} 2' in text
+    assert 'llm_ttft_seconds_sum{model="llama3.2",purpose="roleplay"} 3.2' in text
+    assert 'llm_calls_total{model="llama3.2",purpose="roleplay"} 2' in text
+
+    dumped = json.loads(json.dumps(metrics.to_json()))
+    histogram = dumped["histograms"][0]
+    assert histogram["name"] == "llm_ttft_seconds"
+    assert histogram["count"] == 2
+    assert histogram["buckets"][-1] == ["+Inf", 2]
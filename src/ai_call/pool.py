@@ -0,0 +1,139 @@
+"""
+Long-lived Ollama clients, one per host.
+
+Every ollama.Client keeps its own HTTP connection pool, so holding on to the
+clients (instead of calling the module level ollama.chat) keeps connections
+alive between turns. With several hosts, each call is routed to one of them.
+AsyncClientPool does the same with ollama.AsyncClient for AsyncAIModel.
+"""
+
+import os
+import threading
+from enum import Enum
+from typing import Any, AsyncIterator, Iterator, Optional
+
+import httpx
+from ollama import AsyncClient, ChatResponse, Client
+
+
+class Routing(str, Enum):
+    round_robin = "round_robin"
+    least_loaded = "least_loaded"
+
+
+def env_hosts() -> list[str]:
+    """
+    The hosts listed in OLLAMA_HOSTS, a comma separated list of URLs.
+    """
+    return [host.strip() for host in os.environ.get("OLLAMA_HOSTS", "").split(",") if host.strip()]
+
+
+class ClientPool:
+    client_type = Client
+
+    def __init__(self, hosts: Optional[list[str]] = None, routing: Routing = Routing.least_loaded):
+        """
+        hosts are Ollama base URLs; None or an empty list means the default host
+        (OLLAMA_HOST or localhost).
+        """
+        self.hosts = list(hosts) if hosts else [None]
+        self.routing = Routing(routing)
+        self.clients = [self.client_type(host=host) for host in self.hosts]
+        self.in_flight = [0 for _ in self.hosts]
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> int:
+        """
+        Pick a client for the next call and mark it busy. Returns the client index.
+        """
+        with self._lock:
+            if self.routing == Routing.round_robin:
+                index = self._next
+                self._next = (self._next + 1) % len(self.clients)
+            else:
+                index = min(range(len(self.clients)), key=lambda i: (self.in_flight[i], (i - self._next) % len(self.clients)))
+                self._next = (index + 1) % len(self.clients)
+            self.in_flight[index] += 1
+            return index
+
+    def release(self, index: int):
+        with self._lock:
+            self.in_flight[index] -= 1
+
+    def chat(self, **kwargs: Any) -> ChatResponse | Iterator[ChatResponse]:
+        """
+        Same arguments as ollama.Client.chat. A streamed call keeps its host busy
+        until the stream is exhausted or closed.
+        """
+        index = self.acquire()
+        try:
+            result = self.clients[index].chat(**kwargs)
+        except BaseException:
+            self.release(index)
+            raise
+        if kwargs.get("stream"):
+            return self._stream(index, result)
+        self.release(index)
+        return result
+
+    def _stream(self, index: int, stream: Iterator[ChatResponse]) -> Iterator[ChatResponse]:
+        try:
+            yield from stream
+        except httpx.ConnectError as e:
+            # Streams connect lazily; report it the way ollama does for plain calls.
+            raise ConnectionError(f"Failed to connect to Ollama at {self.hosts[index] or 'the default host'}") from e
+        finally:
+            self.release(index)
+
+
+class AsyncClientPool(ClientPool):
+    """
+    ClientPool for coroutines, with the same routing. AsyncClients belong to the
+    event loop they are used on, so build one pool per AsyncAIModel.
+    """
+    client_type = AsyncClient
+
+    async def chat(self, **kwargs: Any) -> ChatResponse | AsyncIterator[ChatResponse]:
+        """
+        Same arguments as ollama.AsyncClient.chat. A streamed call keeps its host
+        busy until the stream is exhausted or closed.
+        """
+        index = self.acquire()
+        try:
+            result = await self.clients[index].chat(**kwargs)
+        except BaseException:
+            self.release(index)
+            raise
+        if kwargs.get("stream"):
+            return self._astream(index, result)
+        self.release(index)
+        return result
+
+    async def _astream(self, index: int, stream: AsyncIterator[ChatResponse]) -> AsyncIterator[ChatResponse]:
+        try:
+            async for chunk in stream:
+                yield chunk
+        except httpx.ConnectError as e:
+            raise ConnectionError(f"Failed to connect to Ollama at {self.hosts[index] or 'the default host'}") from e
+        finally:
+            self.release(index)
+            aclose = getattr(stream, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+
+_default_pool: Optional[ClientPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def default_pool() -> ClientPool:
+    """
+    The process-wide pool shared by every AIModel that is not given one. Set
+    OLLAMA_HOSTS to a comma separated list of URLs to spread calls over several hosts.
+    """
+    global _default_pool
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = ClientPool(env_hosts())
+        return _default_pool
@@ -0,0 +1,115 @@
+import asyncio
+from unittest.mock import MagicMock
+
+from ollama import ChatResponse
+
+from src.ai_call import AsyncAIModel, AsyncClientPool, ClientPool, Message, Routing
+
+
+def make_pool(routing: Routing) -> ClientPool:
+    pool = ClientPool(["http://a:11434", "http://b:11434", "http://c:11434"], routing=routing)
+    pool.clients = [MagicMock(name=host) for host in pool.hosts]
+    return pool
+
+
+def test_round_robin_cycles_hosts():
+    """
+    Test that round robin routing visits every host in turn.
+    """
+    pool = make_pool(Routing.round_robin)
+    indexes = [pool.acquire() for _ in range(6)]
+    assert indexes == [0, 1, 2, 0, 1, 2]
+
+
+def test_least_loaded_skips_busy_hosts():
+    """
+    Test that least loaded routing avoids a host that still has a call in flight.
+    """
+    pool = make_pool(Routing.least_loaded)
+    busy = pool.acquire()
+    second = pool.acquire()
+    third = pool.acquire()
+    assert len({busy, second, third}) == 3
+
+    pool.release(second)
+    assert pool.acquire() == second
+
+
+def test_stream_holds_host_until_exhausted():
+    """
+    Test that a streamed call keeps its host busy until the stream is consumed.
+    """
+    pool = make_pool(Routing.least_loaded)
+    pool.clients[0].chat.return_value = iter(["a", "b"])
+
+    stream = pool.chat(model="llama3.2", messages=[], stream=True)
+    next(stream)
+    assert pool.in_flight[0] == 1
+    list(stream)
+    assert pool.in_flight == [0, 0, 0]
+
+
+def test_clients_are_reused():
+    """
+    Test that repeated calls go through the same long-lived client objects.
+    """
+    pool = ClientPool(["http://a:11434"])
+    client = pool.clients[0]
+    client.chat = MagicMock(return_value="response")
+    pool.chat(model="llama3.2", messages=[])
+    pool.chat(model="llama3.2", messages=[])
+    assert client.chat.call_count == 2
+    assert pool.clients[0] is client
+
+
+class FakeAsyncClient:
+    def __init__(self):
+        self.calls = 0
+
+    async def chat(self, stream=False, **kwargs):
+        self.calls += 1
+
+        async def chunks():
+            yield "a"
+            yield "b"
+        if stream:
+            return chunks()
+        return ChatResponse.model_validate({"model": "llama3.2", "done": True, "message": {"role": "assistant", "content": "response"}})
+
+
+def test_async_pool_spreads_calls_and_releases_streams():
+    """
+    Test that the async pool routes like ClientPool and frees a host when its stream is closed.
+    """
+    pool = AsyncClientPool(["http://a:11434", "http://b:11434"])
+    pool.clients = [FakeAsyncClient(), FakeAsyncClient()]
+
+    async def run():
+        stream = await pool.chat(stream=True)
+        assert pool.in_flight == [1, 0]
+        assert (await pool.chat()).message.content == "response"
+        async for _ in stream:
+            break
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert pool.in_flight == [0, 0]
+    assert [client.calls for client in pool.clients] == [1, 1]
+
+
+def test_async_model_reads_ollama_hosts(monkeypatch):
+    """
+    Test that AsyncAIModel spreads its calls over OLLAMA_HOSTS like AIModel's default pool.
+    """
+    monkeypatch.setenv("OLLAMA_HOSTS", "http://a:11434, http://b:11434")
+    model = AsyncAIModel()
+    assert model.pool.hosts == ["http://a:11434", "http://b:11434"]
+    assert AsyncAIModel(host="http://c:11434").pool.hosts == ["http://c:11434"]
+
+    model.pool.clients = [FakeAsyncClient(), FakeAsyncClient()]
+
+    async def run():
+        await asyncio.gather(*(model.response([Message(role="user", content=f"hi {i}")]) for i in range(4)))
+
+    asyncio.run(run())
+    assert [client.calls for client in model.pool.clients] == [2, 2]
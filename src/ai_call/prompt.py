@@ -0,0 +1,140 @@
+"""
+Prompt templates laid out for Ollama's prompt cache.
+
+Ollama keeps the KV cache of the last prompt a loaded model processed and only
+evaluates the tokens after the longest common prefix. A PromptTemplate
+therefore sends its static text as the system message, byte-for-byte the same
+on every call, and the caller's parts after it, static task text first and the
+changing state (board, player input, ...) last. The model is only kept loaded,
+with its cache, when keep_alive and num_ctx do not change between calls, so a
+template refuses purposes whose policy does not pin both.
+
+Every call's prompt_eval_count (the tokens Ollama actually evaluated) is
+collected in PrefixCacheStats, which derives from them an estimate of how much
+of each prompt was served from the cache.
+"""
+
+from typing import Iterator, TypeVar
+
+from ollama import ChatResponse
+from pydantic import BaseModel
+
+from .ai import AIModel, Message
+from .router import ModelPolicy, Purpose
+
+T = TypeVar("T", bound=BaseModel)
+
+
+class PrefixCacheStats:
+    """
+    Prompt cache use of one template, in the model's own tokens. A call that finds
+    nothing cached evaluates its whole prompt, so the highest prompt_eval_count
+    per character seen so far is taken as the model's tokens per character for
+    the template's prompts. A call's full size is its length at that rate, and
+    what it did not evaluate was reused. These are estimates. They are exact
+    only once a cold call has been seen, and only as far as tokens per character
+    stay the same between prompts.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.evaluated_tokens = 0  # prompt_eval_count reported by Ollama
+        self.prompt_eval_duration = 0  # nanoseconds
+        self.tokens_per_char = 0.0
+        self.estimated_prompt_tokens = 0
+        self.estimated_reused_tokens = 0
+        self.last_reused = 0  # estimated, for the latest call
+
+    def observe(self, prompt_chars: int, response: ChatResponse):
+        """
+        Record the metadata of the final chunk of a response to a prompt of prompt_chars characters.
+        """
+        evaluated = response.prompt_eval_count or 0
+        self.calls += 1
+        self.evaluated_tokens += evaluated
+        self.prompt_eval_duration += response.prompt_eval_duration or 0
+        if prompt_chars:
+            self.tokens_per_char = max(self.tokens_per_char, evaluated / prompt_chars)
+        size = max(round(prompt_chars * self.tokens_per_char), evaluated)
+        self.last_reused = size - evaluated
+        self.estimated_prompt_tokens += size
+        self.estimated_reused_tokens += self.last_reused
+
+    @property
+    def reuse(self) -> float:
+        """
+        Estimated fraction of prompt tokens served from the cache.
+        """
+        return self.estimated_reused_tokens / self.estimated_prompt_tokens if self.estimated_prompt_tokens else 0.0
+
+    def __str__(self) -> str:
+        return (f"{self.calls} calls, {self.evaluated_tokens} prompt tokens evaluated, "
+                f"~{self.reuse:.0%} reused (estimated), {self.prompt_eval_duration / 1e6:.0f} ms prompt evaluation")
+
+
+def pinned_policy(ai_model: AIModel, purpose: Purpose) -> ModelPolicy:
+    """
+    The policy a call with purpose is routed to. Raises ValueError when it leaves
+    keep_alive or num_ctx to Ollama's defaults, since a change in either reloads
+    the model and drops its cache.
+    """
+    policy = ai_model.router.route(purpose, ai_model.model)
+    if policy.keep_alive is None or "num_ctx" not in policy.options:
+        raise ValueError(f"The {purpose.value} policy must set keep_alive and num_ctx for its prompt prefix to stay cached.")
+    return policy
+
+
+class PromptTemplate:
+    def __init__(self, system: str, purpose: Purpose):
+        """
+        system is the static text sent first on every call; keep anything that
+        changes between calls out of it.
+        """
+        self.system = system
+        self.purpose = purpose
+        self.stats = PrefixCacheStats()
+
+    def messages(self, *parts: str) -> list[Message]:
+        """
+        The system message, then the parts as one user message. Pass static parts
+        (the task) before dynamic ones (the state).
+        """
+        user = "\n\n".join(part.strip() for part in parts if part)
+        return [Message(role='system', content=self.system), Message(role='user', content=user)]
+
+    def chat(self, ai_model: AIModel, *parts: str) -> Iterator[ChatResponse]:
+        return self._stream(ai_model, self.messages(*parts))
+
+    def response(self, ai_model: AIModel, *parts: str) -> str:
+        """
+        The complete text of a streamed reply.
+        """
+        return "".join(chunk["message"]["content"] or "" for chunk in self.chat(ai_model, *parts))
+
+    def structured(self, ai_model: AIModel, response_model: type[T], *parts: str, max_retries: int = 2) -> T:
+        """
+        AIModel.structured on the template's messages.
+        """
+        messages = self.messages(*parts)
+        pinned_policy(ai_model, self.purpose)
+        prompt_chars = _prompt_chars(messages)
+        return ai_model.structured(messages, response_model, purpose=self.purpose, max_retries=max_retries,
+                                   on_response=lambda response: self.stats.observe(prompt_chars, response))
+
+    def _stream(self, ai_model: AIModel, messages: list[Message]) -> Iterator[ChatResponse]:
+        pinned_policy(ai_model, self.purpose)
+        return self._observe(ai_model.chat(messages, purpose=self.purpose), _prompt_chars(messages))
+
+    def _observe(self, stream: Iterator[ChatResponse], prompt_chars: int) -> Iterator[ChatResponse]:
+        try:
+            for chunk in stream:
+                if chunk.done:
+                    self.stats.observe(prompt_chars, chunk)
+                yield chunk
+        finally:
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+
+
+def _prompt_chars(messages: list[Message]) -> int:
+    return sum(len(message.content) for message in messages)
@@ -0,0 +1,131 @@
+from enum import Enum
+from unittest.mock import MagicMock
+
+import pytest
+from ollama import ChatResponse
+from pydantic import BaseModel
+
+from src.ai_call import AIModel, MetricsRegistry, ModelPolicy, ModelRouter, PrefixCacheStats, PromptTemplate, Purpose
+
+
+class Intent(str, Enum):
+    move = "move"
+    discuss = "discuss"
+
+
+class Verdict(BaseModel):
+    intent: Intent
+    square: int
+
+
+def stream_of(text: str, prompt_eval_count: int):
+    yield ChatResponse.model_validate({"model": "llama3.2", "done": False, "message": {"role": "assistant", "content": text[:4]}})
+    yield ChatResponse.model_validate({"model": "llama3.2", "done": False, "message": {"role": "assistant", "content": text[4:]}})
+    yield ChatResponse.model_validate({
+        "model": "llama3.2",
+        "done": True,
+        "prompt_eval_count": prompt_eval_count,
+        "prompt_eval_duration": 2_000_000,
+        "message": {"role": "assistant", "content": ""},
+    })
+
+
+SYSTEM = "You are a tic tac toe agent. " * 40
+
+
+def test_static_text_comes_first():
+    """
+    Test that the system text is identical across calls and the parts follow in order.
+    """
+    template = PromptTemplate(SYSTEM, purpose=Purpose.roleplay)
+    first = template.messages("Answer the player.", "board: 1", "player: hi")
+    second = template.messages("Answer the player.", "board: 2", "player: hello")
+
+    assert first[0].role == "system" and first[0] == second[0]
+    assert first[1].content == "Answer the player.\n\nboard: 1\n\nplayer: hi"
+
+
+def test_reports_prefix_reuse_and_pins_the_policy():
+    """
+    Test that prompt_eval_count from the final chunk is recorded and the routed policy is used.
+    """
+    pool = MagicMock()
+    pool.chat.side_effect = [stream_of("Hello there", 500), stream_of("Hi again", 10)]
+    model = AIModel(pool=pool)
+    template = PromptTemplate(SYSTEM, purpose=Purpose.roleplay)
+
+    assert template.response(model, "Greet the player.", "player: hi") == "Hello there"
+    assert template.response(model, "Greet the player.", "player: hi again") == "Hi again"
+
+    first, second = (sum(len(m.content) for m in template.messages("Greet the player.", player)) for player in ("player: hi", "player: hi again"))
+    assert template.stats.calls == 2
+    assert template.stats.evaluated_tokens == 510
+    assert template.stats.tokens_per_char == 500 / first
+    assert template.stats.last_reused == round(second * 500 / first) - 10
+    assert template.stats.prompt_eval_duration == 4_000_000
+    assert pool.chat.call_args.kwargs["keep_alive"] == "30m"
+    assert pool.chat.call_args.kwargs["options"]["num_ctx"] == 8192
+
+
+def test_reuse_is_measured_in_model_tokens():
+    """
+    Test that reuse is derived from prompt_eval_count alone, recalibrating on a colder call.
+    """
+    def final(prompt_eval_count):
+        return ChatResponse.model_validate({"model": "llama3.2", "done": True, "prompt_eval_count": prompt_eval_count,
+                                            "message": {"role": "assistant", "content": ""}})
+
+    stats = PrefixCacheStats()
+    stats.observe(1000, final(100))  # warm: only part of the prompt was evaluated
+    stats.observe(1000, final(250))  # cold: the whole prompt, 0.25 tokens per character
+    stats.observe(1000, final(50))
+
+    assert stats.tokens_per_char == 0.25
+    assert stats.last_reused == 200
+    assert stats.estimated_prompt_tokens == 100 + 250 + 250
+    assert stats.reuse == (0 + 0 + 200) / 600
+    assert "estimated" in str(stats)
+
+
+def test_structured_reads_to_the_final_chunk():
+    """
+    Test that structured returns the instance and still records the metadata after the JSON closes.
+    """
+    pool = MagicMock()
+    pool.chat.return_value = stream_of('{"intent": "move", "square": 5}', 42)
+    template = PromptTemplate(SYSTEM, purpose=Purpose.intent)
+
+    model = AIModel(pool=pool, metrics=MetricsRegistry())
+    verdict = template.structured(model, Verdict, "player: 5")
+
+    assert verdict == Verdict(intent=Intent.move, square=5)
+    assert pool.chat.call_args.kwargs["format"] == Verdict.model_json_schema()
+    assert template.stats.evaluated_tokens == 42
+    assert model.metrics.histogram("llm_structured_attempts", purpose="intent", model=pool.chat.call_args.kwargs["model"]).count == 1
+
+
+def test_structured_retries_through_the_model():
+    """
+    Test that the template uses AIModel.structured's retries and records every attempt that finished.
+    """
+    pool = MagicMock()
+    pool.chat.side_effect = [stream_of('{"intent": "fly", "square": 5}', 40), stream_of('{"intent": "move", "square": 5}', 8)]
+    template = PromptTemplate(SYSTEM, purpose=Purpose.intent)
+
+    assert template.structured(AIModel(pool=pool), Verdict, "player: 5") == Verdict(intent=Intent.move, square=5)
+    assert pool.chat.call_count == 2
+    assert template.stats.calls == 1
+    assert template.stats.evaluated_tokens == 8
+
+
+def test_unpinned_policy_is_refused():
+    """
+    Test that a purpose without keep_alive and num_ctx is rejected before calling Ollama.
+    """
+    pool = MagicMock()
+    router = ModelRouter({Purpose.roleplay: ModelPolicy(options={"num_ctx": 8192})})
+    template = PromptTemplate(SYSTEM, purpose=Purpose.roleplay)
+
+    with pytest.raises(ValueError):
+        template.chat(AIModel(pool=pool, router=router), "hi")
+    pool.chat.assert_not_called()
@@ -0,0 +1,71 @@
+"""
+Per-purpose model routing.
+
+Each kind of call (classifying player intent, generating an NPC, roleplaying,
+planning, summarizing) has its own model and Ollama options. High volume calls
+like intent classification go to a small model, the rest stay on the model the
+AIModel was created with.
+"""
+
+from enum import Enum
+from typing import Any, Optional
+
+from pydantic import BaseModel, Field
+
+
+class Purpose(str, Enum):
+    intent = "intent"
+    npc_generation = "npc_generation"
+    roleplay = "roleplay"
+    planning = "planning"
+    summary = "summary"
+
+
+class ModelPolicy(BaseModel):
+    model: Optional[str] = Field(None, description="Model to use. None means the AIModel's own model.")
+    options: dict[str, Any] = Field(default_factory=dict, description="Ollama options such as num_ctx and num_predict.")
+    keep_alive: Optional[str | float] = Field(None, description="How long Ollama keeps the model loaded after the call.")
+
+
+DEFAULT_POLICIES: dict[Purpose, ModelPolicy] = {
+    Purpose.intent: ModelPolicy(
+        model="llama3.2:1b",
+        options={"num_ctx": 2048, "num_predict": 64, "temperature": 0},
+        keep_alive="30m",
+    ),
+    Purpose.npc_generation: ModelPolicy(
+        options={"num_ctx": 8192, "num_predict": 2048},
+        keep_alive="5m",
+    ),
+    Purpose.roleplay: ModelPolicy(
+        options={"num_ctx": 8192},
+        keep_alive="30m",
+    ),
+    Purpose.planning: ModelPolicy(
+        options={"num_ctx": 16384},
+        keep_alive="5m",
+    ),
+    Purpose.summary: ModelPolicy(
+        options={"num_ctx": 4096, "num_predict": 320, "temperature": 0.2},
+        keep_alive="30m",
+    ),
+}
+
+
+class ModelRouter:
+    def __init__(self, policies: Optional[dict[Purpose, ModelPolicy]] = None, default: Optional[ModelPolicy] = None):
+        self.policies = dict(DEFAULT_POLICIES if policies is None else policies)
+        self.default = default if default is not None else ModelPolicy()
+
+    def route(self, purpose: Optional[Purpose], model: str) -> ModelPolicy:
+        """
+        Resolve the policy for a call. model is the caller's own model, used when
+        the policy does not name one.
+        """
+        policy = self.policies.get(purpose, self.default) if purpose is not None else self.default
+        if policy.model is None:
+            policy = policy.model_copy(update={"model": model})
+        return policy
+
+    def set_policy(self, purpose: Purpose, policy: ModelPolicy):
+        self.policies[purpose] = policy
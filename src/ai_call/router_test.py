@@ -0,0 +1,58 @@
+from unittest.mock import MagicMock
+from ollama import ChatResponse
+
+from src.ai_call import AIModel, Message, ModelPolicy, ModelRouter, Purpose
+
+
+def make_model(**kwargs) -> AIModel:
+    pool = MagicMock()
+    pool.chat.return_value = ChatResponse.model_validate({
+        "model": "llama3.2", "done": True, "message": {"role": "assistant", "content": "move"},
+    })
+    return AIModel(pool=pool, **kwargs)
+
+
+def test_model_argument_is_honored():
+    """
+    Test that calls without a purpose use the model the AIModel was created with.
+    """
+    model = make_model(model="mistral")
+    model.response([Message(role="user", content="hi")])
+    assert model.pool.chat.call_args.kwargs["model"] == "mistral"
+
+
+def test_intent_purpose_routes_to_small_model():
+    """
+    Test that intent classification is routed to the small model with its options.
+    """
+    model = make_model()
+    model.response([Message(role="user", content="5")], purpose=Purpose.intent)
+
+    kwargs = model.pool.chat.call_args.kwargs
+    assert kwargs["model"] == "llama3.2:1b"
+    assert kwargs["options"]["num_predict"] == 64
+    assert kwargs["keep_alive"] == "30m"
+
+
+def test_policy_without_model_falls_back_to_own_model():
+    """
+    Test that a policy that does not name a model uses the AIModel's model.
+    """
+    model = make_model(model="mistral")
+    model.response([Message(role="user", content="hi")], purpose=Purpose.roleplay)
+    assert model.pool.chat.call_args.kwargs["model"] == "mistral"
+
+
+def test_custom_policy_table():
+    """
+    Test that a custom policy table replaces the defaults.
+    """
+    router = ModelRouter({Purpose.planning: ModelPolicy(model="qwen2.5", options={"num_ctx": 32768})})
+    model = make_model(router=router)
+    model.response([Message(role="user", content="plan")], purpose=Purpose.planning)
+    model.response([Message(role="user", content="5")], purpose=Purpose.intent)
+
+    first, second = model.pool.chat.call_args_list
+    assert first.kwargs["model"] == "qwen2.5"
+    assert first.kwargs["options"] == {"num_ctx": 32768}
+    assert second.kwargs["model"] == "llama3.2"
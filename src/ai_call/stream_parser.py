@@ -0,0 +1,332 @@
+"""
+Incremental JSON parsing of streamed LLM output against a pydantic model.
+
+The validator consumes the text as it arrives and checks it against the
+model's JSON schema as it goes: value types, enum values (as soon as a partial
+string can no longer become a valid member), unknown keys where extras are
+forbidden and missing required keys when an object closes. The first invalid
+character raises StreamValidationError, so the caller can stop the generation
+right there instead of waiting for the full response.
+"""
+
+import json
+from typing import AsyncIterator, Iterator, Optional, TypeVar
+
+from ollama import ChatResponse
+from pydantic import BaseModel, ValidationError
+
+T = TypeVar("T", bound=BaseModel)
+
+_WHITESPACE = " \t\r\n"
+_NUMBER_CHARS = "0123456789+-.eE"
+_LITERALS = ("true", "false", "null")
+
+
+class StreamValidationError(ValueError):
+    def __init__(self, message: str, text: str = ""):
+        super().__init__(message)
+        self.text = text
+
+
+class _Frame:
+    def __init__(self, kind: str, schema: Optional[dict]):
+        self.kind = kind  # "object" or "array"
+        self.schema = schema
+        self.keys: set[str] = set()
+        self.key: Optional[str] = None
+        self.index = -1
+
+
+class _Token:
+    def __init__(self, kind: str, schema: Optional[dict], is_key: bool = False):
+        self.kind = kind  # "string", "number" or "literal"
+        self.schema = schema
+        self.is_key = is_key
+        self.chars: list[str] = []
+        self.escape = False
+
+
+class StreamingJSONValidator:
+    def __init__(self, model: type[BaseModel]):
+        self.model = model
+        self.schema = model.model_json_schema()
+        self.defs = self.schema.get("$defs", {})
+        self.done = False
+        self._text: list[str] = []
+        self._stack: list[_Frame] = []
+        self._need = "value"
+        self._token: Optional[_Token] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self._text)
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Consume the next piece of output. Returns True once the top level JSON
+        value is complete; anything after it is ignored.
+        """
+        for ch in chunk:
+            if self.done:
+                break
+            self._consume(ch)
+        return self.done
+
+    def result(self) -> BaseModel:
+        """
+        Validate the complete value and build the model instance.
+        """
+        if not self.done:
+            self._fail("Output ended before the JSON value was complete")
+        try:
+            return self.model.model_validate(json.loads(self.text))
+        except (ValidationError, json.JSONDecodeError) as e:
+            raise StreamValidationError(str(e), self.text) from e
+
+    def _consume(self, ch: str):
+        token = self._token
+        if token is not None:
+            if token.kind == "string":
+                self._text.append(ch)
+                self._consume_string(token, ch)
+                return
+            if token.kind == "number" and ch in _NUMBER_CHARS:
+                self._text.append(ch)
+                token.chars.append(ch)
+                if ch in ".eE" and self._types(token.schema) == {"integer"}:
+                    self._fail(f"Expected an integer, got {''.join(token.chars)}")
+                return
+            if token.kind == "literal" and ch.isalpha():
+                self._text.append(ch)
+                token.chars.append(ch)
+                if not any(literal.startswith("".join(token.chars)) for literal in _LITERALS):
+                    self._fail(f"Invalid literal '{''.join(token.chars)}'")
+                return
+            self._finish_scalar(token)
+
+        if ch in _WHITESPACE:
+            self._text.append(ch)
+            return
+        self._text.append(ch)
+
+        need = self._need
+        if need in ("value", "value_or_end"):
+            if ch == "]" and need == "value_or_end":
+                self._close("array")
+            else:
+                self._start_value(ch)
+        elif need in ("key_or_end", "key"):
+            if ch == '"':
+                self._token = _Token("string", None, is_key=True)
+            elif ch == "}" and need == "key_or_end":
+                self._close("object")
+            else:
+                self._fail(f"Expected a key, got '{ch}'")
+        elif need == "colon":
+            if ch != ":":
+                self._fail(f"Expected ':', got '{ch}'")
+            self._need = "value"
+        elif need == "comma_or_end":
+            frame = self._stack[-1]
+            if ch == ",":
+                self._need = "key" if frame.kind == "object" else "value"
+            elif ch == ("}" if frame.kind == "object" else "]"):
+                self._close(frame.kind)
+            else:
+                self._fail(f"Expected ',' or the end of the {frame.kind}, got '{ch}'")
+
+    def _consume_string(self, token: _Token, ch: str):
+        if token.escape:
+            token.escape = False
+            token.chars.append(ch)
+            return
+        if ch == "\\":
+            token.escape = True
+            token.chars.append(ch)
+            return
+        if ch == '"':
+            self._token = None
+            value = json.loads('"' + "".join(token.chars) + '"')
+            if token.is_key:
+                self._finish_key(value)
+            else:
+                self._check_enum(token.schema, value, complete=True)
+                self._value_done()
+            return
+        token.chars.append(ch)
+        if not token.is_key and "\\" not in token.chars:
+            self._check_enum(token.schema, "".join(token.chars), complete=False)
+
+    def _start_value(self, ch: str):
+        if self._stack and self._stack[-1].kind == "array":
+            self._stack[-1].index += 1
+        schema = self._value_schema()
+        if ch == "{":
+            option = self._option_for(schema, "object")
+            self._stack.append(_Frame("object", option))
+            self._need = "key_or_end"
+        elif ch == "[":
+            option = self._option_for(schema, "array")
+            self._stack.append(_Frame("array", option))
+            self._need = "value_or_end"
+        elif ch == '"':
+            self._token = _Token("string", self._option_for(schema, "string"))
+        elif ch == "-" or ch.isdigit():
+            self._token = _Token("number", self._option_for(schema, "number"))
+            self._token.chars.append(ch)
+        elif ch in "tfn":
+            kind = "null" if ch == "n" else "boolean"
+            self._token = _Token("literal", self._option_for(schema, kind))
+            self._token.chars.append(ch)
+        else:
+            self._fail(f"Unexpected character '{ch}'")
+
+    def _finish_scalar(self, token: _Token):
+        self._token = None
+        raw = "".join(token.chars)
+        if token.kind == "literal":
+            if raw not in _LITERALS:
+                self._fail(f"Invalid literal '{raw}'")
+        else:
+            try:
+                value = json.loads(raw)
+            except json.JSONDecodeError:
+                self._fail(f"Invalid number '{raw}'")
+            if isinstance(value, float) and self._types(token.schema) == {"integer"}:
+                self._fail(f"Expected an integer, got {raw}")
+        self._value_done()
+
+    def _finish_key(self, key: str):
+        frame = self._stack[-1]
+        properties = (frame.schema or {}).get("properties")
+        if properties is not None and key not in properties and (frame.schema or {}).get("additionalProperties") is False:
+            self._fail(f"Unexpected key '{key}'")
+        frame.key = key
+        frame.keys.add(key)
+        self._need = "colon"
+
+    def _close(self, kind: str):
+        frame = self._stack[-1]
+        if kind == "object" and frame.schema is not None:
+            missing = [key for key in frame.schema.get("required", []) if key not in frame.keys]
+            if missing:
+                self._fail(f"Missing required keys: {', '.join(missing)}")
+        self._stack.pop()
+        self._value_done()
+
+    def _value_done(self):
+        if not self._stack:
+            self.done = True
+            return
+        self._need = "comma_or_end"
+
+    def _value_schema(self) -> Optional[dict]:
+        if not self._stack:
+            return self.schema
+        frame = self._stack[-1]
+        if frame.schema is None:
+            return None
+        if frame.kind == "array":
+            return frame.schema.get("items")
+        properties = frame.schema.get("properties", {})
+        if frame.key in properties:
+            return properties[frame.key]
+        extra = frame.schema.get("additionalProperties")
+        return extra if isinstance(extra, dict) else None
+
+    def _resolve(self, schema: Optional[dict]) -> Optional[dict]:
+        while schema is not None:
+            if "$ref" in schema:
+                schema = self.defs[schema["$ref"].split("/")[-1]]
+            elif "allOf" in schema and len(schema["allOf"]) == 1:
+                schema = schema["allOf"][0]
+            else:
+                break
+        return schema
+
+    def _options(self, schema: Optional[dict]) -> list[Optional[dict]]:
+        schema = self._resolve(schema)
+        if schema is None:
+            return [None]
+        if "anyOf" in schema:
+            return [option for sub in schema["anyOf"] for option in self._options(sub)]
+        return [schema]
+
+    def _types(self, schema: Optional[dict]) -> Optional[set[str]]:
+        if schema is None:
+            return None
+        kind = schema.get("type")
+        if kind is None and "enum" in schema:
+            kind = ["string" if isinstance(value, str) else "number" for value in schema["enum"]]
+        if kind is None:
+            return None
+        return set(kind) if isinstance(kind, list) else {kind}
+
+    def _option_for(self, schema: Optional[dict], kind: str) -> Optional[dict]:
+        """
+        The first alternative of schema that accepts a JSON value of the given kind.
+        """
+        for option in self._options(schema):
+            types = self._types(option)
+            if types is None or kind in types or (kind == "number" and "integer" in types):
+                return option
+        self._fail(f"Unexpected {kind}")
+
+    def _check_enum(self, schema: Optional[dict], value: str, complete: bool):
+        if schema is None or "enum" not in schema:
+            return
+        allowed = [member for member in schema["enum"] if isinstance(member, str)]
+        ok = value in allowed if complete else any(member.startswith(value) for member in allowed)
+        if not ok:
+            self._fail(f"'{value}' is not one of {', '.join(allowed)}")
+
+    def _path(self) -> str:
+        parts = []
+        for frame in self._stack:
+            if frame.kind == "object" and frame.key is not None:
+                parts.append(frame.key)
+            elif frame.kind == "array" and frame.index >= 0:
+                parts.append(f"[{frame.index}]")
+        return ".".join(parts) or "$"
+
+    def _fail(self, message: str):
+        raise StreamValidationError(f"{self._path()}: {message}", self.text)
+
+
+def parse_stream(stream: Iterator[ChatResponse], model: type[T]) -> T:
+    """
+    Parse a streamed chat response into model, stopping the generation as soon
+    as the output becomes invalid or anything but whitespace follows the
+    complete JSON value. Reading on through whitespace lets the final chunk, with
+    the call's metadata, arrive when the model stops right after the value.
+    """
+    validator = StreamingJSONValidator(model)
+    try:
+        for chunk in stream:
+            content = chunk["message"]["content"] or ""
+            if validator.done and content.strip():
+                break
+            validator.feed(content)
+    finally:
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+    return validator.result()
+
+
+async def aparse_stream(stream: AsyncIterator[ChatResponse], model: type[T]) -> T:
+    """
+    Async version of parse_stream.
+    """
+    validator = StreamingJSONValidator(model)
+    try:
+        async for chunk in stream:
+            content = chunk["message"]["content"] or ""
+            if validator.done and content.strip():
+                break
+            validator.feed(content)
+    finally:
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            await aclose()
+    return validator.result()
@@ -0,0 +1,123 @@
+import json
+from enum import Enum
+from typing import Optional
+
+import pytest
+from ollama import ChatResponse
+from pydantic import BaseModel
+
+from src.ai_call import StreamValidationError, StreamingJSONValidator, parse_stream
+from src.npc import NPC
+
+
+class Color(str, Enum):
+    red = "Red"
+    green = "Green"
+
+
+class Item(BaseModel):
+    name: str
+    color: Color
+    count: int
+    tags: Optional[list[str]] = None
+
+
+def chunks(text: str, size: int = 5):
+    for i in range(0, len(text), size):
+        yield ChatResponse.model_validate({
+            "model": "llama3.2", "done": False, "message": {"role": "assistant", "content": text[i:i + size]},
+        })
+    yield ChatResponse.model_validate({"model": "llama3.2", "done": True, "message": {"role": "assistant", "content": ""}})
+
+
+class TrackingStream:
+    """
+    Wraps a chunk iterator and records how far it was read and whether it was closed.
+    """
+    def __init__(self, text: str, size: int = 5):
+        self.inner = chunks(text, size)
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        chunk = next(self.inner)
+        self.read += 1
+        return chunk
+
+    def close(self):
+        self.closed = True
+
+
+def test_parse_npc_from_stream():
+    """
+    Test that a valid NPC profile streamed in small chunks is parsed into an NPC.
+    """
+    with open("game/marlena_graves.json") as file:
+        text = file.read()
+    npc = parse_stream(chunks(text, size=3), NPC)
+    assert npc == NPC.from_file("game/marlena_graves.json")
+
+
+def test_invalid_enum_aborts_early():
+    """
+    Test that an impossible enum value stops the stream at the first bad character.
+    """
+    text = '{"name": "Lamp", "color": "Blue", "count": 1' + ' ' * 500 + '}'
+    stream = TrackingStream(text)
+
+    with pytest.raises(StreamValidationError, match="color: 'B' is not one of Red, Green"):
+        parse_stream(stream, Item)
+    assert stream.closed
+    assert stream.read < 10
+
+
+def test_npc_invalid_disposition():
+    """
+    Test that a Disposition outside the enum is rejected while streaming.
+    """
+    validator = StreamingJSONValidator(NPC)
+    with pytest.raises(StreamValidationError, match="personality.disposition"):
+        validator.feed('{"name": "A", "description": "B", "personality": {"attitudeTowardPlayer": "Neutral", "disposition": "Grumpy"')
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        ('Here is the JSON: {', "Unexpected character 'H'"),
+        ('{"name": 5', "Unexpected number"),
+        ('{"name": "Lamp", "color": "Red", "count": 1.5', "Expected an integer"),
+        ('{"name": "Lamp", "color": "Red", "count": 1, "tags": [1', r"tags.\[0\]: Unexpected number"),
+        ('{"name": "Lamp"}', "Missing required keys: color, count"),
+        ('{"name": "Lamp" "color"', "Expected ','"),
+    ]
+)
+def test_invalid_output_is_rejected(text, message):
+    """
+    Test that structural and type errors are reported as soon as they appear.
+    """
+    with pytest.raises(StreamValidationError, match=message):
+        StreamingJSONValidator(Item).feed(text)
+
+
+def test_stops_reading_after_complete_value():
+    """
+    Test that the stream is closed once the JSON value is complete.
+    """
+    text = json.dumps({"name": "Lamp", "color": "Green", "count": 2, "tags": ["a", "b\"c"]}) + " and some chatter" * 50
+    stream = TrackingStream(text)
+
+    item = parse_stream(stream, Item)
+    assert item.tags == ["a", "b\"c"]
+    assert stream.closed
+    assert stream.read < 20
+
+
+def test_incomplete_output():
+    """
+    Test that a stream that ends early is an error.
+    """
+    with pytest.raises(StreamValidationError, match="ended before"):
+        parse_stream(chunks('{"name": "Lamp"'), Item)
@@ -1 +1,3 @@
-from .npc import *
\ No newline at end of file
+from .npc import *
+from .registry import *
+from .batch import *
@@ -0,0 +1,163 @@
+"""
+Batch NPC generation.
+
+generate_npcs asks for count NPCs at once, cycling through a list of themes.
+Every request is started together and AsyncAIModel's semaphore bounds how many
+are in flight, so throughput follows its max_concurrency. A generated NPC whose
+name is already taken (in the directory or earlier in the batch) is generated
+again. Each NPC file is written atomically along with its cached persona, and
+the slots that are done are recorded in a manifest, so running the same batch
+again after an interruption only generates the missing NPCs. The manifest is
+removed once the batch is complete.
+"""
+
+import asyncio
+import json
+import os
+import re
+import unicodedata
+from typing import NamedTuple, Optional
+
+from src.ai_call import AsyncAIModel
+from src.npc.npc import NPC, load_persona
+from src.npc.registry import NPCRegistry
+
+MANIFEST_FILE = ".npc_manifest.json"
+# How many taken names are listed in the request, to keep the prompt short.
+AVOID_NAMES = 50
+_UNSAFE = re.compile(r"[^a-z0-9_-]+")
+
+
+class BatchResult(NamedTuple):
+    created: list[str]  # paths of the NPCs written by this run
+    resumed: int  # slots already done by an earlier run
+    failed: dict[int, str]  # slot -> error, to be retried by running the batch again
+
+
+def npc_file_name(name: str) -> str:
+    """
+    The file name for an NPC: its name in ASCII and lower case, with every run of
+    characters other than letters, digits, '-' and '_' replaced by '_'. A name
+    with nothing usable in it raises ValueError.
+    """
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    slug = _UNSAFE.sub("_", ascii_name.lower()).strip("_")
+    if not slug:
+        raise ValueError(f"NPC name {name!r} has no characters usable in a file name.")
+    return f"{slug}.json"
+
+
+def npc_path(directory: str, name: str) -> str:
+    """
+    Where the NPC called name is written in directory. Raises ValueError if the
+    path would end up outside directory.
+    """
+    path = os.path.join(directory, npc_file_name(name))
+    root = os.path.realpath(directory)
+    if os.path.dirname(os.path.realpath(path)) != root:
+        raise ValueError(f"NPC name {name!r} resolves outside {directory}.")
+    return path
+
+
+def npc_request(theme: Optional[str], taken: list[str]) -> str:
+    lines = []
+    if theme:
+        lines.append(f"Theme for this NPC: {theme}")
+    if taken:
+        lines.append(f"Do not use any of these names: {', '.join(taken[-AVOID_NAMES:])}")
+    return "\n".join(lines)
+
+
+class _Manifest:
+    """
+    The slots of a batch that are done. A manifest left by a different batch
+    (other count or themes) is ignored.
+    """
+    def __init__(self, path: str, count: int, themes: list[str]):
+        self.path = path
+        self.job = {"count": count, "themes": themes}
+        self.done: dict[int, str] = {}
+        try:
+            with open(path, "r") as file:
+                state = json.load(file)
+        except (OSError, json.JSONDecodeError):
+            return
+        if state.get("job") == self.job:
+            self.done = {int(slot): name for slot, name in state["done"].items()}
+
+    def mark(self, slot: int, file_name: str):
+        self.done[slot] = file_name
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"job": self.job, "done": self.done}, file)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def generate_npcs(
+    count: int,
+    themes: list[str],
+    ai_model: AsyncAIModel,
+    prompt: str,
+    directory: str = "game",
+    max_attempts: int = 3,
+    manifest_path: Optional[str] = None
+) -> BatchResult:
+    """
+    Generate count NPCs into directory. Slot i gets themes[i % len(themes)]
+    (no theme when themes is empty). A slot is tried max_attempts times when
+    its NPC has a name that is already taken.
+    """
+    if count < 0:
+        raise ValueError("count must not be negative.")
+    os.makedirs(directory, exist_ok=True)
+    manifest = _Manifest(manifest_path or os.path.join(directory, MANIFEST_FILE), count, themes)
+    registry = NPCRegistry(directory)
+    taken_names = [header.name for header in registry]
+    taken_files = set(os.listdir(directory))
+    for name in taken_names:
+        try:
+            taken_files.add(npc_file_name(name))
+        except ValueError:
+            pass
+
+    resumed = [slot for slot, file_name in manifest.done.items() if os.path.exists(os.path.join(directory, file_name))]
+    manifest.done = {slot: manifest.done[slot] for slot in resumed}
+    created: list[str] = []
+    failed: dict[int, str] = {}
+
+    async def generate(slot: int):
+        theme = themes[slot % len(themes)] if themes else None
+        for attempt in range(max_attempts):
+            npc = await NPC.acreate(prompt, ai_model, request=npc_request(theme, taken_names))
+            try:
+                path = npc_path(directory, npc.name)
+            except ValueError:
+                continue
+            file_name = os.path.basename(path)
+            # Checked and claimed without an await in between, so concurrent slots cannot both take a name.
+            if file_name in taken_files:
+                continue
+            taken_files.add(file_name)
+            taken_names.append(npc.name)
+            npc.to_file(path)
+            load_persona(path)
+            manifest.mark(slot, file_name)
+            created.append(path)
+            return
+        raise ValueError(f"Every NPC generated for slot {slot} had a name that was already taken or not usable as a file name.")
+
+    slots = [slot for slot in range(count) if slot not in manifest.done]
+    results = await asyncio.gather(*(generate(slot) for slot in slots), return_exceptions=True)
+    for slot, result in zip(slots, results):
+        if isinstance(result, BaseException):
+            if not isinstance(result, Exception):
+                raise result
+            failed[slot] = str(result)
+
+    if not failed:
+        manifest.remove()
+    return BatchResult(created, len(resumed), failed)
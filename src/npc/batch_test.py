@@ -0,0 +1,119 @@
+import asyncio
+import json
+import os
+
+import pytest
+from ollama import ChatResponse
+
+from src.ai_call import AsyncAIModel
+from src.npc import NPC, NPCRegistry, generate_npcs, npc_file_name, npc_path
+
+GAME = os.path.join(os.path.dirname(__file__), "..", "..", "game")
+EXAMPLE = NPC.from_file(os.path.join(GAME, "marlena_graves.json")).model_dump()
+
+
+class NPCClient:
+    """
+    Stands in for ollama.AsyncClient. Returns the example NPC renamed to the next
+    name in names, and fails the calls whose theme is in fail_on.
+    """
+    def __init__(self, names, fail_on=()):
+        self.names = list(names)
+        self.fail_on = fail_on
+        self.requests = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def chat(self, model, messages, stream=False, **kwargs):
+        request = messages[-1]["content"]
+        self.requests.append(request)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if any(theme in request for theme in self.fail_on):
+            raise ConnectionError("Ollama is down")
+        content = json.dumps(dict(EXAMPLE, name=self.names.pop(0)))
+
+        async def chunks():
+            yield ChatResponse.model_validate({"model": model, "done": True, "message": {"role": "assistant", "content": content}})
+        return chunks()
+
+
+def run(count, themes, client, directory, max_concurrency=2):
+    model = AsyncAIModel(max_concurrency=max_concurrency)
+    model.pool.clients = [client]
+    return asyncio.run(generate_npcs(count, themes, model, "Make an NPC.", directory=str(directory)))
+
+
+def test_batch_writes_unique_npcs(tmp_path):
+    """
+    Test that a batch writes count NPCs, regenerates taken names and stays within the concurrency bound.
+    """
+    NPC.model_validate(dict(EXAMPLE, name="Taken Name")).to_file(str(tmp_path / "taken_name.json"))
+    client = NPCClient(["Ada", "Taken Name", "ada", "Bo", "Cy", "Di"])
+
+    result = run(4, ["vampire", "ghoul"], client, tmp_path)
+
+    assert result.failed == {}
+    assert len(result.created) == 4
+    assert {header.name for header in NPCRegistry(str(tmp_path))} == {"Taken Name", "Ada", "Bo", "Cy", "Di"}
+    assert client.peak == 2
+    assert sum("Theme for this NPC: vampire" in request for request in client.requests) >= 2
+    assert not (tmp_path / ".npc_manifest.json").exists()
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_batch_resumes_from_manifest(tmp_path):
+    """
+    Test that a rerun generates only the slots that failed before.
+    """
+    first = run(4, ["vampire", "ghoul"], NPCClient(["Ada", "Bo"], fail_on=["ghoul"]), tmp_path)
+    assert sorted(first.failed) == [1, 3]
+    assert (tmp_path / ".npc_manifest.json").exists()
+
+    client = NPCClient(["Cy", "Di"])
+    second = run(4, ["vampire", "ghoul"], client, tmp_path)
+
+    assert second.resumed == 2
+    assert second.failed == {}
+    assert len(client.requests) == 2
+    assert all("ghoul" in request for request in client.requests)
+    assert len(NPCRegistry(str(tmp_path))) == 4
+    assert not (tmp_path / ".npc_manifest.json").exists()
+
+
+@pytest.mark.parametrize(
+    "name, file_name",
+    [
+        ("Marlena Graves", "marlena_graves.json"),
+        ("../../etc/passwd", "etc_passwd.json"),
+        ("C:\\Windows\\evil", "c_windows_evil.json"),
+        (".hidden", "hidden.json"),
+        ("Zoë O'Hara", "zoe_o_hara.json"),
+    ]
+)
+def test_npc_file_name_is_a_safe_slug(name, file_name):
+    """
+    Test that NPC names become plain file names with no separators or leading dots.
+    """
+    assert npc_file_name(name) == file_name
+
+
+def test_npc_path_stays_in_the_directory(tmp_path):
+    """
+    Test that unusable names are refused and the path is always directly under the directory.
+    """
+    with pytest.raises(ValueError):
+        npc_path(str(tmp_path), "../..")
+    assert os.path.dirname(npc_path(str(tmp_path), "/tmp/Ada")) == str(tmp_path)
+
+
+def test_batch_regenerates_unusable_names(tmp_path):
+    """
+    Test that an NPC whose name has nothing usable in it is generated again instead of being written.
+    """
+    result = run(1, [], NPCClient(["../", "Ada"]), tmp_path)
+
+    assert result.failed == {}
+    assert result.created == [os.path.join(str(tmp_path), "ada.json")]
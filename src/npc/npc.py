@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import os
 from pydantic import BaseModel
 from enum import Enum
-from typing import Optional
+from typing import Any, NamedTuple, Optional
 
-from src.ai_call import AIModel, Message
+from src.ai_call import AIModel, AsyncAIModel, Message, Purpose, estimate_tokens
 
 # Define enums for limited choice fields
 class AttitudeTowardPlayer(str, Enum):
@@ -42,6 +44,99 @@ class Presence(str, Enum):
     commanding = "Commanding"
     mysterious = "Mysterious"
 
+# Short names used in the persona rendering. Section names (personality, ...) are dropped.
+PERSONA_KEYS = {
+    "description": "about",
+    "attitudeTowardPlayer": "attitude",
+    "disposition": "mood",
+    "motivations": "motive",
+    "intelligence": "intellect",
+    "knowledgeAreas": "knows",
+    "speechAccent": "accent",
+    "mannerisms": "manner",
+    "pacing": "pace",
+    "tone": "tone",
+    "keyPhrases": "says",
+    "connections": "ties",
+    "alignment": "align",
+    "combatAbility": "combat",
+    "powersOrSkills": "skills",
+    "questUtility": "role",
+    "uniqueFeatures": "looks",
+    "wardrobe": "wears",
+    "bodyLanguage": "body",
+    "presence": "presence",
+    "behaviorTriggers": "if",
+    "hintsAndClues": "hints",
+    "evolution": "arc",
+    "potentialBetrayal": "betrayal",
+}
+# Bump when the rendering changes, so cached personas are rebuilt.
+PERSONA_VERSION = 2
+
+
+class Persona(NamedTuple):
+    text: str
+    # estimate_tokens(text): about four characters per token, not a tokenizer count.
+    estimated_tokens: int
+
+
+def _persona_value(value: Any) -> str:
+    if isinstance(value, list):
+        return "; ".join(_persona_value(item) for item in value)
+    if isinstance(value, dict):
+        # e.g. a behavior trigger: "Player lies to her -> Becomes hostile"
+        return " -> ".join(_persona_value(item) for item in value.values())
+    return str(value)
+
+
+def _persona_lines(data: dict) -> list[str]:
+    lines = []
+    for key, value in data.items():
+        if value is None or value == [] or value == {}:
+            continue
+        if isinstance(value, dict) and key != "behaviorTriggers":
+            lines.extend(_persona_lines(value))
+        else:
+            lines.append(f"{PERSONA_KEYS.get(key, key)}: {_persona_value(value)}")
+    return lines
+
+
+def persona_path(file_path: str) -> str:
+    root, _ = os.path.splitext(file_path)
+    return root + ".persona"
+
+
+def load_persona(file_path: str) -> Persona:
+    """
+    The persona of the NPC saved at file_path. The rendering is cached next to the
+    JSON (name.persona) with a hash of the file it came from, so it is only
+    rebuilt when the NPC file or the rendering changes.
+    """
+    with open(file_path, 'rb') as file:
+        source = file.read()
+    digest = hashlib.sha256(source + b"%d" % PERSONA_VERSION).hexdigest()
+
+    cache_path = persona_path(file_path)
+    try:
+        with open(cache_path, 'r') as file:
+            cached = json.load(file)
+        if cached["hash"] == digest:
+            return Persona(cached["text"], cached["estimated_tokens"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    persona = NPC.model_validate_json(source).persona()
+    tmp_path = cache_path + ".tmp"
+    try:
+        with open(tmp_path, 'w') as file:
+            json.dump({"hash": digest, "text": persona.text, "estimated_tokens": persona.estimated_tokens}, file)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+    return persona
+
+
 # Define the Pydantic models
 class Personality(BaseModel):
     attitudeTowardPlayer: AttitudeTowardPlayer
@@ -97,6 +192,17 @@ class NPC(BaseModel):
     physicalTraits: PhysicalTraits
     interactivity: Interactivity
 
+    def persona(self) -> Persona:
+        """
+        The NPC as a terse prompt: one "key: value" line per field, with short key
+        names, nested sections flattened and empty fields left out, so no tokens go
+        on quotes, braces and long key names. Use load_persona for an NPC saved to
+        a file.
+        """
+        data = self.model_dump(mode="json", exclude_none=True)
+        text = "\n".join([f"name: {data.pop('name')}"] + _persona_lines(data))
+        return Persona(text, estimate_tokens(text))
+
     @staticmethod
     def from_file(file_path: str):
         with open(file_path, 'r') as file:
@@ -104,24 +210,29 @@ class NPC(BaseModel):
         return NPC(**npc_data)
 
     def to_file(self, file_path: str):
-        with open(file_path, 'w') as file:
+        # Written to a temporary file first, so a reader never sees half an NPC.
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, 'w') as file:
             json.dump(self.model_dump(), file, indent=2)
+        os.replace(tmp_path, file_path)
+
+    @staticmethod
+    def create(prompt: str, ai_model: AIModel, max_retries: int = 3, request: str = "") -> NPC:
+        """
+        Generate an NPC. The NPC schema is passed to Ollama as the output format
+        and the output is validated while it streams, so a generation that goes
+        wrong is stopped at the first bad token and retried. request is sent as
+        the user message, e.g. a theme for the NPC.
+        """
+        return ai_model.structured(NPC._messages(prompt, request), NPC, purpose=Purpose.npc_generation, max_retries=max_retries)
+
+    @staticmethod
+    async def acreate(prompt: str, ai_model: AsyncAIModel, max_retries: int = 3, request: str = "") -> NPC:
+        """
+        Coroutine version of create.
+        """
+        return await ai_model.structured(NPC._messages(prompt, request), NPC, purpose=Purpose.npc_generation, max_retries=max_retries)
 
     @staticmethod
-    def create(prompt: str, ai_model: AIModel) -> NPC:
-        system_message = Message(
-            role='system',
-            content=prompt
-        )
-
-        user_message = Message(
-            role='user',
-            content=""
-        )
-
-        npc_data = ai_model.response([system_message, user_message])
-        content = npc_data['message']['content']
-        print(content)
-        npc_dict = json.loads(content)
-        return NPC(**npc_dict)
-        
\ No newline at end of file
+    def _messages(prompt: str, request: str) -> list[Message]:
+        return [Message(role='system', content=prompt), Message(role='user', content=request)]
@@ -0,0 +1,54 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from src.ai_call import estimate_tokens
+from src.npc import NPC, NPCRegistry, load_persona, persona_path
+
+GAME = os.path.join(os.path.dirname(__file__), "..", "..", "game")
+
+
+@pytest.fixture
+def npc_file(tmp_path):
+    path = tmp_path / "marlena_graves.json"
+    shutil.copy(os.path.join(GAME, "marlena_graves.json"), path)
+    return str(path)
+
+
+def test_persona_is_terse(npc_file):
+    """
+    Test that the persona keeps every value, drops nulls and is shorter than the JSON.
+    """
+    npc = NPC.from_file(npc_file)
+    npc.communication.pacing = None
+    persona = npc.persona()
+
+    lines = persona.text.splitlines()
+    assert lines[0] == "name: Marlena Graves"
+    assert "attitude: Neutral" in lines
+    assert "if: Player lies to her -> Becomes hostile and refuses to assist; Player gifts her a rare magical item -> Becomes friendly and shares a crucial secret" in lines
+    assert not any(line.startswith("pace:") for line in lines)
+    assert "Luther Kaine" in persona.text
+    assert persona.estimated_tokens == estimate_tokens(persona.text)
+    assert persona.estimated_tokens < estimate_tokens(npc.model_dump_json(exclude_none=True)) * 0.8
+
+
+def test_persona_cache_follows_the_npc_file(npc_file, monkeypatch):
+    """
+    Test that the cached rendering is reused until the NPC file changes.
+    """
+    first = load_persona(npc_file)
+    assert os.path.exists(persona_path(npc_file))
+
+    monkeypatch.setattr(NPC, "persona", lambda self: pytest.fail("rendered again"))
+    assert load_persona(npc_file) == first
+    monkeypatch.undo()
+
+    data = json.loads(open(npc_file).read())
+    data["personality"]["attitudeTowardPlayer"] = "Hostile"
+    with open(npc_file, "w") as file:
+        json.dump(data, file)
+    assert "attitude: Hostile" in load_persona(npc_file).text
+    assert "attitude: Hostile" in NPCRegistry(os.path.dirname(npc_file)).persona("Marlena Graves").text
@@ -0,0 +1,215 @@
+"""
+Registry of the NPCs saved as JSON files in the game directory.
+
+Scanning reads only a small header per NPC (name, attitude, motivation, combat
+ability and alignment) and keeps the headers in an index file next to the NPCs,
+so a restart re-reads only the files whose modification time or size changed.
+The full NPC model is parsed the first time it is asked for and kept in a
+bounded LRU, so queries over thousands of NPCs never validate them all.
+"""
+
+import json
+import os
+from collections import OrderedDict
+from typing import Iterator, NamedTuple, Optional
+
+from src.npc.npc import NPC, AttitudeTowardPlayer, CombatAbility, Motivation, Persona, load_persona
+
+INDEX_FILE = ".npc_index.json"
+INDEX_VERSION = 1
+
+
+class NPCHeader(NamedTuple):
+    name: str
+    path: str
+    attitude: AttitudeTowardPlayer
+    motivation: Motivation
+    combat_ability: CombatAbility
+    alignment: Optional[str]
+
+
+def read_header(path: str) -> NPCHeader:
+    """
+    Read the header fields of an NPC file without validating the whole NPC.
+    """
+    with open(path, "r") as file:
+        data = json.load(file)
+    try:
+        return NPCHeader(
+            name=data["name"],
+            path=path,
+            attitude=AttitudeTowardPlayer(data["personality"]["attitudeTowardPlayer"]),
+            motivation=Motivation(data["personality"]["motivations"]),
+            combat_ability=CombatAbility(data["roleSpecificTraits"]["combatAbility"]),
+            alignment=(data.get("relationships") or {}).get("alignment"),
+        )
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"{path} is not an NPC file: missing {e}.") from e
+
+
+class NPCRegistry:
+    def __init__(self, directory: str = "game", max_loaded: int = 64, index_path: Optional[str] = None):
+        """
+        max_loaded bounds how many fully parsed NPCs are kept in memory. The
+        header index is kept in index_path, by default .npc_index.json in directory.
+        """
+        if max_loaded <= 0:
+            raise ValueError("max_loaded must be greater than zero.")
+        self.directory = directory
+        self.max_loaded = max_loaded
+        self.index_path = index_path if index_path is not None else os.path.join(directory, INDEX_FILE)
+        self.headers: dict[str, NPCHeader] = {}
+        # Files that could not be read, with the reason.
+        self.invalid: dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self._stats: dict[str, tuple[int, int]] = {}
+        self._loaded: OrderedDict[str, NPC] = OrderedDict()
+        self.refresh()
+
+    def refresh(self):
+        """
+        Rescan the directory. Only new or changed files are read; the index file
+        is rewritten when anything changed.
+        """
+        cached = self._read_index()
+        headers: dict[str, NPCHeader] = {}
+        stats: dict[str, tuple[int, int]] = {}
+        self.invalid = {}
+        changed = False
+
+        with os.scandir(self.directory) as entries:
+            files = sorted((entry.name, entry.stat()) for entry in entries if entry.name.endswith(".json") and not entry.name.startswith(".") and entry.is_file())
+        for name, stat in files:
+            path = os.path.join(self.directory, name)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            entry = cached.get(name)
+            if entry is not None and tuple(entry["stat"]) == signature:
+                header = self._header_from_index(path, entry["header"])
+            else:
+                changed = True
+                try:
+                    header = read_header(path)
+                except (OSError, ValueError) as e:
+                    self.invalid[path] = str(e)
+                    continue
+            if header.name in headers:
+                self.invalid[path] = f"Duplicate NPC name {header.name!r}, already in {headers[header.name].path}."
+                continue
+            headers[header.name] = header
+            stats[name] = signature
+            if self._stats.get(name) != signature:
+                # Drop a parsed copy of a file that has since changed.
+                self._loaded.pop(path, None)
+
+        if changed or set(cached) != set(stats):
+            self._write_index(headers, stats)
+        self.headers = headers
+        self._stats = stats
+
+    def __len__(self) -> int:
+        return len(self.headers)
+
+    def __iter__(self) -> Iterator[NPCHeader]:
+        return iter(self.headers.values())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.headers
+
+    def __getitem__(self, name: str) -> NPC:
+        return self.get(name)
+
+    def get(self, name: str) -> NPC:
+        """
+        The NPC with the given name, parsed on first access.
+        """
+        header = self.headers.get(name)
+        if header is None:
+            raise KeyError(f"No NPC named {name!r} in {self.directory}.")
+        npc = self._loaded.get(header.path)
+        if npc is None:
+            self.misses += 1
+            npc = NPC.from_file(header.path)
+        else:
+            self.hits += 1
+        self._loaded[header.path] = npc
+        self._loaded.move_to_end(header.path)
+        while len(self._loaded) > self.max_loaded:
+            self._loaded.popitem(last=False)
+        return npc
+
+    def persona(self, name: str) -> Persona:
+        """
+        The prompt rendering of the NPC, from its cache file when that is up to date.
+        """
+        header = self.headers.get(name)
+        if header is None:
+            raise KeyError(f"No NPC named {name!r} in {self.directory}.")
+        return load_persona(header.path)
+
+    def find(
+        self,
+        attitude: Optional[AttitudeTowardPlayer] = None,
+        motivation: Optional[Motivation] = None,
+        combat_ability: Optional[CombatAbility] = None,
+        alignment: Optional[str] = None
+    ) -> list[NPCHeader]:
+        """
+        Headers of the NPCs matching every given attribute, e.g.
+        find(attitude=AttitudeTowardPlayer.hostile, combat_ability=CombatAbility.specialist).
+        Enum attributes also accept their values ("Hostile"); alignment is compared
+        without regard to case.
+        """
+        attitude = AttitudeTowardPlayer(attitude) if attitude is not None else None
+        motivation = Motivation(motivation) if motivation is not None else None
+        combat_ability = CombatAbility(combat_ability) if combat_ability is not None else None
+        alignment = alignment.casefold() if alignment is not None else None
+        return [
+            header for header in self.headers.values()
+            if (attitude is None or header.attitude == attitude)
+            and (motivation is None or header.motivation == motivation)
+            and (combat_ability is None or header.combat_ability == combat_ability)
+            and (alignment is None or (header.alignment or "").casefold() == alignment)
+        ]
+
+    def load(self, headers: list[NPCHeader]) -> list[NPC]:
+        """
+        The NPCs of headers returned by find.
+        """
+        return [self.get(header.name) for header in headers]
+
+    def _header_from_index(self, path: str, entry: list) -> NPCHeader:
+        name, attitude, motivation, combat_ability, alignment = entry
+        return NPCHeader(name, path, AttitudeTowardPlayer(attitude), Motivation(motivation), CombatAbility(combat_ability), alignment)
+
+    def _read_index(self) -> dict[str, dict]:
+        try:
+            with open(self.index_path, "r") as file:
+                index = json.load(file)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+            return {}
+        return index.get("files", {})
+
+    def _write_index(self, headers: dict[str, NPCHeader], stats: dict[str, tuple[int, int]]):
+        by_file = {os.path.basename(header.path): header for header in headers.values()}
+        index = {
+            "version": INDEX_VERSION,
+            "files": {
+                name: {
+                    "stat": list(stat),
+                    "header": [by_file[name].name, by_file[name].attitude.value, by_file[name].motivation.value,
+                               by_file[name].combat_ability.value, by_file[name].alignment],
+                }
+                for name, stat in stats.items()
+            },
+        }
+        tmp_path = self.index_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as file:
+                json.dump(index, file, separators=(",", ":"))
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # A read-only game directory still works, it is just rescanned every time.
+            pass
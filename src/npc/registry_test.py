@@ -0,0 +1,90 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from src.npc import NPC, AttitudeTowardPlayer, CombatAbility, NPCRegistry
+
+GAME = os.path.join(os.path.dirname(__file__), "..", "..", "game")
+
+
+@pytest.fixture
+def game(tmp_path):
+    for name in os.listdir(GAME):
+        if name.endswith(".json") and not name.startswith("."):
+            shutil.copy(os.path.join(GAME, name), tmp_path / name)
+    return tmp_path
+
+
+def test_find_by_attributes(game):
+    """
+    Test that queries match the NPC files without parsing any of them.
+    """
+    registry = NPCRegistry(str(game))
+
+    suspicious = registry.find(attitude="Suspicious", combat_ability=CombatAbility.specialist)
+    assert [header.name for header in suspicious] == ["Kaelin Darkshadow"]
+    assert {header.name for header in registry.find(alignment="neutral good")} == {"Eleanor Wychwood"}
+    assert registry.find(attitude=AttitudeTowardPlayer.hostile) == []
+    assert registry.misses == 0
+
+    npc = registry.load(suspicious)[0]
+    assert npc == NPC.from_file(str(game / "kaelin_darkshadow.json"))
+
+
+def test_index_is_reused_until_a_file_changes(game, monkeypatch):
+    """
+    Test that a second registry reads headers from the index and rereads only changed files.
+    """
+    NPCRegistry(str(game))
+    assert (game / ".npc_index.json").exists()
+
+    path = game / "marlena_graves.json"
+    data = json.loads(path.read_text())
+    data["personality"]["attitudeTowardPlayer"] = "Hostile"
+    path.write_text(json.dumps(data))
+
+    read = []
+    from src.npc import registry as module
+    original = module.read_header
+    monkeypatch.setattr(module, "read_header", lambda p: read.append(p) or original(p))
+    registry = NPCRegistry(str(game))
+
+    assert read == [str(path)]
+    assert [header.name for header in registry.find(attitude="Hostile")] == ["Marlena Graves"]
+
+
+def test_lru_bounds_parsed_npcs(game):
+    """
+    Test that only max_loaded NPCs stay parsed and that a changed file is parsed again.
+    """
+    registry = NPCRegistry(str(game), max_loaded=2)
+    registry["Marlena Graves"]
+    registry["Elara Vex"]
+    registry["Marlena Graves"]
+    registry["Kaelin Darkshadow"]
+    assert (registry.hits, registry.misses) == (1, 3)
+    registry["Marlena Graves"]
+    registry["Elara Vex"]
+    assert (registry.hits, registry.misses) == (2, 4)
+
+    path = game / "marlena_graves.json"
+    data = json.loads(path.read_text())
+    data["description"] = "Changed."
+    path.write_text(json.dumps(data))
+    registry.refresh()
+    assert registry["Marlena Graves"].description == "Changed."
+
+    with pytest.raises(KeyError):
+        registry["Nobody"]
+
+
+def test_invalid_files_are_reported(game):
+    """
+    Test that a broken file is skipped and listed in invalid instead of failing the scan.
+    """
+    (game / "broken.json").write_text("{\"name\": \"Half")
+    registry = NPCRegistry(str(game))
+    assert len(registry) == 7
+    assert list(registry.invalid) == [os.path.join(str(game), "broken.json")]
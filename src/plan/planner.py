@@ -1,6 +1,13 @@
+import asyncio
+import heapq
+from collections.abc import Mapping
 from enum import Enum
-from typing import Dict, Optional
-from pydantic import BaseModel, Field
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel, Field, RootModel
+
+from src.ai_call import AIModel, AsyncAIModel, Message, Purpose, estimate_tokens
 
 # Define the magical materials as an Enum
 class MagicalMaterial(str, Enum):
@@ -31,21 +38,427 @@ class AgentPlan(BaseModel):
         None, description="The amount of magical material or money involved in the action."
     )
 
+# Plans for a group of agents, keyed by agent ID
+class AgentPlans(RootModel[Dict[str, AgentPlan]]):
+    pass
+
+MATERIALS = list(MagicalMaterial)
+
+# Money and grams of every material for many agents, one row per agent
+class AgentPopulation(Mapping):
+    """
+    Struct-of-arrays population: money is a vector and the material quantities an
+    (agents x materials) array, columns in MagicalMaterial order. It is a read-only
+    Mapping from agent ID to Inventory, so it can be used wherever a dict of
+    inventories is expected; each Inventory is built on access and is a copy.
+    Write changes back with set_inventory or to the arrays directly.
+    """
+    def __init__(self, money: np.ndarray, materials: np.ndarray, ids: Optional[List[str]] = None):
+        self.money = np.asarray(money, dtype=np.int32)
+        self.materials = np.asarray(materials, dtype=np.int32)
+        if self.materials.shape != (len(self.money), len(MATERIALS)):
+            raise ValueError(f"materials must have shape ({len(self.money)}, {len(MATERIALS)}), got {self.materials.shape}.")
+        if ids is not None and len(ids) != len(self.money):
+            raise ValueError("There must be one ID per agent.")
+        self._ids = list(ids) if ids is not None else None
+        self._positions: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def seed(cls, num_agents: int, seed: Optional[int] = None, money: Tuple[int, int] = (50, 500), grams: Tuple[int, int] = (0, 50)) -> "AgentPopulation":
+        """
+        Random money and material quantities, both ranges inclusive, drawn in one call.
+        The same seed always gives the same population.
+        """
+        low = [money[0]] + [grams[0]] * len(MATERIALS)
+        high = [money[1]] + [grams[1]] * len(MATERIALS)
+        values = np.random.default_rng(seed).integers(low, high, size=(num_agents, len(low)), endpoint=True, dtype=np.int32)
+        return cls(values[:, 0], values[:, 1:])
+
+    @classmethod
+    def from_inventories(cls, agents: Dict[str, Inventory]) -> "AgentPopulation":
+        money = [inventory.money for inventory in agents.values()]
+        materials = [[inventory.magical_materials.get(material, 0) for material in MATERIALS] for inventory in agents.values()]
+        return cls(money, np.array(materials, dtype=np.int32).reshape(len(money), len(MATERIALS)), list(agents))
+
+    @property
+    def ids(self) -> List[str]:
+        if self._ids is None:
+            self._ids = [f"Agent_{i}" for i in range(1, len(self.money) + 1)]
+        return self._ids
+
+    def position(self, agent_id: str) -> int:
+        if self._positions is None:
+            self._positions = {agent_id: i for i, agent_id in enumerate(self.ids)}
+        return self._positions[agent_id]
+
+    def inventory(self, position: int) -> Inventory:
+        return Inventory(money=int(self.money[position]), magical_materials=dict(zip(MATERIALS, self.materials[position].tolist())))
+
+    def set_inventory(self, agent_id: str, inventory: Inventory):
+        position = self.position(agent_id)
+        self.money[position] = inventory.money
+        self.materials[position] = [inventory.magical_materials.get(material, 0) for material in MATERIALS]
+
+    def __getitem__(self, agent_id: str) -> Inventory:
+        return self.inventory(self.position(agent_id))
+
+    def __contains__(self, agent_id) -> bool:
+        try:
+            self.position(agent_id)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.ids)
+
+    def __len__(self) -> int:
+        return len(self.money)
+
 # Function to seed agents with initial inventory
-def seed_agents(num_agents: int) -> Dict[str, Inventory]:
-    from random import randint, choice
-
-    agents = {}
-    for i in range(1, num_agents + 1):
-        agent_id = f"Agent_{i}"
-        inventory = Inventory(
-            money=randint(50, 500),  # Seed random money between 50 and 500
-            magical_materials={
-                material: randint(0, 50) for material in MagicalMaterial  # Seed random quantities between 0 and 50 grams
-            }
+def seed_agents(num_agents: int, seed: Optional[int] = None) -> AgentPopulation:
+    """
+    Agents with 50 to 500 money and 0 to 50 grams of every material.
+    """
+    return AgentPopulation.seed(num_agents, seed)
+
+def agent_line(agent_id: str, inventory: Inventory) -> str:
+    return f"\t•\t{agent_id}: {inventory.model_dump_json()}"
+
+def plan_prompt(agents: Dict[str, Inventory], template_path: str = "prompts/planner.txt", summary: Optional[str] = None) -> str:
+    """
+    Fill the planner prompt template with the agents' inventories and a market
+    summary (market_summary of the agents themselves when not given).
+    """
+    with open(template_path, 'r') as file:
+        template = file.read()
+    lines = "\n".join(agent_line(agent_id, inventory) for agent_id, inventory in agents.items())
+    if summary is None:
+        summary = market_summary(agents)
+    return template.format(agents=lines, count=len(agents), summary=summary)
+
+def request_plans(agents: Dict[str, Inventory], ai_model: AIModel) -> Dict[str, AgentPlan]:
+    """
+    Ask the LLM for a plan per agent. The AgentPlans schema is the output format,
+    so the reply is always valid plans.
+    """
+    message = Message(role='user', content=plan_prompt(agents))
+    plans = ai_model.structured([message], AgentPlans, purpose=Purpose.planning)
+    return plans.root
+
+# Thresholds from prompts/planner.txt
+DEFICIT_BELOW = 10  # grams; less than this and the agent wants more
+SURPLUS_ABOVE = 40  # grams; more than this and the agent sells
+POOR_BELOW = 100  # money; less than this and the agent barters or steals instead of buying
+# Stock level agents buy up to and sell down to
+TARGET_STOCK = 25
+
+def match_plans(agents: Dict[str, Inventory] | AgentPopulation) -> Dict[str, AgentPlan]:
+    """
+    Plan every agent by applying the planner rules directly, without the LLM.
+
+    Each agent short of a material (below DEFICIT_BELOW) asks for its scarcest one.
+    Per material, those buyers are served most urgent first by the seller with the
+    largest surplus left (above SURPLUS_ABOVE), from a priority queue. Buyers with
+    less than POOR_BELOW money barter if they have a surplus to offer and steal if
+    not. Agents that are not buying sell the material they are selling most of,
+    and everyone else inquires about their scarcest material. Buyers targeting
+    each other in a loop are then split up, see break_cycles. Ties go to the
+    agent that comes first.
+    """
+    population = agents if isinstance(agents, AgentPopulation) else AgentPopulation.from_inventories(agents)
+    ids = population.ids
+    quantities = population.materials
+    rows = np.arange(len(population))
+
+    scarcest = quantities.argmin(axis=1)
+    scarcest_quantity = quantities[rows, scarcest]
+    surplus = np.where(quantities > SURPLUS_ABOVE, quantities - TARGET_STOCK, 0)
+    has_surplus = surplus.any(axis=1)
+    buyer_actions = np.where(population.money >= POOR_BELOW, "buy", np.where(has_surplus, "barter", "steal"))
+    wanting = scarcest_quantity < DEFICIT_BELOW
+
+    plans: List[Optional[AgentPlan]] = [None] * len(population)
+    sold: Dict[int, Dict[int, int]] = {}
+    books: Dict[MagicalMaterial, List[Tuple[int, int, str]]] = {}
+    for column, material in enumerate(MATERIALS):
+        # Max-heap of (-surplus, position, agent_id)
+        book = [(-int(surplus[i, column]), int(i), ids[i]) for i in np.flatnonzero(surplus[:, column])]
+        heapq.heapify(book)
+        books[material] = book
+        # Most urgent buyer first: lowest stock, then position
+        buyers = np.flatnonzero(wanting & (scarcest == column))
+        buyers = buyers[np.argsort(scarcest_quantity[buyers], kind="stable")]
+        for buyer, quantity in zip(buyers.tolist(), scarcest_quantity[buyers].tolist()):
+            if not book:
+                plans[buyer] = AgentPlan(action="inquire", target_item=material)
+                continue
+            remaining, seller, seller_id = heapq.heappop(book)
+            amount = min(TARGET_STOCK - quantity, -remaining)
+            if remaining + amount < 0:
+                heapq.heappush(book, (remaining + amount, seller, seller_id))
+            plans[buyer] = AgentPlan(action=str(buyer_actions[buyer]), target_item=material, target_agent=seller_id, amount=amount)
+            sales = sold.setdefault(seller, {})
+            sales[column] = sales.get(column, 0) + amount
+
+    for i, plan in enumerate(plans):
+        if plan is not None:
+            continue
+        # Sellers offer what their buyers asked for, or else their largest surplus, to whoever comes.
+        if i in sold:
+            column = max(sold[i], key=lambda c: (sold[i][c], -c))
+            plans[i] = AgentPlan(action="sell", target_item=MATERIALS[column], amount=sold[i][column])
+        elif has_surplus[i]:
+            column = int(surplus[i].argmax())
+            plans[i] = AgentPlan(action="sell", target_item=MATERIALS[column], amount=int(surplus[i, column]))
+        else:
+            plans[i] = AgentPlan(action="inquire", target_item=MATERIALS[scarcest[i]])
+
+    by_id = dict(zip(ids, plans))
+    break_cycles(by_id, books)
+    return by_id
+
+def find_cycles(plans: Dict[str, AgentPlan]) -> List[List[str]]:
+    """
+    The cycles in the graph where each agent points at its plan's target_agent.
+    Each agent has at most one target, so one walk per agent finds them all.
+    """
+    state: Dict[str, int] = {}  # 1 on the current walk, 2 done
+    cycles = []
+    for start in plans:
+        path = []
+        node = start
+        while node in plans and node not in state:
+            state[node] = 1
+            path.append(node)
+            node = plans[node].target_agent
+        if node in state and state[node] == 1:
+            cycles.append(path[path.index(node):])
+        for visited in path:
+            state[visited] = 2
+    return cycles
+
+def break_cycles(plans: Dict[str, AgentPlan], books: Optional[Dict[MagicalMaterial, List[Tuple[int, int, str]]]] = None) -> Dict[str, AgentPlan]:
+    """
+    Remove cycles from plans in place. In each cycle the plan with the smallest
+    amount (then the lowest agent ID) that can be moved to another seller from
+    books, the leftover surplus per material, whose own targets do not lead back
+    to it, is moved. If none can, that first plan trades with the market instead
+    (target_agent None).
+    """
+    books = books or {}
+    while cycles := find_cycles(plans):
+        for cycle in cycles:
+            candidates = sorted(cycle, key=lambda a: (plans[a].amount or 0, a))
+            for agent_id in candidates:
+                plan = plans[agent_id]
+                seller = _other_seller(plans, books.get(plan.target_item, []), agent_id, plan.amount or 0)
+                if seller is not None:
+                    break
+            else:
+                agent_id, plan = candidates[0], plans[candidates[0]]
+            plans[agent_id] = plan.model_copy(update={"target_agent": seller})
+    return plans
+
+def _other_seller(plans: Dict[str, AgentPlan], book: List[Tuple[int, int, str]], agent_id: str, amount: int) -> Optional[str]:
+    for entry in sorted(book):
+        remaining, position, seller = entry
+        if -remaining < amount:
+            break
+        if seller != agent_id and not _leads_to(plans, seller, agent_id):
+            book.remove(entry)
+            if remaining + amount < 0:
+                book.append((remaining + amount, position, seller))
+            heapq.heapify(book)
+            return seller
+    return None
+
+def _leads_to(plans: Dict[str, AgentPlan], start: str, target: str) -> bool:
+    seen = set()
+    node = start
+    while node in plans and node not in seen:
+        if node == target:
+            return True
+        seen.add(node)
+        node = plans[node].target_agent
+    return node == target
+
+# Rough size of one agent's plan in the reply, in tokens
+PLAN_TOKENS = 40
+# How many sellers per material the market summary names
+SUMMARY_SELLERS = 5
+
+def market_summary(agents: Dict[str, Inventory] | AgentPopulation, sellers: int = SUMMARY_SELLERS) -> str:
+    """
+    One line per material: how many agents are short of it and by how much, how
+    much surplus there is, and the agents with the largest surplus. Its size does
+    not depend on the number of agents.
+    """
+    population = agents if isinstance(agents, AgentPopulation) else AgentPopulation.from_inventories(agents)
+    quantities = population.materials
+    shortfall = np.where(quantities < DEFICIT_BELOW, TARGET_STOCK - quantities, 0)
+    surplus = np.where(quantities > SURPLUS_ABOVE, quantities - TARGET_STOCK, 0)
+    lines = []
+    for column, material in enumerate(MATERIALS):
+        top = np.argsort(-surplus[:, column], kind="stable")[:sellers]
+        top = [f"{population.ids[i]} ({surplus[i, column]}g)" for i in top.tolist() if surplus[i, column] > 0]
+        lines.append(
+            f"{material.value}: {np.count_nonzero(shortfall[:, column])} agents short by {shortfall[:, column].sum()}g, "
+            f"{np.count_nonzero(surplus[:, column])} agents with {surplus[:, column].sum()}g surplus"
+            + (f"; largest sellers {', '.join(top)}" if top else "")
         )
-        agents[agent_id] = inventory
-    return agents
+    return "\n".join(lines)
+
+def shard_agents(agents: Dict[str, Inventory] | AgentPopulation, token_budget: int, fixed_tokens: int = 0) -> List[Dict[str, Inventory]]:
+    """
+    Split agents into chunks whose prompt lines plus expected replies fit in
+    token_budget, after fixed_tokens for the rest of the prompt.
+    """
+    available = token_budget - fixed_tokens
+    chunks: List[Dict[str, Inventory]] = []
+    chunk: Dict[str, Inventory] = {}
+    used = 0
+    for agent_id, inventory in agents.items():
+        cost = estimate_tokens(agent_line(agent_id, inventory)) + PLAN_TOKENS
+        if cost > available:
+            raise ValueError(f"token_budget {token_budget} leaves no room for a single agent.")
+        if used + cost > available:
+            chunks.append(chunk)
+            chunk, used = {}, 0
+        chunk[agent_id] = inventory
+        used += cost
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+async def request_plans_sharded(
+    agents: Dict[str, Inventory] | AgentPopulation,
+    ai_model: AsyncAIModel,
+    token_budget: Optional[int] = None,
+    template_path: str = "prompts/planner.txt"
+) -> Dict[str, AgentPlan]:
+    """
+    LLM plans for any number of agents. Agents are split into chunks that fit
+    token_budget (the planning policy's num_ctx by default), each chunk's prompt
+    carries the same market summary, and the chunks are sent concurrently, as many
+    at a time as ai_model allows. The replies are merged with merge_plans; agents
+    whose chunk failed get their match_plans plan.
+    """
+    population = agents if isinstance(agents, AgentPopulation) else AgentPopulation.from_inventories(agents)
+    if token_budget is None:
+        token_budget = ai_model.router.route(Purpose.planning, ai_model.model).options.get("num_ctx", 4096)
+
+    summary = market_summary(population)
+    fixed_tokens = estimate_tokens(plan_prompt({}, template_path, summary))
+    chunks = shard_agents(population, token_budget, fixed_tokens)
+
+    async def request(chunk: Dict[str, Inventory]) -> Dict[str, AgentPlan]:
+        message = Message(role='user', content=plan_prompt(chunk, template_path, summary))
+        plans = await ai_model.structured([message], AgentPlans, purpose=Purpose.planning)
+        return plans.root
+
+    replies = await asyncio.gather(*(request(chunk) for chunk in chunks), return_exceptions=True)
+    proposals: Dict[str, AgentPlan] = {}
+    for chunk, reply in zip(chunks, replies):
+        if isinstance(reply, BaseException):
+            if not isinstance(reply, Exception):
+                raise reply
+            continue
+        # A chunk may only plan its own agents.
+        proposals.update((agent_id, plan) for agent_id, plan in reply.items() if agent_id in chunk)
+    return merge_plans(population, proposals)
+
+BUYING = ("buy", "barter", "steal")
+ACTIONS = BUYING + ("sell", "inquire")
+
+def merge_plans(agents: Dict[str, Inventory] | AgentPopulation, proposals: Dict[str, AgentPlan]) -> Dict[str, AgentPlan]:
+    """
+    Turn plans proposed separately (e.g. per chunk) into one consistent set:
+    - agents without a usable proposal (missing, unknown action, no target_item) get their match_plans plan;
+    - targets that are unknown agents or the agent itself are dropped;
+    - buying plans without an amount ask for enough to reach TARGET_STOCK;
+    - when buyers ask a seller for more than its surplus, later buyers move to
+      the seller with the most surplus left, or to the market;
+    - cycles are broken with break_cycles.
+    """
+    population = agents if isinstance(agents, AgentPopulation) else AgentPopulation.from_inventories(agents)
+    ids = population.ids
+    fallback: Optional[Dict[str, AgentPlan]] = None
+
+    surplus = np.where(population.materials > SURPLUS_ABOVE, population.materials - TARGET_STOCK, 0)
+    remaining: Dict[MagicalMaterial, Dict[str, int]] = {}
+    # Max-heaps of (-surplus, position, agent_id), with stale entries skipped on pop
+    heaps: Dict[MagicalMaterial, List[Tuple[int, int, str]]] = {}
+    for column, material in enumerate(MATERIALS):
+        sellers = np.flatnonzero(surplus[:, column]).tolist()
+        remaining[material] = {ids[i]: int(surplus[i, column]) for i in sellers}
+        heaps[material] = [(-int(surplus[i, column]), i, ids[i]) for i in sellers]
+        heapq.heapify(heaps[material])
+
+    plans: Dict[str, AgentPlan] = {}
+    for position, agent_id in enumerate(ids):
+        plan = proposals.get(agent_id)
+        action = plan.action.strip().lower() if plan is not None else None
+        if action not in ACTIONS or plan.target_item is None:
+            if fallback is None:
+                fallback = match_plans(population)
+            plans[agent_id] = fallback[agent_id]
+            continue
+        update = {"action": action}
+        target = plan.target_agent
+        if target == agent_id or (target is not None and target not in population):
+            target = None
+        if action in BUYING:
+            column = MATERIALS.index(plan.target_item)
+            amount = plan.amount if plan.amount and plan.amount > 0 else max(TARGET_STOCK - int(population.materials[position, column]), 1)
+            update["amount"] = amount
+            if target is not None:
+                target = _claim(remaining[plan.target_item], heaps[plan.target_item], target, agent_id, amount, population.position(target))
+        update["target_agent"] = target
+        plans[agent_id] = plan.model_copy(update=update)
+
+    books = {material: [(-left, population.position(seller), seller) for seller, left in sellers.items() if left > 0] for material, sellers in remaining.items()}
+    for book in books.values():
+        heapq.heapify(book)
+    break_cycles(plans, books)
+    return plans
+
+def _claim(remaining: Dict[str, int], heap: List[Tuple[int, int, str]], seller: str, buyer: str, amount: int, position: int) -> Optional[str]:
+    """
+    Take amount from seller's surplus, or else from the seller with the most left
+    (other than the buyer). Returns the seller, or None if nobody has enough.
+    position is the seller's position, to keep heap order by agent.
+    """
+    if remaining.get(seller, 0) < amount:
+        seller = None
+        skipped = []
+        while heap:
+            left, candidate_position, candidate = heap[0]
+            if -left != remaining[candidate]:
+                # Stale; a newer entry was pushed when this seller's surplus changed.
+                heapq.heappop(heap)
+            elif candidate == buyer:
+                skipped.append(heapq.heappop(heap))
+            else:
+                if -left >= amount:
+                    seller, position = candidate, candidate_position
+                break
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        if seller is None:
+            return None
+    remaining[seller] -= amount
+    heapq.heappush(heap, (-remaining[seller], position, seller))
+    return seller
+
+def narrate_plans(agents: Dict[str, Inventory], plans: Dict[str, AgentPlan], ai_model: AIModel) -> str:
+    """
+    Optional flavor text for plans made by match_plans. The plans do not depend on it.
+    """
+    lines = "\n".join(f"{agent_id}: {plans[agent_id].model_dump_json(exclude_none=True)}" for agent_id in agents)
+    prompt = f"Describe in a few sentences of fantasy prose what happens in the market today, given these plans:\n{lines}"
+    response = ai_model.response([Message(role='user', content=prompt)], purpose=Purpose.planning)
+    return response['message']['content']
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,309 @@
+import asyncio
+import json
+import re
+
+import numpy as np
+from ollama import ChatResponse
+
+import src.plan
+from src.ai_call import AsyncAIModel, estimate_tokens
+from src.plan.planner import (
+    DEFICIT_BELOW,
+    PLAN_TOKENS,
+    SURPLUS_ABOVE,
+    TARGET_STOCK,
+    AgentPlan,
+    AgentPopulation,
+    Inventory,
+    MagicalMaterial,
+    agent_line,
+    break_cycles,
+    find_cycles,
+    market_summary,
+    match_plans,
+    merge_plans,
+    request_plans_sharded,
+    seed_agents,
+    shard_agents,
+)
+
+EBONSTONE = MagicalMaterial.EBONSTONE
+SHADOWGLASS = MagicalMaterial.SHADOWGLASS
+
+
+def inventory(money=200, **grams):
+    """
+    An inventory with 25 grams of everything except the materials given by enum name.
+    """
+    materials = {material: TARGET_STOCK for material in MagicalMaterial}
+    materials.update({MagicalMaterial[name]: quantity for name, quantity in grams.items()})
+    return Inventory(money=money, magical_materials=materials)
+
+
+def test_buyers_are_matched_to_the_largest_surplus():
+    """
+    Test that the most urgent buyer gets the seller with the most surplus.
+    """
+    agents = {
+        "A": inventory(EBONSTONE=2),
+        "B": inventory(EBONSTONE=5),
+        "S1": inventory(EBONSTONE=45),
+        "S2": inventory(EBONSTONE=50),
+    }
+    plans = match_plans(agents)
+
+    assert plans["A"] == AgentPlan(action="buy", target_item=EBONSTONE, target_agent="S2", amount=23)
+    # S2 has 2 grams left over, so B goes to S1.
+    assert plans["B"] == AgentPlan(action="buy", target_item=EBONSTONE, target_agent="S1", amount=20)
+    assert plans["S2"] == AgentPlan(action="sell", target_item=EBONSTONE, amount=23)
+
+
+def test_poor_agents_barter_or_steal():
+    """
+    Test that agents with little money barter when they have a surplus and steal otherwise.
+    """
+    agents = {
+        "barterer": inventory(money=50, EBONSTONE=1, SHADOWGLASS=48),
+        "thief": inventory(money=50, EBONSTONE=3),
+        "seller": inventory(EBONSTONE=50),
+    }
+    plans = match_plans(agents)
+
+    assert plans["barterer"].action == "barter"
+    assert plans["thief"].action == "steal"
+
+
+def test_unmatched_and_balanced_agents_inquire():
+    """
+    Test that a buyer with no seller, and an agent with nothing to do, inquire.
+    """
+    agents = {"short": inventory(SHADOWGLASS=0), "content": inventory(EBONSTONE=20)}
+    plans = match_plans(agents)
+
+    assert plans["short"] == AgentPlan(action="inquire", target_item=SHADOWGLASS)
+    assert plans["content"] == AgentPlan(action="inquire", target_item=EBONSTONE)
+
+
+def test_cycles_are_broken():
+    """
+    Test that two buyers selling to each other are split up, using a third seller if there is one.
+    """
+    agents = {
+        "A": inventory(EBONSTONE=0, SHADOWGLASS=50),
+        "B": inventory(EBONSTONE=50, SHADOWGLASS=0),
+        "C": inventory(SHADOWGLASS=50),
+    }
+    plans = match_plans(agents)
+
+    assert find_cycles(plans) == []
+    assert plans["A"].target_agent == "B"
+    assert plans["B"].target_agent == "C"
+
+
+def test_break_cycles_falls_back_to_the_market():
+    """
+    Test that a cycle with no other seller leaves one agent trading with the market.
+    """
+    plans = {
+        "A": AgentPlan(action="barter", target_item=EBONSTONE, target_agent="B", amount=10),
+        "B": AgentPlan(action="barter", target_item=SHADOWGLASS, target_agent="C", amount=5),
+        "C": AgentPlan(action="barter", target_item=SHADOWGLASS, target_agent="A", amount=5),
+    }
+    break_cycles(plans)
+
+    assert find_cycles(plans) == []
+    assert plans["B"].target_agent is None
+    assert plans["C"].target_agent == "A"
+
+
+def test_plans_follow_the_rules_at_scale():
+    """
+    Test that every plan is consistent with the inventories and no seller is oversold.
+    """
+    agents = seed_agents(2000)
+    plans = match_plans(agents)
+
+    assert list(plans) == list(agents)
+    assert find_cycles(plans) == []
+    sold = {}
+    for agent_id, plan in plans.items():
+        stock = agents[agent_id].magical_materials
+        if plan.action in ("buy", "barter", "steal"):
+            assert stock[plan.target_item] < DEFICIT_BELOW
+            if plan.target_agent is not None:
+                key = (plan.target_agent, plan.target_item)
+                sold[key] = sold.get(key, 0) + plan.amount
+        if plan.action == "sell":
+            assert stock[plan.target_item] > SURPLUS_ABOVE
+    for (seller, material), amount in sold.items():
+        assert agents[seller].magical_materials[material] - amount >= TARGET_STOCK
+
+
+def test_population_is_reproducible():
+    """
+    Test that a seed always gives the same population, within the seeding ranges.
+    """
+    population = seed_agents(1000, seed=7)
+
+    assert np.array_equal(population.materials, seed_agents(1000, seed=7).materials)
+    assert np.array_equal(population.money, seed_agents(1000, seed=7).money)
+    assert not np.array_equal(population.money, seed_agents(1000, seed=8).money)
+    assert population.materials.shape == (1000, len(MagicalMaterial))
+    assert population.money.min() >= 50 and population.money.max() <= 500
+    assert population.materials.min() >= 0 and population.materials.max() <= 50
+
+
+def test_population_inventory_views():
+    """
+    Test that agents read as Inventory objects and writes land in the arrays.
+    """
+    population = AgentPopulation([100, 200], [[1, 2, 3, 4, 5], [6, 7, 8, 9, 10]])
+
+    assert list(population) == ["Agent_1", "Agent_2"]
+    assert population["Agent_2"] == Inventory(money=200, magical_materials=dict(zip(MagicalMaterial, [6, 7, 8, 9, 10])))
+    population.set_inventory("Agent_1", inventory(money=5, EBONSTONE=0))
+    assert population.money[0] == 5
+    assert population.materials[0].tolist() == [0, 25, 25, 25, 25]
+
+
+def test_population_and_dict_plan_alike():
+    """
+    Test that planning a population gives the same plans as planning its inventories.
+    """
+    population = seed_agents(500, seed=3)
+    agents = dict(population.items())
+
+    assert match_plans(population) == match_plans(agents)
+    assert np.array_equal(AgentPopulation.from_inventories(agents).materials, population.materials)
+
+
+def test_package_exports_the_planner():
+    """
+    Test that src.plan re-exports the planner instead of defining its own copies.
+    """
+    assert src.plan.Inventory is Inventory
+    assert src.plan.AgentPopulation is AgentPopulation
+
+
+class PlanningClient:
+    """
+    Stands in for ollama.AsyncClient. Every agent in a prompt asks Agent_1 for
+    Ebonstone (so plans conflict), a plan for an agent outside the chunk is added,
+    and chunks listing fail_on are refused.
+    """
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.prompts = []
+        self.in_flight = 0
+        self.peak = 0
+
+    async def chat(self, model, messages, stream=False, **kwargs):
+        prompt = messages[-1]["content"]
+        self.prompts.append(prompt)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if self.fail_on is not None and f"\t{self.fail_on}:" in prompt:
+            raise ConnectionError("Ollama is down")
+
+        agent_ids = re.findall(r"^\t•\t(\S+):", prompt, re.MULTILINE)
+        plans = {agent_id: {"action": "Buy", "target_item": "Ebonstone", "target_agent": "Agent_1", "amount": 10} for agent_id in agent_ids}
+        plans["Agent_999"] = {"action": "steal", "target_item": "Ebonstone", "target_agent": "Agent_1", "amount": 1}
+        content = json.dumps(plans)
+
+        async def chunks():
+            yield ChatResponse.model_validate({"model": model, "done": True, "message": {"role": "assistant", "content": content}})
+        return chunks()
+
+
+def test_market_summary_is_compact():
+    """
+    Test that the summary has one line per material and names the largest sellers.
+    """
+    agents = {"A": inventory(EBONSTONE=2), "S": inventory(EBONSTONE=50)}
+    summary = market_summary(seed_agents(5000, seed=1))
+
+    assert len(summary.splitlines()) == len(MagicalMaterial)
+    assert market_summary(agents).splitlines()[0] == "Ebonstone: 1 agents short by 23g, 1 agents with 25g surplus; largest sellers S (25g)"
+    assert len(summary) < 1000
+
+
+def test_shard_agents_fits_the_budget():
+    """
+    Test that chunks cover every agent once, in order, and each fits the budget.
+    """
+    population = seed_agents(300, seed=2)
+    chunks = shard_agents(population, token_budget=2000, fixed_tokens=500)
+
+    assert len(chunks) > 1
+    assert [agent_id for chunk in chunks for agent_id in chunk] == population.ids
+    for chunk in chunks:
+        assert sum(estimate_tokens(agent_line(a, i)) + PLAN_TOKENS for a, i in chunk.items()) <= 1500
+
+
+def test_sharded_planning_merges_chunks():
+    """
+    Test that chunks are planned concurrently and merged without conflicts, cycles or strangers.
+    """
+    population = seed_agents(200, seed=4)
+    population.materials[0] = [50, 50, 50, 50, 50]  # Agent_1 has surplus to sell
+
+    async def run(client):
+        model = AsyncAIModel(max_concurrency=3)
+        model.pool.clients = [client]
+        return await request_plans_sharded(population, model, token_budget=1500)
+
+    client = PlanningClient()
+    plans = asyncio.run(run(client))
+
+    assert len(client.prompts) > 3
+    assert client.peak == 3
+    assert all(market_summary(population) in prompt for prompt in client.prompts)
+    assert list(plans) == population.ids
+    assert find_cycles(plans) == []
+    assert sum(plan.amount for plan in plans.values() if plan.target_agent == "Agent_1") <= 25
+    assert all(plan.action == "buy" for agent_id, plan in plans.items() if agent_id != "Agent_1")
+
+
+def test_sharded_planning_falls_back_for_failed_chunks():
+    """
+    Test that agents in a chunk the LLM failed get the deterministic plan.
+    """
+    population = seed_agents(200, seed=4)
+
+    async def run():
+        model = AsyncAIModel()
+        model.pool.clients = [PlanningClient(fail_on="Agent_7")]
+        return await request_plans_sharded(population, model, token_budget=1500)
+
+    plans = asyncio.run(run())
+
+    assert plans["Agent_7"] == match_plans(population)["Agent_7"]
+    assert plans["Agent_199"].action == "buy"
+
+
+def test_merge_plans_moves_oversold_buyers():
+    """
+    Test that buyers asking one seller for more than it has are moved to another seller or the market.
+    """
+    agents = {
+        "A": inventory(EBONSTONE=0),
+        "B": inventory(EBONSTONE=0),
+        "C": inventory(EBONSTONE=0),
+        "S1": inventory(EBONSTONE=50),
+        "S2": inventory(EBONSTONE=45),
+    }
+    ask = {"action": "buy", "target_item": EBONSTONE, "target_agent": "S1"}
+    proposals = {
+        "A": AgentPlan(**ask, amount=20),
+        "B": AgentPlan(**ask, amount=20),
+        "C": AgentPlan(**ask),
+        "S1": AgentPlan(action="dance", target_item=EBONSTONE),
+    }
+    plans = merge_plans(agents, proposals)
+
+    assert plans["A"].target_agent == "S1"
+    assert plans["B"].target_agent == "S2"
+    assert plans["C"] == AgentPlan(action="buy", target_item=EBONSTONE, target_agent=None, amount=25)
+    assert plans["S1"].action == "sell"
@@ -0,0 +1,232 @@
+"""
+Aggregate views of the transaction log for the economy dashboards.
+
+Everything is computed with NumPy reductions over the columns of a
+ColumnarTransactionLog. A TransactionLog is converted on its first query, which
+costs a pass over every transaction; the copy is kept and later queries only
+append what was added since. Results are plain arrays with their axis labels
+alongside.
+"""
+
+import weakref
+from datetime import date
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from src.trade.columnar import MATERIAL_CODES, MATERIALS, NO_PLAYER, TRANSACTION_TYPES, ColumnarTransactionLog
+from src.trade.magic_material import MagicalMaterial, TransactionType
+
+# datetime64 value of date.fromordinal(1), used to turn ordinals into dates.
+_ORDINAL_EPOCH = np.datetime64("0001-01-01", "D")
+
+
+class MaterialVolume(NamedTuple):
+    bucket_starts: np.ndarray  # datetime64[D], one per bucket
+    materials: list[MagicalMaterial]
+    volume: np.ndarray  # (materials, buckets) total quantity traded
+
+
+class FlowMatrix(NamedTuple):
+    players: np.ndarray  # player IDs labelling both axes
+    flow: np.ndarray  # flow[i, j] = quantity moved from players[i] to players[j]
+
+    @property
+    def net(self) -> np.ndarray:
+        """
+        net[i, j] > 0 means players[i] sent more to players[j] than it got back.
+        """
+        return self.flow - self.flow.T
+
+
+class NetFlows(NamedTuple):
+    players: np.ndarray
+    received: np.ndarray
+    sent: np.ndarray
+
+    @property
+    def net(self) -> np.ndarray:
+        return self.received - self.sent
+
+
+class TypeBreakdown(NamedTuple):
+    transaction_types: list[TransactionType]
+    volume: np.ndarray  # total quantity per type
+    count: np.ndarray  # number of transactions per type
+
+
+class BalanceHistory(NamedTuple):
+    bucket_starts: np.ndarray
+    players: np.ndarray
+    balance: np.ndarray  # (players, buckets) cumulative net quantity at the end of each bucket
+
+
+# Columnar copies of the other logs queried, keyed on id() because a TransactionLog
+# is not hashable. An entry is dropped when its log is garbage collected.
+_converted: dict[int, tuple[weakref.ref, ColumnarTransactionLog]] = {}
+
+
+def as_columnar(log) -> ColumnarTransactionLog:
+    """
+    The log as a ColumnarTransactionLog. A columnar log is returned as is. Any
+    other log is copied in full on the first call, O(transactions), and the copy
+    is kept for as long as the log lives; after that only the transactions
+    appended since the last call are copied. Logs are append-only, so a log that
+    got shorter is copied again from scratch.
+    """
+    if isinstance(log, ColumnarTransactionLog):
+        return log
+    transactions = log.transactions
+    key = id(log)
+    entry = _converted.get(key)
+    if entry is None or entry[0]() is not log or len(entry[1]) > len(transactions):
+        columnar = ColumnarTransactionLog(capacity=len(transactions))
+        _converted[key] = (weakref.ref(log, lambda _: _converted.pop(key, None)), columnar)
+    else:
+        columnar = entry[1]
+    for transaction in transactions[len(columnar):]:
+        columnar.add_transaction(transaction)
+    return columnar
+
+
+def _selected(columns: dict[str, np.ndarray], material: Optional[MagicalMaterial], start: Optional[date], end: Optional[date]) -> np.ndarray:
+    mask = np.ones(len(columns["quantities"]), dtype=bool)
+    if material is not None:
+        mask &= columns["materials"] == MATERIAL_CODES[material]
+    if start is not None:
+        mask &= columns["dates"] >= start.toordinal()
+    if end is not None:
+        mask &= columns["dates"] <= end.toordinal()
+    return mask
+
+
+def _buckets(dates: np.ndarray, bucket_days: int, start: Optional[date], end: Optional[date]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Bucket index of every date and the start of every bucket.
+    """
+    if bucket_days <= 0:
+        raise ValueError("bucket_days must be greater than zero.")
+    if len(dates) == 0 and (start is None or end is None):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype="datetime64[D]")
+    first = start.toordinal() if start is not None else int(dates.min())
+    last = end.toordinal() if end is not None else max(int(dates.max()), first)
+    count = (last - first) // bucket_days + 1
+    index = (dates.astype(np.int64) - first) // bucket_days
+    starts = _ORDINAL_EPOCH + (first - 1 + np.arange(count) * bucket_days).astype("timedelta64[D]")
+    return index, starts
+
+
+def volume_by_material(log, bucket_days: int = 1, start: Optional[date] = None, end: Optional[date] = None) -> MaterialVolume:
+    """
+    Total quantity of each material traded per date bucket.
+    """
+    columns = as_columnar(log).columns()
+    mask = _selected(columns, None, start, end)
+    index, starts = _buckets(columns["dates"][mask], bucket_days, start, end)
+    n = len(starts)
+    flat = columns["materials"][mask].astype(np.int64) * n + index
+    volume = np.bincount(flat, weights=columns["quantities"][mask], minlength=len(MATERIALS) * n)
+    return MaterialVolume(starts, MATERIALS, volume.reshape(len(MATERIALS), n))
+
+
+def flow_matrix(
+    log,
+    players: Optional[np.ndarray] = None,
+    material: Optional[MagicalMaterial] = None,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+) -> FlowMatrix:
+    """
+    Quantity moved between every pair of players, labelled by sorted player ID.
+    Transactions with no seller or no buyer, or with a player outside players,
+    are left out. The matrix is dense, so pass players to restrict it for large
+    worlds.
+    """
+    columns = as_columnar(log).columns()
+    mask = _selected(columns, material, start, end)
+    sellers = columns["seller_ids"][mask]
+    buyers = columns["buyer_ids"][mask]
+    quantities = columns["quantities"][mask]
+
+    if players is None:
+        players = np.union1d(sellers, buyers)
+        players = players[players != NO_PLAYER]
+    players = np.unique(np.asarray(players, dtype=np.int64))
+    n = len(players)
+
+    if n == 0:
+        return FlowMatrix(players, np.zeros((0, 0)))
+
+    # players is sorted, so an ID is known when searchsorted lands on it.
+    seller_index = np.searchsorted(players, sellers).clip(max=n - 1)
+    buyer_index = np.searchsorted(players, buyers).clip(max=n - 1)
+    known = (players[seller_index] == sellers) & (players[buyer_index] == buyers)
+    flat = seller_index[known] * n + buyer_index[known]
+    flow = np.bincount(flat, weights=quantities[known], minlength=n * n).reshape(n, n)
+    return FlowMatrix(players, flow)
+
+
+def net_flows(log, material: Optional[MagicalMaterial] = None, start: Optional[date] = None, end: Optional[date] = None) -> NetFlows:
+    """
+    Quantity received and sent by every player, counting transactions with no
+    counterpart (gifts, seizures, ...). Linear in the number of players.
+    """
+    columns = as_columnar(log).columns()
+    mask = _selected(columns, material, start, end)
+    sellers = columns["seller_ids"][mask]
+    buyers = columns["buyer_ids"][mask]
+    quantities = columns["quantities"][mask]
+
+    players, inverse = np.unique(np.concatenate([sellers, buyers]), return_inverse=True)
+    seller_index, buyer_index = inverse[:len(sellers)], inverse[len(sellers):]
+    sent = np.bincount(seller_index, weights=quantities, minlength=len(players))
+    received = np.bincount(buyer_index, weights=quantities, minlength=len(players))
+
+    keep = players != NO_PLAYER
+    return NetFlows(players[keep], received[keep], sent[keep])
+
+
+def volume_by_type(log, material: Optional[MagicalMaterial] = None, start: Optional[date] = None, end: Optional[date] = None) -> TypeBreakdown:
+    """
+    Quantity and number of transactions per TransactionType (how much was STOLEN vs PURCHASED, ...).
+    """
+    columns = as_columnar(log).columns()
+    mask = _selected(columns, material, start, end)
+    codes = columns["transaction_types"][mask]
+    volume = np.bincount(codes, weights=columns["quantities"][mask], minlength=len(TRANSACTION_TYPES))
+    count = np.bincount(codes, minlength=len(TRANSACTION_TYPES))
+    return TypeBreakdown(TRANSACTION_TYPES, volume, count)
+
+
+def balance_history(
+    log,
+    material: MagicalMaterial,
+    bucket_days: int = 1,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+) -> BalanceHistory:
+    """
+    Running net quantity of a material per player from the transactions alone
+    (inventory assigned outside of trades is not included), per date bucket.
+    """
+    columns = as_columnar(log).columns()
+    mask = _selected(columns, material, None, end)
+    sellers = columns["seller_ids"][mask]
+    buyers = columns["buyer_ids"][mask]
+    quantities = columns["quantities"][mask]
+    dates = columns["dates"][mask]
+
+    index, starts = _buckets(dates, bucket_days, start, end)
+    n = len(starts)
+    # Transactions before start count towards the opening balance.
+    index = index.clip(min=0)
+
+    players, inverse = np.unique(np.concatenate([sellers, buyers]), return_inverse=True)
+    seller_index, buyer_index = inverse[:len(sellers)], inverse[len(sellers):]
+    flat_size = len(players) * n
+    change = np.bincount(buyer_index * n + index, weights=quantities, minlength=flat_size)
+    change -= np.bincount(seller_index * n + index, weights=quantities, minlength=flat_size)
+    balance = np.cumsum(change.reshape(len(players), n), axis=1)
+
+    keep = players != NO_PLAYER
+    return BalanceHistory(starts, players[keep], balance[keep])
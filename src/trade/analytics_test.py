@@ -0,0 +1,135 @@
+import numpy as np
+import pytest
+from datetime import date
+from src.trade.analytics import as_columnar, balance_history, flow_matrix, net_flows, volume_by_material, volume_by_type
+from src.trade.columnar import MATERIAL_CODES, TRANSACTION_TYPES, ColumnarTransactionLog
+from src.trade.magic_material import MagicalMaterialsManager, MagicalMaterial, TransactionType
+
+
+@pytest.fixture
+def manager():
+    """
+    Fixture for a manager with a few days of trading between three players.
+    """
+    manager = MagicalMaterialsManager(ColumnarTransactionLog())
+    manager.assign_material(1, MagicalMaterial.EBONSTONE, 500)
+    manager.assign_material(2, MagicalMaterial.SHADOWGLASS, 100)
+    manager.trade_material(1, 2, MagicalMaterial.EBONSTONE, 200, TransactionType.PURCHASED, date(2025, 1, 1))
+    manager.trade_material(2, 1, MagicalMaterial.SHADOWGLASS, 30, TransactionType.BARTER, date(2025, 1, 1))
+    manager.trade_material(2, 3, MagicalMaterial.EBONSTONE, 50, TransactionType.STOLEN, date(2025, 1, 3))
+    manager.trade_material(None, 3, MagicalMaterial.EBONSTONE, 10, TransactionType.GIFT, date(2025, 1, 4))
+    manager.trade_material(1, 3, MagicalMaterial.EBONSTONE, 25, TransactionType.PURCHASED, date(2025, 1, 4))
+    return manager
+
+
+def test_volume_by_material(manager):
+    """
+    Test that quantities are summed per material and date bucket, including empty days.
+    """
+    result = volume_by_material(manager.transaction_log)
+    ebonstone = result.volume[MATERIAL_CODES[MagicalMaterial.EBONSTONE]]
+    shadowglass = result.volume[MATERIAL_CODES[MagicalMaterial.SHADOWGLASS]]
+
+    assert result.bucket_starts.tolist() == [date(2025, 1, d) for d in range(1, 5)]
+    assert ebonstone.tolist() == [200, 0, 50, 35]
+    assert shadowglass.tolist() == [30, 0, 0, 0]
+    assert result.volume.sum() == 315
+
+    weekly = volume_by_material(manager.transaction_log, bucket_days=2)
+    assert weekly.bucket_starts.tolist() == [date(2025, 1, 1), date(2025, 1, 3)]
+    assert weekly.volume[MATERIAL_CODES[MagicalMaterial.EBONSTONE]].tolist() == [200, 85]
+
+
+def test_flow_matrix(manager):
+    """
+    Test the player to player flows and their antisymmetric net.
+    """
+    result = flow_matrix(manager.transaction_log, material=MagicalMaterial.EBONSTONE)
+
+    assert result.players.tolist() == [1, 2, 3]
+    assert result.flow.tolist() == [[0, 200, 25], [0, 0, 50], [0, 0, 0]]
+    assert result.net[1, 0] == -200
+
+    subset = flow_matrix(manager.transaction_log, players=[3, 2])
+    assert subset.players.tolist() == [2, 3]
+    assert subset.flow.tolist() == [[0, 50], [0, 0]]
+
+
+def test_net_flows(manager):
+    """
+    Test that net flows count transactions with no counterpart.
+    """
+    result = net_flows(manager.transaction_log, material=MagicalMaterial.EBONSTONE)
+
+    assert result.players.tolist() == [1, 2, 3]
+    assert result.net.tolist() == [-225, 150, 85]
+    assert result.received.tolist() == [0, 200, 85]
+
+
+def test_volume_by_type(manager):
+    """
+    Test the breakdown of volume and count per transaction type.
+    """
+    result = volume_by_type(manager.transaction_log)
+    by_type = dict(zip(result.transaction_types, zip(result.volume.tolist(), result.count.tolist())))
+
+    assert by_type[TransactionType.PURCHASED] == (225, 2)
+    assert by_type[TransactionType.STOLEN] == (50, 1)
+    assert by_type[TransactionType.SEIZED] == (0, 0)
+    assert len(result.volume) == len(TRANSACTION_TYPES)
+
+
+def test_balance_history(manager):
+    """
+    Test that balances accumulate per bucket and earlier trades open the window.
+    """
+    result = balance_history(manager.transaction_log, MagicalMaterial.EBONSTONE, start=date(2025, 1, 3))
+
+    assert result.bucket_starts.tolist() == [date(2025, 1, 3), date(2025, 1, 4)]
+    assert result.players.tolist() == [1, 2, 3]
+    assert result.balance.tolist() == [[-200, -225], [150, 150], [50, 85]]
+
+
+def test_analytics_accept_transaction_log(manager):
+    """
+    Test that a pydantic TransactionLog gives the same answers as the columnar log.
+    """
+    plain = MagicalMaterialsManager()
+    for transaction in manager.get_transaction_history():
+        plain.transaction_log.add_transaction(transaction)
+
+    assert np.array_equal(volume_by_material(plain.transaction_log).volume, volume_by_material(manager.transaction_log).volume)
+    assert np.array_equal(net_flows(plain.transaction_log).net, net_flows(manager.transaction_log).net)
+
+
+def test_transaction_log_is_converted_once(manager):
+    """
+    Test that a TransactionLog keeps its columnar copy and only new transactions are appended to it.
+    """
+    plain = MagicalMaterialsManager()
+    history = manager.get_transaction_history()
+    for transaction in history[:3]:
+        plain.transaction_log.add_transaction(transaction)
+
+    columnar = as_columnar(plain.transaction_log)
+    assert len(columnar) == 3
+    for transaction in history[3:]:
+        plain.transaction_log.add_transaction(transaction)
+    assert as_columnar(plain.transaction_log) is columnar
+    assert len(columnar) == len(history)
+    assert list(columnar.transactions) == list(history)
+
+    del plain.transaction_log.transactions[1:]
+    assert len(as_columnar(plain.transaction_log)) == 1
+
+
+def test_analytics_on_empty_log():
+    """
+    Test that an empty log gives empty arrays.
+    """
+    log = ColumnarTransactionLog()
+
+    assert volume_by_material(log).volume.shape == (len(MagicalMaterial), 0)
+    assert flow_matrix(log).flow.shape == (0, 0)
+    assert len(net_flows(log).players) == 0
+    assert volume_by_type(log).count.sum() == 0
@@ -0,0 +1,215 @@
+from collections.abc import Sequence
+from datetime import date
+from typing import Optional
+
+import numpy as np
+
+from src.trade.magic_material import MagicalMaterial, Trade, Transaction, TransactionType, TransactionView
+
+# Column codes for the enums, in declaration order.
+MATERIALS = list(MagicalMaterial)
+MATERIAL_CODES = {material: code for code, material in enumerate(MATERIALS)}
+TRANSACTION_TYPES = list(TransactionType)
+TRANSACTION_TYPE_CODES = {transaction_type: code for code, transaction_type in enumerate(TRANSACTION_TYPES)}
+
+# Stored in place of a missing seller, buyer or details. Player IDs are expected to be non-negative.
+NO_PLAYER = -1
+NO_DETAILS = -1
+
+
+class ColumnarTransactionLog:
+    """
+    Transaction log stored as one NumPy array per field, about 34 bytes per
+    transaction, with details interned in a string table. It has the same API as
+    TransactionLog; Transaction objects are only built when an entry is read.
+    """
+    def __init__(self, capacity: int = 1024):
+        capacity = max(capacity, 1)
+        self.seller_ids = np.empty(capacity, dtype=np.int64)
+        self.buyer_ids = np.empty(capacity, dtype=np.int64)
+        self.materials = np.empty(capacity, dtype=np.uint8)
+        self.transaction_types = np.empty(capacity, dtype=np.uint8)
+        self.quantities = np.empty(capacity, dtype=np.float64)
+        self.dates = np.empty(capacity, dtype=np.int32)  # date.toordinal()
+        self.details = np.empty(capacity, dtype=np.int32)  # index into strings, or NO_DETAILS
+        self.strings: list[str] = []
+        self._string_ids: dict[str, int] = {}
+        self._size = 0
+
+    @classmethod
+    def from_transactions(cls, transactions: Sequence[Transaction]) -> "ColumnarTransactionLog":
+        log = cls(capacity=len(transactions))
+        for transaction in transactions:
+            log.add_transaction(transaction)
+        return log
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> Transaction:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("transaction index out of range")
+        seller_id = int(self.seller_ids[index])
+        buyer_id = int(self.buyer_ids[index])
+        details = int(self.details[index])
+        return Transaction.model_construct(
+            seller_id=None if seller_id == NO_PLAYER else seller_id,
+            buyer_id=None if buyer_id == NO_PLAYER else buyer_id,
+            material=MATERIALS[self.materials[index]],
+            quantity=float(self.quantities[index]),
+            transaction_type=TRANSACTION_TYPES[self.transaction_types[index]],
+            details=None if details == NO_DETAILS else self.strings[details],
+            date=date.fromordinal(int(self.dates[index])),
+        )
+
+    @property
+    def transactions(self) -> TransactionView:
+        return TransactionView(self, list(range(self._size)))
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory held by the stored rows (not the spare capacity) plus the string table.
+        """
+        columns = self.columns()
+        return sum(column.nbytes for column in columns.values()) + sum(len(s) for s in self.strings)
+
+    def columns(self) -> dict[str, np.ndarray]:
+        """
+        Views of the filled part of every column.
+        """
+        n = self._size
+        return {
+            "seller_ids": self.seller_ids[:n],
+            "buyer_ids": self.buyer_ids[:n],
+            "materials": self.materials[:n],
+            "transaction_types": self.transaction_types[:n],
+            "quantities": self.quantities[:n],
+            "dates": self.dates[:n],
+            "details": self.details[:n],
+        }
+
+    def add_transaction(self, transaction: Transaction):
+        """
+        Add a transaction to the log.
+        """
+        self.record(
+            transaction.seller_id,
+            transaction.buyer_id,
+            transaction.material,
+            transaction.quantity,
+            transaction.transaction_type,
+            transaction.date,
+            transaction.details
+        )
+
+    def record(
+        self,
+        seller_id: Optional[int],
+        buyer_id: Optional[int],
+        material: MagicalMaterial,
+        quantity: float,
+        transaction_type: TransactionType,
+        date: date,
+        details: Optional[str] = None
+    ):
+        """
+        Append a transaction from its fields without building or validating a Transaction.
+        Only for callers that have already checked the values.
+        """
+        if self._size == len(self.quantities):
+            self._grow(self._size + 1)
+        i = self._size
+        self.seller_ids[i] = NO_PLAYER if seller_id is None else seller_id
+        self.buyer_ids[i] = NO_PLAYER if buyer_id is None else buyer_id
+        self.materials[i] = MATERIAL_CODES[material]
+        self.transaction_types[i] = TRANSACTION_TYPE_CODES[transaction_type]
+        self.quantities[i] = quantity
+        self.dates[i] = date.toordinal()
+        self.details[i] = NO_DETAILS if details is None else self.intern(details)
+        self._size += 1
+
+    def record_batch(self, trades: Sequence[Trade]):
+        """
+        Append many trades at once, one slice assignment per column. Like record,
+        only for callers that have already checked the values.
+        """
+        n = len(trades)
+        if self._size + n > len(self.quantities):
+            self._grow(self._size + n)
+        rows = slice(self._size, self._size + n)
+        self.seller_ids[rows] = [NO_PLAYER if t.seller_id is None else t.seller_id for t in trades]
+        self.buyer_ids[rows] = [NO_PLAYER if t.buyer_id is None else t.buyer_id for t in trades]
+        self.materials[rows] = [MATERIAL_CODES[t.material] for t in trades]
+        self.transaction_types[rows] = [TRANSACTION_TYPE_CODES[t.transaction_type] for t in trades]
+        self.quantities[rows] = [t.quantity for t in trades]
+        self.dates[rows] = [t.date.toordinal() for t in trades]
+        self.details[rows] = [NO_DETAILS if t.details is None else self.intern(t.details) for t in trades]
+        self._size += n
+
+    def intern(self, text: str) -> int:
+        string_id = self._string_ids.get(text)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.strings.append(text)
+            self._string_ids[text] = string_id
+        return string_id
+
+    def query_by_player(self, player_id: int) -> TransactionView:
+        """
+        Get all transactions involving a specific player.
+        """
+        return self.query(player_id=player_id)
+
+    def query_by_material(self, material: MagicalMaterial) -> TransactionView:
+        """
+        Get all transactions involving a specific magical material.
+        """
+        return self.query(material=material)
+
+    def query_by_type(self, transaction_type: TransactionType) -> TransactionView:
+        """
+        Get all transactions of a specific type.
+        """
+        return self.query(transaction_type=transaction_type)
+
+    def query_by_date(self, start: Optional[date] = None, end: Optional[date] = None) -> TransactionView:
+        """
+        Get all transactions dated between start and end, both inclusive.
+        """
+        return self.query(start=start, end=end)
+
+    def query(
+        self,
+        player_id: Optional[int] = None,
+        material: Optional[MagicalMaterial] = None,
+        transaction_type: Optional[TransactionType] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None
+    ) -> TransactionView:
+        """
+        Get the transactions matching every given filter, with one vectorized pass per filter.
+        """
+        columns = self.columns()
+        mask = np.ones(self._size, dtype=bool)
+        if player_id is not None:
+            mask &= (columns["seller_ids"] == player_id) | (columns["buyer_ids"] == player_id)
+        if material is not None:
+            mask &= columns["materials"] == MATERIAL_CODES[material]
+        if transaction_type is not None:
+            mask &= columns["transaction_types"] == TRANSACTION_TYPE_CODES[transaction_type]
+        if start is not None:
+            mask &= columns["dates"] >= start.toordinal()
+        if end is not None:
+            mask &= columns["dates"] <= end.toordinal()
+        return TransactionView(self, np.flatnonzero(mask).tolist())
+
+    def _grow(self, needed: int):
+        capacity = max(needed, 2 * len(self.quantities))
+        for name in ("seller_ids", "buyer_ids", "materials", "transaction_types", "quantities", "dates", "details"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
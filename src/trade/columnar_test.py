@@ -0,0 +1,102 @@
+import pytest
+from datetime import date
+from src.trade.columnar import ColumnarTransactionLog
+from src.trade.magic_material import (
+    MagicalMaterialsManager,
+    MagicalMaterial,
+    Trade,
+    TransactionLog,
+    TransactionType,
+    Transaction
+)
+
+
+@pytest.fixture
+def manager():
+    """
+    Fixture for a manager backed by the columnar log, starting from a tiny capacity so it grows.
+    """
+    return MagicalMaterialsManager(ColumnarTransactionLog(capacity=1))
+
+
+def trade_a_few(manager):
+    manager.assign_material(1, MagicalMaterial.EBONSTONE, 500)
+    manager.trade_material(1, 2, MagicalMaterial.EBONSTONE, 200, TransactionType.TRADE, date(2025, 1, 4), "A trade in the market.")
+    manager.trade_material(None, 3, MagicalMaterial.MOONSHARD_SILVER, 100, TransactionType.GIFT, date(2025, 1, 5), "A gift from the goddess.")
+    manager.trade_material(2, None, MagicalMaterial.EBONSTONE, 50, TransactionType.SEIZED, date(2025, 1, 6))
+    manager.trade_material(1, 3, MagicalMaterial.EBONSTONE, 25, TransactionType.TRADE, date(2025, 1, 7), "A trade in the market.")
+
+
+def test_columnar_log_round_trips_transactions(manager):
+    """
+    Test that transactions read back from the columns equal validated Transactions.
+    """
+    trade_a_few(manager)
+    history = manager.get_transaction_history()
+
+    assert len(history) == 4
+    assert history[1] == Transaction(
+        seller_id=None,
+        buyer_id=3,
+        material=MagicalMaterial.MOONSHARD_SILVER,
+        quantity=100,
+        transaction_type=TransactionType.GIFT,
+        date=date(2025, 1, 5),
+        details="A gift from the goddess."
+    )
+    assert history[2].buyer_id is None
+    assert history[2].details is None
+    assert manager.transaction_log.strings == ["A trade in the market.", "A gift from the goddess."]
+
+
+def test_columnar_log_matches_transaction_log(manager):
+    """
+    Test that every query gives the same answer as the pydantic TransactionLog.
+    """
+    trade_a_few(manager)
+    reference = TransactionLog()
+    for transaction in manager.get_transaction_history():
+        reference.add_transaction(transaction)
+    log = manager.transaction_log
+
+    for player_id in [1, 2, 3, 4]:
+        assert log.query_by_player(player_id) == reference.query_by_player(player_id)
+    for material in MagicalMaterial:
+        assert log.query_by_material(material) == reference.query_by_material(material)
+    assert log.query(player_id=3, material=MagicalMaterial.EBONSTONE, start=date(2025, 1, 6)) == \
+        reference.query(player_id=3, material=MagicalMaterial.EBONSTONE, start=date(2025, 1, 6))
+    assert log.query_by_type(TransactionType.SEIZED) == reference.query_by_type(TransactionType.SEIZED)
+
+
+def test_columnar_log_is_compact():
+    """
+    Test that a stored transaction costs a few dozen bytes.
+    """
+    log = ColumnarTransactionLog()
+    for i in range(10000):
+        log.record(i, i + 1, MagicalMaterial.SHADOWGLASS, 1.5, TransactionType.BARTER, date(2025, 1, 1), "Market day")
+
+    assert len(log) == 10000
+    assert log.nbytes < 40 * 10000
+    assert log[-1].seller_id == 9999
+
+
+def test_columnar_log_records_batches(manager):
+    """
+    Test that a settled batch reads back like trades recorded one at a time.
+    """
+    manager.assign_material(1, MagicalMaterial.EBONSTONE, 500)
+    trades = [
+        Trade(1, 2, MagicalMaterial.EBONSTONE, 200, TransactionType.TRADE, date(2025, 1, 4), "A trade in the market."),
+        Trade(None, 3, MagicalMaterial.MOONSHARD_SILVER, 100, TransactionType.GIFT, date(2025, 1, 5)),
+        Trade(2, None, MagicalMaterial.EBONSTONE, 50, TransactionType.SEIZED, date(2025, 1, 6)),
+    ]
+    manager.trade_batch(trades)
+
+    reference = MagicalMaterialsManager()
+    reference.assign_material(1, MagicalMaterial.EBONSTONE, 500)
+    for trade in trades:
+        reference.trade_material(*trade)
+
+    assert manager.get_transaction_history() == reference.get_transaction_history()
+    assert manager.inventory == reference.inventory
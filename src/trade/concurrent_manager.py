@@ -0,0 +1,153 @@
+"""
+A MagicalMaterialsManager that several agent workers can drive at once.
+
+Players are spread over a fixed set of lock stripes. An operation holds the
+stripes of every player it touches, taken in stripe order so that two trades
+between the same players in opposite directions cannot deadlock. Trades between
+unrelated players run in parallel; only the append to the transaction log is
+serialized. The async methods run the same operations on worker threads so an
+event loop never blocks on a lock.
+"""
+
+import asyncio
+import threading
+from contextlib import contextmanager
+from datetime import date
+from typing import Iterable, Optional
+
+from src.trade.magic_material import MagicalMaterial, MagicalMaterialsManager, Trade, TransactionLog, TransactionType
+
+
+class SynchronizedLog:
+    """
+    Wraps a transaction log so appends and queries from several threads do not interleave.
+    """
+    def __init__(self, log):
+        self.log = log
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.log)
+
+    def __getattr__(self, name):
+        # Everything else (transactions, strings, columns, ...) reads straight through.
+        return getattr(self.log, name)
+
+    def add_transaction(self, transaction):
+        with self.lock:
+            self.log.add_transaction(transaction)
+
+    def record(self, *args, **kwargs):
+        with self.lock:
+            self.log.record(*args, **kwargs)
+
+    def record_batch(self, trades):
+        with self.lock:
+            self.log.record_batch(trades)
+
+    def query(self, *args, **kwargs):
+        with self.lock:
+            return self.log.query(*args, **kwargs)
+
+    def query_by_player(self, player_id):
+        return self.query(player_id=player_id)
+
+    def query_by_material(self, material):
+        return self.query(material=material)
+
+    def query_by_type(self, transaction_type):
+        return self.query(transaction_type=transaction_type)
+
+    def query_by_date(self, start=None, end=None):
+        return self.query(start=start, end=end)
+
+
+class ConcurrentMaterialsManager(MagicalMaterialsManager):
+    def __init__(self, transaction_log: Optional[TransactionLog] = None, stripes: int = 64):
+        super().__init__(transaction_log)
+        self.transaction_log = SynchronizedLog(self.transaction_log)
+        # Reentrant, because trade_material calls assign_material and remove_material with its stripes held.
+        self._stripes = [threading.RLock() for _ in range(max(stripes, 1))]
+
+    def locked(self, *player_ids: Optional[int]):
+        """
+        Hold the stripes of the given players (None is ignored), acquired in stripe order.
+        """
+        indexes = {hash(player_id) % len(self._stripes) for player_id in player_ids if player_id is not None}
+        return self._hold(indexes)
+
+    @contextmanager
+    def _hold(self, indexes: Iterable[int]):
+        locks = [self._stripes[i] for i in sorted(indexes)]
+        for lock in locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def assign_material(self, player_id: int, material: MagicalMaterial, quantity: float):
+        with self.locked(player_id):
+            super().assign_material(player_id, material, quantity)
+
+    def remove_material(self, player_id: int, material: MagicalMaterial, quantity: float):
+        with self.locked(player_id):
+            super().remove_material(player_id, material, quantity)
+
+    def trade_material(
+        self,
+        seller_id: Optional[int],
+        buyer_id: Optional[int],
+        material: MagicalMaterial,
+        quantity: float,
+        transaction_type: TransactionType,
+        date: date,
+        details: Optional[str] = None
+    ):
+        with self.locked(seller_id, buyer_id):
+            super().trade_material(seller_id, buyer_id, material, quantity, transaction_type, date, details)
+
+    def trade_batch(self, trades: Iterable[Trade]):
+        trades = [trade if isinstance(trade, Trade) else Trade(*trade) for trade in trades]
+        players = [player_id for trade in trades for player_id in (trade.seller_id, trade.buyer_id)]
+        with self.locked(*players):
+            super().trade_batch(trades)
+
+    def get_inventory(self, player_id: int) -> dict[MagicalMaterial, float]:
+        """
+        A copy of the player's inventory, consistent at the moment it was taken.
+        """
+        with self.locked(player_id):
+            return dict(super().get_inventory(player_id))
+
+    def snapshot(self) -> dict[int, dict[MagicalMaterial, float]]:
+        """
+        A consistent copy of every inventory. Holds all stripes while copying.
+        """
+        with self._hold(range(len(self._stripes))):
+            return {player_id: dict(holdings) for player_id, holdings in self.inventory.items()}
+
+    async def aassign_material(self, player_id: int, material: MagicalMaterial, quantity: float):
+        await asyncio.to_thread(self.assign_material, player_id, material, quantity)
+
+    async def aremove_material(self, player_id: int, material: MagicalMaterial, quantity: float):
+        await asyncio.to_thread(self.remove_material, player_id, material, quantity)
+
+    async def atrade_material(
+        self,
+        seller_id: Optional[int],
+        buyer_id: Optional[int],
+        material: MagicalMaterial,
+        quantity: float,
+        transaction_type: TransactionType,
+        date: date,
+        details: Optional[str] = None
+    ):
+        await asyncio.to_thread(self.trade_material, seller_id, buyer_id, material, quantity, transaction_type, date, details)
+
+    async def atrade_batch(self, trades: Iterable[Trade]):
+        await asyncio.to_thread(self.trade_batch, list(trades))
+
+    async def aget_inventory(self, player_id: int) -> dict[MagicalMaterial, float]:
+        return await asyncio.to_thread(self.get_inventory, player_id)
@@ -0,0 +1,152 @@
+import asyncio
+import random
+import sys
+import threading
+from datetime import date
+
+import pytest
+from src.trade.columnar import ColumnarTransactionLog
+from src.trade.concurrent_manager import ConcurrentMaterialsManager
+from src.trade.magic_material import MagicalMaterial, Trade, TransactionType
+
+PLAYERS = 20
+START = 1000
+
+
+@pytest.fixture(autouse=True)
+def contention():
+    """
+    Switch threads as often as possible so that unguarded check-then-act sequences
+    interleave (the plain MagicalMaterialsManager loses or creates material here).
+    """
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+@pytest.fixture(params=["pydantic", "columnar"])
+def manager(request):
+    """
+    Fixture for a concurrent manager where every player starts with the same stock,
+    over few stripes so that players share locks.
+    """
+    log = ColumnarTransactionLog() if request.param == "columnar" else None
+    manager = ConcurrentMaterialsManager(log, stripes=4)
+    for player_id in range(PLAYERS):
+        for material in MagicalMaterial:
+            manager.assign_material(player_id, material, START)
+    return manager
+
+
+def totals(manager):
+    snapshot = manager.snapshot()
+    return {material: sum(holdings.get(material, 0) for holdings in snapshot.values()) for material in MagicalMaterial}
+
+
+def run_threads(target, count=8):
+    errors = []
+
+    def run(seed):
+        try:
+            target(seed)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(seed,)) for seed in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    assert not any(thread.is_alive() for thread in threads), "workers deadlocked"
+    assert errors == []
+
+
+def test_trades_conserve_material_under_contention(manager):
+    """
+    Test that many threads trading at random, many of them failing, neither create nor lose material.
+    """
+    settled = []
+
+    def worker(seed):
+        rng = random.Random(seed)
+        count = 0
+        for _ in range(500):
+            seller, buyer = rng.sample(range(PLAYERS), 2)
+            try:
+                manager.trade_material(seller, buyer, rng.choice(list(MagicalMaterial)), rng.randint(1, 400), TransactionType.TRADE, date(2025, 1, 1))
+                count += 1
+            except ValueError:
+                pass
+        settled.append(count)
+
+    run_threads(worker)
+
+    assert totals(manager) == {material: PLAYERS * START for material in MagicalMaterial}
+    assert all(quantity > 0 for holdings in manager.snapshot().values() for quantity in holdings.values())
+    assert len(manager.get_transaction_history()) == sum(settled)
+
+
+def test_opposite_trades_do_not_deadlock(manager):
+    """
+    Test that two players trading with each other in both directions at once never deadlock.
+    """
+    def worker(seed):
+        seller, buyer = (0, 1) if seed % 2 else (1, 0)
+        for _ in range(250):
+            # Back and forth, so neither player can run out however the threads are scheduled.
+            manager.trade_material(seller, buyer, MagicalMaterial.EBONSTONE, 1, TransactionType.BARTER, date(2025, 1, 1))
+            manager.trade_material(buyer, seller, MagicalMaterial.EBONSTONE, 1, TransactionType.BARTER, date(2025, 1, 1))
+
+    run_threads(worker)
+
+    assert manager.get_inventory(0)[MagicalMaterial.EBONSTONE] == START
+    assert len(manager.get_transactions_for_player(0)) == 8 * 500
+
+
+def test_batches_conserve_material_under_contention(manager):
+    """
+    Test that concurrent batches, some of which fail as a whole, conserve material.
+    """
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(100):
+            trades = [
+                Trade(*rng.sample(range(PLAYERS), 2), rng.choice(list(MagicalMaterial)), rng.randint(1, 300), TransactionType.TRADE, date(2025, 1, 1))
+                for _ in range(rng.randint(1, 10))
+            ]
+            try:
+                manager.trade_batch(trades)
+            except ValueError:
+                pass
+
+    run_threads(worker)
+
+    assert totals(manager) == {material: PLAYERS * START for material in MagicalMaterial}
+    # The log agrees with the inventories, so every settled batch was recorded whole.
+    history = manager.get_transaction_history()
+    for material in MagicalMaterial:
+        sold = sum(t.quantity for t in history if t.seller_id == 3 and t.material == material)
+        bought = sum(t.quantity for t in history if t.buyer_id == 3 and t.material == material)
+        assert manager.get_inventory(3).get(material, 0) == START - sold + bought
+
+
+def test_async_trades_conserve_material(manager):
+    """
+    Test the asyncio API with many trades gathered at once.
+    """
+    async def run():
+        rng = random.Random(0)
+        trades = [
+            manager.atrade_material(*rng.sample(range(PLAYERS), 2), MagicalMaterial.SHADOWGLASS, rng.randint(1, 200), TransactionType.PURCHASED, date(2025, 1, 1))
+            for _ in range(300)
+        ]
+        results = await asyncio.gather(*trades, return_exceptions=True)
+        return results, await manager.aget_inventory(0)
+
+    results, inventory = asyncio.run(run())
+
+    assert all(result is None or isinstance(result, ValueError) for result in results)
+    assert len(manager.get_transaction_history()) == sum(result is None for result in results)
+    assert totals(manager)[MagicalMaterial.SHADOWGLASS] == PLAYERS * START
+    assert inventory == manager.get_inventory(0)
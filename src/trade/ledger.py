@@ -0,0 +1,345 @@
+"""
+Write-ahead ledger for MagicalMaterialsManager.
+
+Every change to the economy is appended as one JSON line to the current
+segment file (wal-00000001.jsonl, ...). Lines are buffered and written with a
+single fsync per group, either by a background thread every commit_interval
+seconds or when commit_every lines are waiting, so a tick pays no disk latency.
+
+A checkpoint starts a new segment and writes a snapshot of the inventories
+taken at that point (snapshot-00000002.json holds the state before segment 2).
+The tick only swaps the segment file and copies the inventories; a background
+thread writes and fsyncs the tail of the old segment and then the snapshot.
+Group commits to the new segment wait until that tail is durable, so a record
+never reaches disk before the ones logged ahead of it. A checkpoint asked for
+while another is still being written is skipped. Recovery
+loads the newest snapshot and replays only the segments after it.
+"""
+
+import json
+import os
+import re
+import threading
+from datetime import date
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from src.trade.magic_material import MagicalMaterial, MagicalMaterialsManager, Trade, TransactionLog, TransactionType
+
+_SEGMENT = re.compile(r"wal-(\d{8})\.jsonl")
+_SNAPSHOT = re.compile(r"snapshot-(\d{8})\.json")
+
+
+def _trade_record(trade: Trade) -> list:
+    seller_id, buyer_id, material, quantity, transaction_type, day, details = trade
+    return [seller_id, buyer_id, MagicalMaterial(material).value, quantity, TransactionType(transaction_type).value, day.isoformat(), details]
+
+
+def _trade_from_record(record: list) -> Trade:
+    seller_id, buyer_id, material, quantity, transaction_type, day, details = record
+    return Trade(seller_id, buyer_id, MagicalMaterial(material), quantity, TransactionType(transaction_type), date.fromisoformat(day), details)
+
+
+def _truncate_partial_line(path: Path, block: int = 4096):
+    """
+    Cut off a last line left unfinished by a crash, so new records start on a line of their own.
+    """
+    if not path.exists():
+        return
+    with open(path, "r+b") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(position - block, 0)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline != -1:
+                position = start + newline + 1
+                break
+            position = start
+        if position != end:
+            f.truncate(position)
+
+
+class Ledger:
+    def __init__(self, directory: str | Path, commit_interval: float = 0.05, commit_every: int = 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.commit_interval = commit_interval
+        self.commit_every = commit_every
+
+        segments = self.segments()
+        self.segment = segments[-1] if segments else 1
+        _truncate_partial_line(self._segment_path(self.segment))
+        self._file = open(self._segment_path(self.segment), "ab")
+        self._pending: list[bytes] = []
+        self._lock = threading.Lock()  # guards _pending and segment rotation
+        self._io_lock = threading.Lock()  # one writer to the segment file at a time
+        self._wake = threading.Event()
+        self._closed = False
+        self._snapshot_writer: Optional[threading.Thread] = None
+        # Set once the tail of the segment closed by the latest checkpoint is fsynced.
+        self._old_tail: Optional[threading.Event] = None
+        self._committer = threading.Thread(target=self._commit_loop, daemon=True)
+        self._committer.start()
+
+    def segments(self) -> list[int]:
+        return sorted(int(m.group(1)) for p in self.directory.iterdir() if (m := _SEGMENT.fullmatch(p.name)))
+
+    def snapshots(self) -> list[int]:
+        return sorted(int(m.group(1)) for p in self.directory.iterdir() if (m := _SNAPSHOT.fullmatch(p.name)))
+
+    def append(self, record: dict):
+        """
+        Queue a record. It is durable once the next group commit has run.
+        """
+        line = json.dumps(record, separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            self._pending.append(line)
+            if len(self._pending) >= self.commit_every:
+                self._wake.set()
+
+    def commit(self):
+        """
+        Write and fsync everything queued so far. Waits for the tail of a segment
+        closed by a checkpoint to be durable first.
+        """
+        while True:
+            tail = self._old_tail
+            if tail is not None:
+                tail.wait()
+            with self._io_lock:
+                with self._lock:
+                    if self._old_tail is not tail:
+                        # A checkpoint closed another segment since; wait for its tail too.
+                        continue
+                    pending, self._pending = self._pending, []
+                    file = self._file
+                if pending:
+                    file.write(b"".join(pending))
+                    file.flush()
+                    os.fsync(file.fileno())
+                return
+
+    def checkpoint(self, inventory: dict[int, dict[MagicalMaterial, float]]) -> Optional[threading.Thread]:
+        """
+        Start a new segment and write a snapshot of inventory in the background.
+        inventory must not be modified until this returns; it is copied here.
+        Returns the writer thread, or None without doing anything if the previous
+        checkpoint is still being written.
+        """
+        with self._lock:
+            if self._snapshot_writer is not None:
+                return None
+            pending, self._pending = self._pending, []
+            old = self._file
+            self.segment += 1
+            self._file = open(self._segment_path(self.segment), "ab")
+            state = {
+                "segment": self.segment,
+                "inventory": {str(player_id): {m.value: q for m, q in holdings.items()} for player_id, holdings in inventory.items()},
+            }
+            self._old_tail = threading.Event()
+            self._snapshot_writer = threading.Thread(target=self._finish_checkpoint, args=(old, pending, state, self._old_tail), daemon=True)
+            self._snapshot_writer.start()
+            return self._snapshot_writer
+
+    def wait_for_snapshot(self):
+        writer = self._snapshot_writer
+        if writer is not None:
+            writer.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._wake.set()
+        self._committer.join()
+        self.wait_for_snapshot()
+        self.commit()
+        self._file.close()
+
+    def load(self) -> tuple[dict[int, dict[MagicalMaterial, float]], Iterator[dict]]:
+        """
+        The newest snapshot's inventory, and the records written after it.
+        """
+        inventory: dict[int, dict[MagicalMaterial, float]] = {}
+        first = 1
+        snapshots = self.snapshots()
+        if snapshots:
+            state = json.loads(self._snapshot_path(snapshots[-1]).read_text())
+            inventory = {int(p): {MagicalMaterial(m): q for m, q in holdings.items()} for p, holdings in state["inventory"].items()}
+            first = state["segment"]
+        return inventory, self.records(first)
+
+    def records(self, first: int = 1) -> Iterator[dict]:
+        """
+        Every record in the segments from first onwards. A line cut short by a
+        crash ends its segment.
+        """
+        for segment in self.segments():
+            if segment < first:
+                continue
+            with open(self._segment_path(segment), "rb") as f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        break
+
+    def _commit_loop(self):
+        while not self._closed:
+            self._wake.wait(self.commit_interval)
+            self._wake.clear()
+            self.commit()
+
+    def _finish_checkpoint(self, old, pending: list[bytes], state: dict, tail: threading.Event):
+        """
+        Make the old segment durable, let commits to the new one go ahead, then
+        write the snapshot that follows it.
+        """
+        try:
+            try:
+                # Taking the I/O lock lets a group commit already writing to the old file finish first.
+                with self._io_lock:
+                    old.write(b"".join(pending))
+                    old.flush()
+                    os.fsync(old.fileno())
+                    old.close()
+            finally:
+                # Released even if the write failed, so commits cannot hang behind it.
+                tail.set()
+            self._write_snapshot(state)
+        finally:
+            with self._lock:
+                self._snapshot_writer = None
+
+    def _write_snapshot(self, state: dict):
+        path = self._snapshot_path(state["segment"])
+        temp = path.with_suffix(".tmp")
+        with open(temp, "w") as f:
+            json.dump(state, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+        # Older snapshots are no longer needed; their segments stay as history.
+        for segment in self.snapshots():
+            if segment < state["segment"]:
+                self._snapshot_path(segment).unlink(missing_ok=True)
+
+    def _segment_path(self, segment: int) -> Path:
+        return self.directory / f"wal-{segment:08d}.jsonl"
+
+    def _snapshot_path(self, segment: int) -> Path:
+        return self.directory / f"snapshot-{segment:08d}.json"
+
+
+class PersistentMaterialsManager(MagicalMaterialsManager):
+    """
+    A manager whose changes are written ahead to a Ledger. Open one with
+    PersistentMaterialsManager.open(directory); after a restart the inventories
+    come back from the newest snapshot plus the log tail. The transaction log
+    only holds the transactions replayed from that tail and those made since;
+    read the full history with history().
+    """
+    def __init__(self, ledger: Ledger, transaction_log: Optional[TransactionLog] = None, checkpoint_every: Optional[int] = 100_000):
+        super().__init__(transaction_log)
+        self.ledger = ledger
+        self.checkpoint_every = checkpoint_every
+        self._since_checkpoint = 0
+        self._replaying = False
+
+    @classmethod
+    def open(cls, directory: str | Path, transaction_log: Optional[TransactionLog] = None, checkpoint_every: Optional[int] = 100_000, **ledger_options) -> "PersistentMaterialsManager":
+        ledger = Ledger(directory, **ledger_options)
+        manager = cls(ledger, transaction_log, checkpoint_every)
+        inventory, records = ledger.load()
+        manager.inventory = inventory
+        manager._replaying = True
+        try:
+            for record in records:
+                manager._apply(record)
+        except BaseException:
+            ledger.close()
+            raise
+        finally:
+            manager._replaying = False
+        return manager
+
+    def assign_material(self, player_id: int, material: MagicalMaterial, quantity: float):
+        super().assign_material(player_id, material, quantity)
+        self._log({"op": "assign", "player_id": player_id, "material": MagicalMaterial(material).value, "quantity": quantity})
+
+    def remove_material(self, player_id: int, material: MagicalMaterial, quantity: float):
+        super().remove_material(player_id, material, quantity)
+        self._log({"op": "remove", "player_id": player_id, "material": MagicalMaterial(material).value, "quantity": quantity})
+
+    def trade_material(
+        self,
+        seller_id: Optional[int],
+        buyer_id: Optional[int],
+        material: MagicalMaterial,
+        quantity: float,
+        transaction_type: TransactionType,
+        date: date,
+        details: Optional[str] = None
+    ):
+        # The base class removes and assigns through self; only the trade itself goes to the ledger.
+        replaying, self._replaying = self._replaying, True
+        try:
+            super().trade_material(seller_id, buyer_id, material, quantity, transaction_type, date, details)
+        finally:
+            self._replaying = replaying
+        self._log({"op": "trade", "trade": _trade_record(Trade(seller_id, buyer_id, material, quantity, transaction_type, date, details))})
+
+    def trade_batch(self, trades: Iterable[Trade]):
+        trades = [trade if isinstance(trade, Trade) else Trade(*trade) for trade in trades]
+        super().trade_batch(trades)
+        # One line per batch, so a crash can never replay half of it.
+        self._log({"op": "batch", "trades": [_trade_record(trade) for trade in trades]})
+
+    def checkpoint(self) -> Optional[threading.Thread]:
+        """
+        Snapshot the inventories; the file is written in the background. Returns
+        None when the previous checkpoint is still being written, in which case
+        an automatic checkpoint is tried again on the next change.
+        """
+        writer = self.ledger.checkpoint(self.inventory)
+        if writer is not None:
+            self._since_checkpoint = 0
+        return writer
+
+    def history(self) -> Iterator[Trade]:
+        """
+        Every trade ever recorded in the ledger, oldest first.
+        """
+        self.ledger.commit()
+        for record in self.ledger.records():
+            if record["op"] == "trade":
+                yield _trade_from_record(record["trade"])
+            elif record["op"] == "batch":
+                yield from (_trade_from_record(trade) for trade in record["trades"])
+
+    def close(self):
+        self.ledger.close()
+
+    def _log(self, record: dict):
+        if self._replaying:
+            return
+        self.ledger.append(record)
+        self._since_checkpoint += 1
+        if self.checkpoint_every is not None and self._since_checkpoint >= self.checkpoint_every:
+            self.checkpoint()
+
+    def _apply(self, record: dict):
+        op = record["op"]
+        if op == "assign":
+            self.assign_material(record["player_id"], MagicalMaterial(record["material"]), record["quantity"])
+        elif op == "remove":
+            self.remove_material(record["player_id"], MagicalMaterial(record["material"]), record["quantity"])
+        elif op == "trade":
+            self.trade_material(*_trade_from_record(record["trade"]))
+        elif op == "batch":
+            self.trade_batch([_trade_from_record(trade) for trade in record["trades"]])
+        else:
+            raise ValueError(f"Unknown ledger record {op!r}.")
@@ -0,0 +1,192 @@
+import os
+import shutil
+import threading
+from datetime import date
+
+import pytest
+from src.trade.ledger import Ledger, PersistentMaterialsManager
+from src.trade.magic_material import MagicalMaterial, Trade, TransactionType
+
+
+def trade_a_few(manager, day=4):
+    manager.assign_material(1, MagicalMaterial.EBONSTONE, 500)
+    manager.trade_material(1, 2, MagicalMaterial.EBONSTONE, 200, TransactionType.TRADE, date(2025, 1, day), "A trade in the market.")
+    manager.trade_batch([
+        Trade(2, 3, MagicalMaterial.EBONSTONE, 50, TransactionType.STOLEN, date(2025, 1, day)),
+        Trade(None, 3, MagicalMaterial.MOONSHARD_SILVER, 100, TransactionType.GIFT, date(2025, 1, day)),
+    ])
+    manager.remove_material(1, MagicalMaterial.EBONSTONE, 100)
+
+
+def test_manager_recovers_from_the_ledger(tmp_path):
+    """
+    Test that reopening the ledger restores inventories and transactions.
+    """
+    manager = PersistentMaterialsManager.open(tmp_path)
+    trade_a_few(manager)
+    manager.close()
+
+    recovered = PersistentMaterialsManager.open(tmp_path)
+
+    assert recovered.inventory == manager.inventory
+    assert recovered.get_transaction_history() == manager.get_transaction_history()
+    recovered.close()
+
+
+def test_recovery_replays_only_the_tail(tmp_path):
+    """
+    Test that a checkpoint's snapshot is loaded and only later records are replayed.
+    """
+    manager = PersistentMaterialsManager.open(tmp_path)
+    trade_a_few(manager, day=4)
+    manager.checkpoint().join()
+    manager.trade_material(2, 1, MagicalMaterial.EBONSTONE, 10, TransactionType.BARTER, date(2025, 1, 5))
+    manager.close()
+
+    recovered = PersistentMaterialsManager.open(tmp_path)
+
+    assert recovered.inventory == manager.inventory
+    assert [t.quantity for t in recovered.get_transaction_history()] == [10]
+    assert [t.quantity for t in recovered.history()] == [200, 50, 100, 10]
+    assert recovered.ledger.snapshots() == [2]
+    recovered.close()
+
+
+def test_automatic_checkpoints(tmp_path):
+    """
+    Test that checkpoint_every snapshots the world as changes accumulate.
+    """
+    manager = PersistentMaterialsManager.open(tmp_path, checkpoint_every=3)
+    try:
+        trade_a_few(manager)
+    finally:
+        manager.close()
+
+    assert manager.ledger.segments() == [1, 2]
+    recovered = PersistentMaterialsManager.open(tmp_path)
+    try:
+        assert recovered.inventory == manager.inventory
+    finally:
+        recovered.close()
+
+
+def test_checkpoint_is_skipped_while_one_is_in_flight(tmp_path, monkeypatch):
+    """
+    Test that a checkpoint asked for during another one does not wait for it, and
+    that the old segment is made durable before the snapshot is written.
+    """
+    ledger = Ledger(tmp_path)
+    release = threading.Event()
+    events = []
+    write_snapshot = ledger._write_snapshot
+
+    def slow_snapshot(state):
+        events.append(("snapshot", (tmp_path / "wal-00000001.jsonl").read_bytes()))
+        release.wait(5)
+        write_snapshot(state)
+
+    monkeypatch.setattr(ledger, "_write_snapshot", slow_snapshot)
+    try:
+        ledger.append({"op": "assign"})
+        writer = ledger.checkpoint({})
+        assert writer is not None
+        assert ledger.checkpoint({}) is None
+        assert ledger.segment == 2
+        release.set()
+        writer.join()
+        assert ledger.checkpoint({}) is not None
+    finally:
+        release.set()
+        ledger.close()
+
+    assert events[0] == ("snapshot", b'{"op":"assign"}\n')
+    assert ledger.snapshots() == [3]
+
+
+def test_new_segment_is_not_committed_before_the_old_tail(tmp_path):
+    """
+    Test that a crash while a checkpoint is still writing the old segment leaves a
+    ledger that opens: no later record is on disk without the ones before it.
+    """
+    directory = tmp_path / "ledger"
+    manager = PersistentMaterialsManager.open(directory, checkpoint_every=None, commit_interval=0.01)
+    release = threading.Event()
+    finish_checkpoint = manager.ledger._finish_checkpoint
+
+    def slow_finish(*args):
+        release.wait(5)
+        finish_checkpoint(*args)
+
+    manager.ledger._finish_checkpoint = slow_finish
+    try:
+        manager.assign_material(1, MagicalMaterial.EBONSTONE, 100)
+        writer = manager.checkpoint()
+        manager.remove_material(1, MagicalMaterial.EBONSTONE, 100)
+        committer = threading.Thread(target=manager.ledger.commit)
+        committer.start()
+        committer.join(0.2)
+        # The state a crash would leave right now.
+        shutil.copytree(directory, tmp_path / "crashed")
+    finally:
+        release.set()
+        writer.join()
+        manager.close()
+
+    crashed = PersistentMaterialsManager.open(tmp_path / "crashed")
+    try:
+        assert crashed.get_inventory(1) in ({}, {MagicalMaterial.EBONSTONE: 100})
+    finally:
+        crashed.close()
+    recovered = PersistentMaterialsManager.open(directory)
+    try:
+        assert recovered.get_inventory(1) == {}
+        assert [record["op"] for record in recovered.ledger.records()] == ["assign", "remove"]
+    finally:
+        recovered.close()
+
+
+def test_recovery_ignores_a_torn_last_line(tmp_path):
+    """
+    Test that a record cut short by a crash is dropped and later records still land on their own line.
+    """
+    manager = PersistentMaterialsManager.open(tmp_path)
+    trade_a_few(manager)
+    manager.close()
+    with open(tmp_path / "wal-00000001.jsonl", "ab") as f:
+        f.write(b'{"op":"assign","player_id":9,"mat')
+
+    recovered = PersistentMaterialsManager.open(tmp_path)
+    assert 9 not in recovered.inventory
+    recovered.assign_material(9, MagicalMaterial.SHADOWGLASS, 5)
+    recovered.close()
+
+    assert PersistentMaterialsManager.open(tmp_path).get_inventory(9) == {MagicalMaterial.SHADOWGLASS: 5}
+
+
+def test_commits_are_grouped(tmp_path, monkeypatch):
+    """
+    Test that many records share a few fsyncs instead of one each.
+    """
+    fsyncs = []
+    real_fsync = os.fsync
+    monkeypatch.setattr("src.trade.ledger.os.fsync", lambda fd: (fsyncs.append(fd), real_fsync(fd)))
+
+    ledger = Ledger(tmp_path, commit_interval=60, commit_every=100)
+    for i in range(1000):
+        ledger.append({"op": "assign", "player_id": i, "material": "Ebonstone", "quantity": 1})
+    ledger.close()
+
+    assert len(list(ledger.records())) == 1000
+    assert len(fsyncs) <= 11
+
+
+def test_unknown_record_is_rejected(tmp_path):
+    """
+    Test that replaying a record the manager does not understand fails loudly.
+    """
+    ledger = Ledger(tmp_path)
+    ledger.append({"op": "teleport"})
+    ledger.close()
+
+    with pytest.raises(ValueError, match="Unknown ledger record"):
+        PersistentMaterialsManager.open(tmp_path)
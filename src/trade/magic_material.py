@@ -1,6 +1,8 @@
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
 from enum import Enum
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, Field, PrivateAttr
+from typing import Iterable, NamedTuple, Optional, List
 from datetime import date
 
 
@@ -37,40 +39,244 @@ class Transaction(BaseModel):
     date: date
 
 
+class Trade(NamedTuple):
+    """
+    One trade for MagicalMaterialsManager.trade_batch, with the arguments of trade_material.
+    """
+    seller_id: Optional[int]
+    buyer_id: Optional[int]
+    material: MagicalMaterial
+    quantity: float
+    transaction_type: TransactionType
+    date: date
+    details: Optional[str] = None
+
+
+def _validated_trade(trade) -> Trade:
+    """
+    The trade with its enums coerced, or a ValueError naming what is wrong with it.
+    Every log type can then store it without further checks.
+    """
+    trade = trade if isinstance(trade, Trade) else Trade(*trade)
+    seller_id, buyer_id, material, quantity, transaction_type, trade_date, details = trade
+    for player_id in (seller_id, buyer_id):
+        if player_id is not None and (not isinstance(player_id, int) or isinstance(player_id, bool)):
+            raise ValueError(f"Player ID must be an int or None, not {player_id!r}.")
+    if isinstance(quantity, bool) or not isinstance(quantity, (int, float)):
+        raise ValueError(f"Quantity must be a number, not {quantity!r}.")
+    if quantity <= 0:
+        raise ValueError("Quantity must be greater than zero.")
+    if not isinstance(trade_date, date):
+        raise ValueError(f"Date must be a date, not {trade_date!r}.")
+    if details is not None and not isinstance(details, str):
+        raise ValueError(f"Details must be a string or None, not {details!r}.")
+    return Trade(seller_id, buyer_id, MagicalMaterial(material), float(quantity), TransactionType(transaction_type), trade_date, details)
+
+
+class TransactionView(Sequence):
+    """
+    Read-only view of the log entries at the given positions, in log order.
+    Nothing is copied until an entry is read.
+    """
+    def __init__(self, transactions: List[Transaction], positions: List[int]):
+        self._transactions = transactions
+        self._positions = positions
+
+    @property
+    def positions(self) -> List[int]:
+        return self._positions
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return TransactionView(self._transactions, self._positions[index])
+        return self._transactions[self._positions[index]]
+
+    def __iter__(self):
+        transactions = self._transactions
+        return (transactions[position] for position in self._positions)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Sequence):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"TransactionView({list(self)!r})"
+
+
 class TransactionLog(BaseModel):
     transactions: List[Transaction] = Field(default_factory=list)
 
+    # Secondary indexes, kept up to date by add_transaction. Each maps a key to the
+    # positions of the matching transactions in ascending order.
+    _by_player: dict[int, List[int]] = PrivateAttr(default_factory=dict)
+    _by_material: dict[MagicalMaterial, List[int]] = PrivateAttr(default_factory=dict)
+    _by_type: dict[TransactionType, List[int]] = PrivateAttr(default_factory=dict)
+    # Date ordinals in sorted order, with the position of each entry alongside.
+    _dates: List[int] = PrivateAttr(default_factory=list)
+    _date_positions: List[int] = PrivateAttr(default_factory=list)
+
+    def model_post_init(self, __context):
+        self._index(self.transactions, 0)
+
     def add_transaction(self, transaction: Transaction):
         """
         Add a transaction to the log.
         """
         self.transactions.append(transaction)
+        self._index([transaction], len(self.transactions) - 1)
 
-    def query_by_player(self, player_id: int) -> List[Transaction]:
+    def record(
+        self,
+        seller_id: Optional[int],
+        buyer_id: Optional[int],
+        material: MagicalMaterial,
+        quantity: float,
+        transaction_type: TransactionType,
+        date: date,
+        details: Optional[str] = None
+    ):
         """
-        Get all transactions involving a specific player.
+        Build a Transaction from its fields and add it to the log.
         """
-        return [
-            transaction for transaction in self.transactions
-            if transaction.seller_id == player_id or transaction.buyer_id == player_id
+        self.add_transaction(Transaction(
+            seller_id=seller_id,
+            buyer_id=buyer_id,
+            material=material,
+            quantity=quantity,
+            transaction_type=transaction_type,
+            details=details,
+            date=date
+        ))
+
+    def record_batch(self, trades: Sequence[Trade]):
+        """
+        Build Transactions for many trades and add them to the log. Nothing is added
+        if any of them fails validation.
+        """
+        transactions = [
+            Transaction(
+                seller_id=trade.seller_id,
+                buyer_id=trade.buyer_id,
+                material=trade.material,
+                quantity=trade.quantity,
+                transaction_type=trade.transaction_type,
+                details=trade.details,
+                date=trade.date
+            )
+            for trade in trades
         ]
+        start = len(self.transactions)
+        self.transactions.extend(transactions)
+        self._index(transactions, start)
+
+    def query_by_player(self, player_id: int) -> TransactionView:
+        """
+        Get all transactions involving a specific player.
+        """
+        return self.query(player_id=player_id)
 
-    def query_by_material(self, material: MagicalMaterial) -> List[Transaction]:
+    def query_by_material(self, material: MagicalMaterial) -> TransactionView:
         """
         Get all transactions involving a specific magical material.
         """
-        return [
-            transaction for transaction in self.transactions
-            if transaction.material == material
-        ]
+        return self.query(material=material)
+
+    def query_by_type(self, transaction_type: TransactionType) -> TransactionView:
+        """
+        Get all transactions of a specific type.
+        """
+        return self.query(transaction_type=transaction_type)
+
+    def query_by_date(self, start: Optional[date] = None, end: Optional[date] = None) -> TransactionView:
+        """
+        Get all transactions dated between start and end, both inclusive.
+        """
+        return self.query(start=start, end=end)
+
+    def query(
+        self,
+        player_id: Optional[int] = None,
+        material: Optional[MagicalMaterial] = None,
+        transaction_type: Optional[TransactionType] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None
+    ) -> TransactionView:
+        """
+        Get the transactions matching every given filter, by intersecting the indexes.
+        """
+        candidates = []
+        if player_id is not None:
+            candidates.append(self._by_player.get(player_id, []))
+        if material is not None:
+            candidates.append(self._by_material.get(material, []))
+        if transaction_type is not None:
+            candidates.append(self._by_type.get(transaction_type, []))
+
+        has_dates = start is not None or end is not None
+        if not candidates:
+            if not has_dates:
+                return TransactionView(self.transactions, list(range(len(self.transactions))))
+            return TransactionView(self.transactions, sorted(self._date_positions[slice(*self._date_range(start, end))]))
+
+        candidates.sort(key=len)
+        positions = candidates[0]
+        for other in candidates[1:]:
+            positions = [position for position in positions if self._contains(other, position)]
+        if has_dates:
+            low, high = self._ordinal_bounds(start, end)
+            positions = [p for p in positions if low <= self.transactions[p].date.toordinal() <= high]
+        elif len(candidates) == 1:
+            positions = list(positions)
+        return TransactionView(self.transactions, positions)
+
+    def _index(self, transactions: List[Transaction], start: int):
+        """
+        Index transactions stored from position start onwards.
+        """
+        # Private attributes go through pydantic's __getattr__, so look them up once per batch.
+        by_player, by_material, by_type = self._by_player, self._by_material, self._by_type
+        dates, date_positions = self._dates, self._date_positions
+        for position, transaction in enumerate(transactions, start):
+            for player_id in {transaction.seller_id, transaction.buyer_id} - {None}:
+                by_player.setdefault(player_id, []).append(position)
+            by_material.setdefault(transaction.material, []).append(position)
+            by_type.setdefault(transaction.transaction_type, []).append(position)
+
+            ordinal = transaction.date.toordinal()
+            if not dates or ordinal >= dates[-1]:
+                dates.append(ordinal)
+                date_positions.append(position)
+            else:
+                at = bisect_right(dates, ordinal)
+                dates.insert(at, ordinal)
+                date_positions.insert(at, position)
+
+    def _ordinal_bounds(self, start: Optional[date], end: Optional[date]) -> tuple[int, int]:
+        low = start.toordinal() if start is not None else date.min.toordinal()
+        high = end.toordinal() if end is not None else date.max.toordinal()
+        return low, high
+
+    def _date_range(self, start: Optional[date], end: Optional[date]) -> tuple[int, int]:
+        low, high = self._ordinal_bounds(start, end)
+        return bisect_left(self._dates, low), bisect_right(self._dates, high)
+
+    @staticmethod
+    def _contains(positions: List[int], position: int) -> bool:
+        at = bisect_left(positions, position)
+        return at < len(positions) and positions[at] == position
 
 
 class MagicalMaterialsManager:
-    def __init__(self):
+    def __init__(self, transaction_log: Optional[TransactionLog] = None):
         # Dictionary to track player inventories, with material quantities (grams)
         self.inventory: dict[int, dict[MagicalMaterial, float]] = {}
-        # Transaction log to record all transactions
-        self.transaction_log = TransactionLog()
+        # Transaction log to record all transactions. Any log with the TransactionLog
+        # API works, e.g. a ColumnarTransactionLog for very long histories.
+        self.transaction_log = transaction_log if transaction_log is not None else TransactionLog()
 
     def assign_material(self, player_id: int, material: MagicalMaterial, quantity: float):
         """
@@ -123,16 +329,43 @@ class MagicalMaterialsManager:
             self.assign_material(buyer_id, material, quantity)
 
         # Record the transaction
-        transaction = Transaction(
-            seller_id=seller_id,
-            buyer_id=buyer_id,
-            material=material,
-            quantity=quantity,
-            transaction_type=transaction_type,
-            details=details,
-            date=date
-        )
-        self.transaction_log.add_transaction(transaction)
+        self.transaction_log.record(seller_id, buyer_id, material, quantity, transaction_type, date, details)
+
+    def trade_batch(self, trades: Iterable[Trade]):
+        """
+        Settle many trades at once, all or nothing. Balances are checked against the
+        net effect of the whole batch, whatever the order of its trades, so a seller
+        only needs to hold what they give up overall and may sell material that
+        another trade in the batch gives them. If any seller would go negative, or
+        any trade is invalid, a ValueError is raised and neither inventories nor the
+        log change.
+        """
+        trades = [_validated_trade(trade) for trade in trades]
+        changes: dict[tuple[int, MagicalMaterial], float] = {}
+        for seller_id, buyer_id, material, quantity, *_ in trades:
+            if seller_id is not None:
+                key = (seller_id, material)
+                changes[key] = changes.get(key, 0) - quantity
+            if buyer_id is not None:
+                key = (buyer_id, material)
+                changes[key] = changes.get(key, 0) + quantity
+
+        # One pass over the net changes: only net sellers can run out.
+        for (player_id, material), change in changes.items():
+            if change < 0 and self.inventory.get(player_id, {}).get(material, 0) + change < 0:
+                raise ValueError(f"Seller {player_id} does not have enough {material.value} to trade.")
+
+        # Every trade was validated above, so the log stores the whole batch.
+        self.transaction_log.record_batch(trades)
+        for (player_id, material), change in changes.items():
+            if change == 0:
+                continue
+            holdings = self.inventory.setdefault(player_id, {})
+            quantity = holdings.get(material, 0) + change
+            if quantity == 0:
+                holdings.pop(material, None)
+            else:
+                holdings[material] = quantity
 
     def get_inventory(self, player_id: int) -> dict[MagicalMaterial, float]:
         """
@@ -140,24 +373,37 @@ class MagicalMaterialsManager:
         """
         return self.inventory.get(player_id, {})
 
-    def get_transaction_history(self) -> List[Transaction]:
+    def get_transaction_history(self) -> Sequence[Transaction]:
         """
         Get the full transaction history.
         """
         return self.transaction_log.transactions
 
-    def get_transactions_for_player(self, player_id: int) -> List[Transaction]:
+    def get_transactions_for_player(self, player_id: int) -> Sequence[Transaction]:
         """
         Get the transaction history for a specific player.
         """
         return self.transaction_log.query_by_player(player_id)
 
-    def get_transactions_for_material(self, material: MagicalMaterial) -> List[Transaction]:
+    def get_transactions_for_material(self, material: MagicalMaterial) -> Sequence[Transaction]:
         """
         Get the transaction history for a specific magical material.
         """
         return self.transaction_log.query_by_material(material)
 
+    def get_transactions(
+        self,
+        player_id: Optional[int] = None,
+        material: Optional[MagicalMaterial] = None,
+        transaction_type: Optional[TransactionType] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None
+    ) -> Sequence[Transaction]:
+        """
+        Get the transactions matching all of the given filters.
+        """
+        return self.transaction_log.query(player_id, material, transaction_type, start, end)
+
 
 # Example Usage
 if __name__ == "__main__":
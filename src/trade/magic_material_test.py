@@ -3,9 +3,12 @@ from datetime import date
 from src.trade.magic_material import (
     MagicalMaterialsManager,
     MagicalMaterial,
+    Trade,
     TransactionType,
-    Transaction
+    Transaction,
+    TransactionLog
 )
+from src.trade.columnar import ColumnarTransactionLog
 
 
 @pytest.fixture
@@ -218,4 +221,180 @@ def test_query_transactions_by_material(manager):
 
     transactions = manager.get_transactions_for_material(MagicalMaterial.EBONSTONE)
     assert len(transactions) == 1
-    assert transactions[0].material == MagicalMaterial.EBONSTONE
\ No newline at end of file
+    assert transactions[0].material == MagicalMaterial.EBONSTONE
+
+@pytest.fixture
+def busy_manager(manager):
+    """
+    Fixture with a handful of trades across players, materials, types and dates.
+    """
+    manager.assign_material(1, MagicalMaterial.EBONSTONE, 500)
+    manager.assign_material(2, MagicalMaterial.SHADOWGLASS, 500)
+    trades = [
+        (1, 2, MagicalMaterial.EBONSTONE, 10, TransactionType.TRADE, date(2025, 1, 4)),
+        (2, 3, MagicalMaterial.SHADOWGLASS, 20, TransactionType.STOLEN, date(2025, 1, 2)),
+        (1, 3, MagicalMaterial.EBONSTONE, 30, TransactionType.PURCHASED, date(2025, 1, 6)),
+        (None, 1, MagicalMaterial.MOONSHARD_SILVER, 40, TransactionType.GIFT, date(2025, 1, 5)),
+        (3, 2, MagicalMaterial.EBONSTONE, 5, TransactionType.STOLEN, date(2025, 1, 7)),
+    ]
+    for seller_id, buyer_id, material, quantity, transaction_type, day in trades:
+        manager.trade_material(seller_id, buyer_id, material, quantity, transaction_type, day)
+    return manager
+
+
+def test_query_compound_filters(busy_manager):
+    """
+    Test that player, material, type and date filters combine.
+    """
+    log = busy_manager.transaction_log
+
+    assert [t.quantity for t in log.query(player_id=3, material=MagicalMaterial.EBONSTONE)] == [30, 5]
+    assert [t.quantity for t in log.query(player_id=2, transaction_type=TransactionType.STOLEN)] == [20, 5]
+    assert [t.quantity for t in log.query(material=MagicalMaterial.EBONSTONE, start=date(2025, 1, 5))] == [30, 5]
+    assert [t.quantity for t in busy_manager.get_transactions(player_id=1, start=date(2025, 1, 4), end=date(2025, 1, 5))] == [10, 40]
+    assert len(log.query(player_id=4)) == 0
+
+
+def test_query_by_date_and_type(busy_manager):
+    """
+    Test the date range and transaction type indexes on their own.
+    """
+    log = busy_manager.transaction_log
+
+    assert [t.quantity for t in log.query_by_date(date(2025, 1, 2), date(2025, 1, 5))] == [10, 20, 40]
+    assert [t.quantity for t in log.query_by_date(end=date(2025, 1, 3))] == [20]
+    assert [t.quantity for t in log.query_by_type(TransactionType.STOLEN)] == [20, 5]
+
+
+def test_indexes_match_linear_scan(busy_manager):
+    """
+    Test that the indexed queries return exactly what a full scan would.
+    """
+    log = busy_manager.transaction_log
+    for player_id in [1, 2, 3]:
+        expected = [t for t in log.transactions if player_id in (t.seller_id, t.buyer_id)]
+        assert log.query_by_player(player_id) == expected
+    for material in MagicalMaterial:
+        assert log.query_by_material(material) == [t for t in log.transactions if t.material == material]
+
+
+def test_log_rebuilds_indexes_when_loaded():
+    """
+    Test that a log built from existing transactions (e.g. deserialized) is indexed.
+    """
+    original = TransactionLog()
+    original.add_transaction(Transaction(
+        seller_id=1, buyer_id=2, material=MagicalMaterial.EBONSTONE, quantity=1,
+        transaction_type=TransactionType.TRADE, details=None, date=date(2025, 1, 4)
+    ))
+    loaded = TransactionLog.model_validate_json(original.model_dump_json())
+
+    assert len(loaded.query_by_player(2)) == 1
+    assert loaded.query_by_player(2)[0] == original.transactions[0]
+
+
+def test_transaction_view_is_lazy(busy_manager):
+    """
+    Test that a view only holds positions and slices into another view.
+    """
+    view = busy_manager.get_transactions_for_material(MagicalMaterial.EBONSTONE)
+    assert view.positions == [0, 2, 4]
+    assert [t.quantity for t in view[1:]] == [30, 5]
+
+
+def test_trade_batch(manager):
+    """
+    Test that a batch settles like the same trades one by one.
+    """
+    manager.assign_material(1, MagicalMaterial.EBONSTONE, 500)
+    trades = [
+        Trade(1, 2, MagicalMaterial.EBONSTONE, 200, TransactionType.TRADE, date(2025, 1, 4), "A trade in the market."),
+        Trade(None, 3, MagicalMaterial.MOONSHARD_SILVER, 100, TransactionType.GIFT, date(2025, 1, 5)),
+        Trade(2, None, MagicalMaterial.EBONSTONE, 50, TransactionType.SEIZED, date(2025, 1, 6)),
+    ]
+    manager.trade_batch(trades)
+
+    one_by_one = MagicalMaterialsManager()
+    one_by_one.assign_material(1, MagicalMaterial.EBONSTONE, 500)
+    for trade in trades:
+        one_by_one.trade_material(*trade)
+
+    assert manager.inventory == one_by_one.inventory
+    assert manager.get_transaction_history() == one_by_one.get_transaction_history()
+    assert [t.quantity for t in manager.get_transactions_for_player(2)] == [200, 50]
+
+
+def test_trade_batch_nets_flows_within_the_batch(manager):
+    """
+    Test that balances are checked on the net effect of the batch, so a player can
+    sell material that a later trade in the batch gives them.
+    """
+    manager.assign_material(1, MagicalMaterial.EBONSTONE, 100)
+    manager.trade_batch([
+        (2, 3, MagicalMaterial.EBONSTONE, 60, TransactionType.TRADE, date(2025, 1, 4)),
+        (1, 2, MagicalMaterial.EBONSTONE, 100, TransactionType.TRADE, date(2025, 1, 4)),
+    ])
+
+    assert manager.get_inventory(1) == {}
+    assert manager.get_inventory(2) == {MagicalMaterial.EBONSTONE: 40}
+    assert manager.get_inventory(3) == {MagicalMaterial.EBONSTONE: 60}
+
+
+def test_trade_batch_is_all_or_nothing(manager):
+    """
+    Test that a failing trade leaves inventories and the log untouched.
+    """
+    manager.assign_material(1, MagicalMaterial.EBONSTONE, 100)
+    batches = [
+        [
+            (1, 2, MagicalMaterial.EBONSTONE, 50, TransactionType.TRADE, date(2025, 1, 4)),
+            (1, 3, MagicalMaterial.EBONSTONE, 60, TransactionType.TRADE, date(2025, 1, 4)),
+        ],
+        [
+            (1, 2, MagicalMaterial.EBONSTONE, 50, TransactionType.TRADE, date(2025, 1, 4)),
+            (1, 2, MagicalMaterial.EBONSTONE, 0, TransactionType.TRADE, date(2025, 1, 4)),
+        ],
+    ]
+    for batch in batches:
+        with pytest.raises(ValueError):
+            manager.trade_batch(batch)
+
+    assert manager.inventory == {1: {MagicalMaterial.EBONSTONE: 100}}
+    assert len(manager.get_transaction_history()) == 0
+
+
+@pytest.mark.parametrize("log_type", [TransactionLog, ColumnarTransactionLog])
+@pytest.mark.parametrize(
+    "bad_trade",
+    [
+        (None, 2, "Unobtainium", 5, TransactionType.GIFT, date(2025, 1, 4)),
+        (None, 2, MagicalMaterial.EBONSTONE, 5, "Haggled", date(2025, 1, 4)),
+        (None, 2, MagicalMaterial.EBONSTONE, "5", TransactionType.GIFT, date(2025, 1, 4)),
+        (None, 2, MagicalMaterial.EBONSTONE, 5, TransactionType.GIFT, "2025-01-04"),
+        ("1", 2, MagicalMaterial.EBONSTONE, 5, TransactionType.GIFT, date(2025, 1, 4)),
+    ],
+)
+def test_trade_batch_rejects_invalid_fields(log_type, bad_trade):
+    """
+    Test that an invalid trade raises ValueError before anything changes, whatever the log.
+    """
+    manager = MagicalMaterialsManager(log_type())
+    with pytest.raises(ValueError):
+        manager.trade_batch([(None, 2, MagicalMaterial.EBONSTONE, 5, TransactionType.GIFT, date(2025, 1, 4)), bad_trade])
+
+    assert manager.inventory == {}
+    assert len(manager.get_transaction_history()) == 0
+
+
+def test_trade_batch_skips_players_with_no_net_change(manager):
+    """
+    Test that a player who gives back what they got gets no empty inventory.
+    """
+    manager.assign_material(1, MagicalMaterial.EBONSTONE, 100)
+    manager.trade_batch([
+        (1, 2, MagicalMaterial.EBONSTONE, 30, TransactionType.TRADE, date(2025, 1, 4)),
+        (2, 3, MagicalMaterial.EBONSTONE, 30, TransactionType.TRADE, date(2025, 1, 4)),
+    ])
+
+    assert 2 not in manager.inventory
+    assert manager.inventory == {1: {MagicalMaterial.EBONSTONE: 70}, 3: {MagicalMaterial.EBONSTONE: 30}}
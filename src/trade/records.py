@@ -0,0 +1,128 @@
+"""
+Fixed-width transaction record files for offline analysis.
+
+A record file is a 16 byte header followed by one 34 byte record per
+transaction, laid out like the columns of ColumnarTransactionLog. Details are
+interned in a sidecar file (<name>.strings), one JSON string per line.
+MappedTransactionLog opens a record file with mmap as a NumPy structured array,
+so a multi-GB ledger is queried without deserializing it, and worker processes
+share the same pages instead of each holding a copy.
+"""
+
+import json
+import struct
+from functools import cached_property
+from pathlib import Path
+
+import numpy as np
+
+from src.trade.columnar import NO_DETAILS, ColumnarTransactionLog
+
+RECORD_DTYPE = np.dtype([
+    ("seller_ids", "<i8"),
+    ("buyer_ids", "<i8"),
+    ("quantities", "<f8"),
+    ("dates", "<i4"),
+    ("details", "<i4"),
+    ("materials", "u1"),
+    ("transaction_types", "u1"),
+])
+
+MAGIC = b"XRPGTXN\0"
+VERSION = 1
+# magic, format version, record size, reserved
+_HEADER = struct.Struct("<8sHHI")
+HEADER_SIZE = _HEADER.size
+
+
+def strings_path(path: str | Path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + ".strings")
+
+
+def read_strings(path: str | Path) -> list[str]:
+    sidecar = strings_path(path)
+    if not sidecar.exists():
+        return []
+    with open(sidecar, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def write_records(path: str | Path, log) -> int:
+    """
+    Append the transactions of log (any TransactionLog, ColumnarTransactionLog or
+    iterable of Transactions or Trades) to the record file at path, creating it
+    if needed. Returns the number of records written.
+    """
+    if not isinstance(log, ColumnarTransactionLog):
+        log = ColumnarTransactionLog.from_transactions(list(getattr(log, "transactions", log)))
+
+    path = Path(path)
+    columns = log.columns()
+    records = np.empty(len(log), dtype=RECORD_DTYPE)
+    for name in RECORD_DTYPE.names:
+        records[name] = columns[name]
+
+    # Re-intern details against the strings already in the file.
+    strings = read_strings(path)
+    string_ids = {text: i for i, text in enumerate(strings)}
+    new_strings = []
+    remap = np.empty(len(log.strings), dtype=np.int32)
+    for i, text in enumerate(log.strings):
+        if text not in string_ids:
+            string_ids[text] = len(strings) + len(new_strings)
+            new_strings.append(text)
+        remap[i] = string_ids[text]
+    has_details = records["details"] != NO_DETAILS
+    records["details"][has_details] = remap[records["details"][has_details]]
+
+    if new_strings:
+        with open(strings_path(path), "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(text) + "\n" for text in new_strings)
+    with open(path, "ab") as f:
+        if f.tell() == 0:
+            f.write(_HEADER.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize, 0))
+        f.write(records.tobytes())
+    return len(records)
+
+
+class MappedTransactionLog(ColumnarTransactionLog):
+    """
+    Read-only ColumnarTransactionLog over a memory-mapped record file. The
+    columns are views into the mapping, so queries and analytics read straight
+    from the page cache. Records appended to the file after it was opened are not
+    seen; open it again to pick them up.
+    """
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) < HEADER_SIZE:
+            raise ValueError(f"{self.path} is not a transaction record file.")
+        magic, version, record_size, _ = _HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION or record_size != RECORD_DTYPE.itemsize:
+            raise ValueError(f"{self.path} is not a version {VERSION} transaction record file.")
+
+        size = (self.path.stat().st_size - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        if size:
+            self.records = np.memmap(self.path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(size,))
+        else:
+            # mmap cannot map an empty range.
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+        for name in RECORD_DTYPE.names:
+            setattr(self, name, self.records[name])
+        self._size = size
+
+    @cached_property
+    def strings(self) -> list[str]:
+        return read_strings(self.path)
+
+    @property
+    def nbytes(self) -> int:
+        return self.records.nbytes
+
+    def record(self, *args, **kwargs):
+        raise TypeError("MappedTransactionLog is read-only; use write_records to append.")
+
+    def record_batch(self, trades):
+        raise TypeError("MappedTransactionLog is read-only; use write_records to append.")
@@ -0,0 +1,99 @@
+from datetime import date
+
+import numpy as np
+import pytest
+from src.trade.analytics import net_flows
+from src.trade.columnar import ColumnarTransactionLog
+from src.trade.magic_material import MagicalMaterialsManager, MagicalMaterial, TransactionType
+from src.trade.records import RECORD_DTYPE, MappedTransactionLog, write_records
+
+
+@pytest.fixture
+def manager():
+    """
+    Fixture for a manager with a few trades, some sharing details.
+    """
+    manager = MagicalMaterialsManager()
+    manager.assign_material(1, MagicalMaterial.EBONSTONE, 500)
+    manager.trade_material(1, 2, MagicalMaterial.EBONSTONE, 200, TransactionType.TRADE, date(2025, 1, 4), "A trade in the market.")
+    manager.trade_material(None, 3, MagicalMaterial.MOONSHARD_SILVER, 100, TransactionType.GIFT, date(2025, 1, 5), "A gift from the goddess.")
+    manager.trade_material(2, None, MagicalMaterial.EBONSTONE, 50, TransactionType.SEIZED, date(2025, 1, 6))
+    manager.trade_material(1, 3, MagicalMaterial.EBONSTONE, 25, TransactionType.TRADE, date(2025, 1, 7), "A trade in the market.")
+    return manager
+
+
+def test_mapped_log_matches_the_original(manager, tmp_path):
+    """
+    Test that a written record file reads back with the same transactions and queries.
+    """
+    path = tmp_path / "ledger.bin"
+    assert write_records(path, manager.transaction_log) == 4
+    log = MappedTransactionLog(path)
+
+    assert path.stat().st_size == 16 + 4 * RECORD_DTYPE.itemsize
+    assert list(log.transactions) == list(manager.get_transaction_history())
+    for player_id in [1, 2, 3, 4]:
+        assert log.query_by_player(player_id) == manager.get_transactions_for_player(player_id)
+    for material in MagicalMaterial:
+        assert log.query_by_material(material) == manager.get_transactions_for_material(material)
+    assert np.array_equal(net_flows(log).net, net_flows(manager.transaction_log).net)
+
+
+def test_mapped_log_is_zero_copy(manager, tmp_path):
+    """
+    Test that the columns are read-only views of the mapping.
+    """
+    path = tmp_path / "ledger.bin"
+    write_records(path, manager.transaction_log)
+    log = MappedTransactionLog(path)
+    quantities = log.columns()["quantities"]
+
+    assert isinstance(log.records, np.memmap)
+    assert np.shares_memory(quantities, log.records)
+    assert not quantities.flags.writeable
+    with pytest.raises(TypeError):
+        log.record(1, 2, MagicalMaterial.EBONSTONE, 1, TransactionType.TRADE, date(2025, 1, 1))
+
+
+def test_appends_share_the_string_table(manager, tmp_path):
+    """
+    Test that appending another log re-interns its details against the file's strings.
+    """
+    path = tmp_path / "ledger.bin"
+    write_records(path, manager.transaction_log)
+    later = ColumnarTransactionLog()
+    later.record(3, 1, MagicalMaterial.SHADOWGLASS, 5, TransactionType.BARTER, date(2025, 1, 8), "A new deal.")
+    later.record(3, 2, MagicalMaterial.SHADOWGLASS, 5, TransactionType.BARTER, date(2025, 1, 8), "A gift from the goddess.")
+    write_records(path, later)
+
+    log = MappedTransactionLog(path)
+    assert len(log) == 6
+    assert log.strings == ["A trade in the market.", "A gift from the goddess.", "A new deal."]
+    assert [t.details for t in log.transactions[4:]] == ["A new deal.", "A gift from the goddess."]
+
+
+def test_rejects_other_files(tmp_path):
+    """
+    Test that a file without the record header is refused.
+    """
+    path = tmp_path / "ledger.bin"
+    path.write_bytes(b"not a ledger at all")
+
+    with pytest.raises(ValueError):
+        MappedTransactionLog(path)
+
+
+def test_writes_the_persisted_ledger_history(manager, tmp_path):
+    """
+    Test that the write-ahead ledger's full history can be exported for mapping.
+    """
+    from src.trade.ledger import PersistentMaterialsManager
+
+    persistent = PersistentMaterialsManager.open(tmp_path / "ledger")
+    persistent.assign_material(1, MagicalMaterial.EBONSTONE, 500)
+    for transaction in manager.get_transaction_history():
+        persistent.trade_material(*(getattr(transaction, field) for field in ("seller_id", "buyer_id", "material", "quantity", "transaction_type", "date", "details")))
+    write_records(tmp_path / "ledger.bin", persistent.history())
+    persistent.close()
+
+    assert list(MappedTransactionLog(tmp_path / "ledger.bin").transactions) == list(manager.get_transaction_history())
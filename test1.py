@@ -1,11 +1,10 @@
-import json
-from ollama import chat
+from src.ai_call import AIModel, Message, Purpose
 
 
 # Step 3: Set up the user context
-user_message = {
-    'role': 'user',
-    'content': """
+user_message = Message(
+    role='user',
+    content="""
         You are a tic tac toe agent. The human player goes first and plays as X. You are playing as O. The board has values 1 to 9.
 
         Given the prompt below, determine the player's intended outcome. There are three possible intents:
@@ -18,14 +17,10 @@ user_message = {
 
         determine which ones of these applies and provide a one word answer.
 """,
-}
+)
 
 
-stream = chat(
-    model='llama3.2',
-    messages=[user_message],
-    stream=True,
-)
+stream = AIModel().chat([user_message], purpose=Purpose.intent)
 
 # Step 5: Print the response as it streams
 for chunk in stream:
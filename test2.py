@@ -1,17 +1,14 @@
-import json
-from ollama import chat
+from src.npc import load_persona
+from src.ai_call import Message, AIModel, Purpose
 
-from src.npc import NPC
-from src.ai_call import Message, AIModel
-
-npc_data = NPC.from_file('npcs/marlena_graves.json')
+persona_data = load_persona('game/marlena_graves.json')
 
 system_message = Message(
     role='system',
     content=f"""
 You are roleplaying as the NPC Marlene Graves. Here is her profile:
 
-{npc_data.model_dump_json()}
+{persona_data.text}
 
 Based on this information, describe what happens when the player walks into Marlene's shop. Provide details about her appearance, the shop, her initial attitude toward the player, and anything she might say or do.
 """
@@ -24,7 +21,7 @@ user_message = Message(
 )
 
 ai_model = AIModel()
-stream = ai_model.chat([system_message, user_message])
+stream = ai_model.chat([system_message, user_message], purpose=Purpose.roleplay)
 
 for chunk in stream:
     print(chunk['message']['content'], end='', flush=True)
\ No newline at end of file
@@ -1,17 +1,8 @@
-import json
-from ollama import chat
+from src.ai_call import AIModel
+from src.plan.planner import match_plans, narrate_plans, seed_agents
 
-from src.ai_call import AIModel, Message
-from src.npc import NPC
-
-# Step 1: Read the NPC JSON from file
-with open('prompts/planner.txt', 'r') as file:
-    npc_data = file.read() 
-
-msg = Message(
-    role='user',
-    content=npc_data
-)
-stream = AIModel().chat([msg])
-for chunk in stream:
-    print(chunk['message']['content'], end='', flush=True)
\ No newline at end of file
+agents = seed_agents(10)
+plans = match_plans(agents)
+for agent_id, plan in plans.items():
+    print(f"{agent_id}: {plan.model_dump_json()}")
+print(narrate_plans(agents, plans, AIModel()))
@@ -1,6 +1,12 @@
+import json
+import random
+
+import numpy as np
 import pytest
 from unittest.mock import patch
-from tictactoe import agent_response, find_player_intent, Intent
+from tictactoe import BitboardTicTacToe, Move, TicTacToe, batch_random_games, batch_winners
+from tictactoe import best_move, build_solution, canonical, get_solution, load_solution, response_move_intent, search_best_move, SOLVER_VERSION
+from tictactoe import agent_response, find_player_intent, llm_player_intent, parse_player_input, Intent, PlayerIntent, IntentClassifier, BagOfWordsModel, INTENT_EXAMPLES
 
 # Test cases for player intent detection
 @pytest.mark.parametrize(
@@ -53,4 +59,249 @@ def test_agent_response(mock_agent_response, player_prompt, mock_response, expec
     result = agent_response(player_prompt)
 
     # Assert the expected outcome
-    assert result == expected_intent
\ No newline at end of file
+    assert result == expected_intent
+
+
+@pytest.mark.parametrize(
+    "player_prompt, expected_intent, expected_square",
+    [
+        ("5", Intent.move, 5),
+        ("move to 7", Intent.move, 7),
+        ("I want to move to position 5", Intent.move, 5),
+        ("take the top right corner", Intent.move, 3),
+        ("Where should I move next?", Intent.discuss, None),
+        ("What is the current board state?", Intent.discuss, None),
+    ]
+)
+def test_fast_intent_classifier(player_prompt, expected_intent, expected_square):
+    """
+    Test that the local classifier handles plain moves and game questions without the LLM.
+    """
+    result = IntentClassifier().classify(player_prompt)
+
+    assert result.intent == expected_intent
+    if expected_square is None:
+        assert result.move is None
+    else:
+        assert result.move.move == expected_square
+        assert result.move.player == "X"
+
+
+@pytest.mark.parametrize(
+    "player_prompt",
+    [
+        "I want to place my piece on 99",  # Out of range square
+        "put me on 4 and 5",  # More than one square
+        "Is 5 a good move?",  # Question, not a move
+        "hello there",
+    ]
+)
+def test_fast_intent_classifier_defers_ambiguous_input(player_prompt):
+    """
+    Test that ambiguous input is left for the LLM instead of being guessed.
+    """
+    result = IntentClassifier().classify(player_prompt)
+    assert result is None or result.intent != Intent.move
+
+
+def test_fast_intent_classifier_hit_rate():
+    """
+    Test that the hit rate counts the inputs answered locally.
+    """
+    classifier = IntentClassifier()
+    for player_prompt in ["5", "move to 7", "hello there", "Tell me a joke!"]:
+        classifier.classify(player_prompt)
+
+    assert classifier.lookups == 4
+    assert classifier.hits == 2
+    assert classifier.hit_rate == 0.5
+
+
+def test_bag_of_words_model():
+    """
+    Test that the bag-of-words model learns the example intents.
+    """
+    model = BagOfWordsModel().train(INTENT_EXAMPLES)
+    intent, confidence = model.predict("what is the current state of the board")
+    assert intent == Intent.discuss
+    assert confidence > 0.5
+    assert model.predict("zzz") == (None, 0.0)
+
+
+def test_intent_examples_are_not_test_prompts():
+    """
+    Test that the classifier is not trained on the prompts it is tested with.
+    """
+    trained = {text.lower() for text, _ in INTENT_EXAMPLES}
+    tested = ["I want to move to position 5", "Where should I move next?", "What is the current board state?",
+              "Tell me a joke!", "Tell me a tictactoe joke!", "What games are like tictactoe",
+              "I want to place my piece on 99", "what is the current state of the board", "hello there"]
+    assert trained.isdisjoint(prompt.lower() for prompt in tested)
+
+
+@pytest.mark.parametrize(
+    "player_prompt, expected_intent",
+    [
+        ("recite a poem about winter", Intent.offtopic),
+        ("could you write me a limerick", Intent.offtopic),
+        ("tell me about the history of rome", Intent.offtopic),
+        ("how many squares are left on the board?", Intent.discuss),
+        ("who is ahead in this game?", Intent.discuss),
+    ]
+)
+def test_bag_of_words_model_on_unseen_wording(player_prompt, expected_intent):
+    """
+    Test that the model generalises to phrasings that are not in its training examples.
+    """
+    intent, confidence = BagOfWordsModel().train(INTENT_EXAMPLES).predict(player_prompt)
+    assert intent == expected_intent
+    assert confidence > 0.7
+
+
+@patch("tictactoe.intent_prompt")
+def test_llm_intent_move_is_always_for_x(mock_intent_prompt):
+    """
+    Test that a move from the LLM is played as X whatever player it names.
+    """
+    mock_intent_prompt.structured.return_value = PlayerIntent(intent=Intent.move, move=Move(player="O", move=3))
+    result = llm_player_intent("the one on the right at the top")
+
+    assert result.move == Move(player="X", move=3)
+    assert result.message == "the one on the right at the top"
+
+
+@patch("tictactoe.llm_player_intent")
+def test_parse_player_input_skips_llm_for_moves(mock_llm_player_intent):
+    """
+    Test that a plain move never reaches the LLM and carries the parsed square.
+    """
+    result = parse_player_input("move to 7")
+
+    mock_llm_player_intent.assert_not_called()
+    assert result.intent == Intent.move
+    assert result.move.move == 7
+
+
+@patch("tictactoe.llm_player_intent", return_value=PlayerIntent(intent=Intent.offtopic))
+def test_parse_player_input_falls_back_to_llm(mock_llm_player_intent):
+    """
+    Test that ambiguous input falls back to the LLM.
+    """
+    result = parse_player_input("hello there")
+
+    mock_llm_player_intent.assert_called_once()
+    assert result.intent == Intent.offtopic
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_bitboard_matches_list_engine(seed):
+    """
+    Test that the bitboard engine gives the same Result as TicTacToe over a random game,
+    including rejected moves.
+    """
+    rng = random.Random(seed)
+    game, bitboard = TicTacToe(), BitboardTicTacToe()
+
+    for _ in range(15):
+        move = Move(player=rng.choice(["X", "O"]), move=rng.randint(0, 10))
+        expected = game.play(move)
+        assert bitboard.play(move) == expected
+        assert bitboard.board == game.board
+        if expected.winner != " ":
+            break
+
+
+def test_batch_winners():
+    """
+    Test batched evaluation against the scalar engine.
+    """
+    x = np.array([0b000000111, 0b100010001, 0b000000011, 0b000000000], dtype=np.uint16)
+    o = np.array([0b000011000, 0b000001100, 0b001010100, 0b111000000], dtype=np.uint16)
+    assert batch_winners(x, o).tolist() == [1, 1, 2, 2]
+
+
+def test_batch_random_games():
+    """
+    Test that random batched games end in consistent, legal positions.
+    """
+    x, o, winners = batch_random_games(1000, seed=1)
+
+    assert not np.any(x & o)
+    assert np.array_equal(batch_winners(x, o), winners)
+    for i in range(50):
+        engine = BitboardTicTacToe(int(x[i]), int(o[i]))
+        assert engine.check_winner() == {0: None, 1: "X", 2: "O"}[int(winners[i])]
+    # X moves first, so X has either the same number of squares as O or one more.
+    diff = np.array([int(a).bit_count() - int(b).bit_count() for a, b in zip(x, o)])
+    assert set(diff.tolist()) <= {0, 1}
+
+
+def test_canonical_is_symmetry_invariant():
+    """
+    Test that all 8 symmetric versions of a position share one canonical key.
+    """
+    corner = canonical(0b000000001, 0)[0]
+    for square in [0, 2, 6, 8]:
+        assert canonical(1 << square, 0)[0] == corner
+    assert canonical(1 << 4, 0)[0] != corner
+
+
+def test_solver_matches_fresh_search():
+    """
+    Test that every precomputed move scores as well as a fresh alpha-beta search.
+    """
+    for key, (value, _) in get_solution().items():
+        x, o = key >> 9, key & 0x1FF
+        assert search_best_move(x, o)[0] == value
+    assert search_best_move(0, 0)[0] == 0  # Perfect play is a draw
+
+
+def test_solver_never_loses_as_o():
+    """
+    Test that the O agent never loses against any sequence of X moves.
+    """
+    def play(x: int, o: int):
+        for square in range(9):
+            bit = 1 << square
+            if (x | o) & bit:
+                continue
+            game = BitboardTicTacToe(x, o)
+            result = game.play(Move(player="X", move=square + 1))
+            assert result.winner != "X"
+            if not result.empty:
+                continue
+            reply = response_move_intent("", result)
+            result = game.play(reply)
+            assert result.error == ""
+            if result.winner == " " and result.empty:
+                play(game.x, game.o)
+
+    play(0, 0)
+
+
+def test_solver_takes_the_win():
+    """
+    Test that the solver completes a line instead of blocking.
+    """
+    # X: 1, 2, 9  O: 4, 5 -> O wins with 6
+    assert best_move(0b100000011, 0b000011000) == 6
+
+
+def test_solution_cache_file(tmp_path):
+    """
+    Test that the solution is written to and read back from the cache file.
+    """
+    path = str(tmp_path / "solution.json")
+    built = load_solution(path)
+    assert built == build_solution()
+    assert load_solution(path) == built
+
+
+def test_solution_cache_file_is_rebuilt_on_version_mismatch(tmp_path):
+    """
+    Test that a cache file from another solver version is rebuilt instead of trusted.
+    """
+    path = tmp_path / "solution.json"
+    path.write_text(json.dumps({"version": SOLVER_VERSION - 1, "solution": {"0": [5, 5]}}))
+    assert load_solution(str(path)) == build_solution()
+    assert json.loads(path.read_text())["version"] == SOLVER_VERSION
@@ -1,11 +1,19 @@
 import json
-from ollama import chat
-from pydantic import BaseModel, ValidationError
+from pydantic import BaseModel
 import argparse
 from enum import Enum
 from typing import Iterator, Optional
 import logging
-import time
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from ollama import ResponseError
+
+from src.ai_call import AIModel, Message, PromptTemplate, Purpose, StreamValidationError
 
 # Configure logging
 logging.basicConfig(
@@ -15,6 +23,8 @@ logging.basicConfig(
     datefmt="%Y-%m-%d %H:%M:%S",  # Date format
 )
 
+ai_model = AIModel()
+
 agent_context_prompt = """
     You are a tic tac toe agent. The human player goes first and plays as X. You are playing as O. 
 """
@@ -72,127 +82,308 @@ class Result(BaseModel):
         return board
 
 
-def rules_prompt(board: Result) -> str:
-    board_json = board.model_dump_json()
+# Static text first, board and player input last, so Ollama reuses the cached
+# prefix of every prompt. All game prompts share GAME_RULES and the roleplay
+# policy, so they also share one cache.
+GAME_RULES = f"""
+    {agent_context_prompt.strip()} The board has values 1 to 9.
 
-    orig_rules_prompt = f"""
-        {agent_context_prompt} The board has values 1 to 9.  
+    The possible winning conditions are:
+    [1, 2, 3], [4, 5, 6], [7, 8, 9], [1, 4, 7], [2, 5, 8], [3, 6, 9], [1, 5, 9], [3, 5, 7]
 
-        The possible winning conditions are:
+    The board is represented as a dictionary:
+    {{"X": [positions occupied by X], "O": [positions occupied by O], "empty": [positions that are still empty], "winner": "X", "O" or " " while the game is on}}.
 
-        {{"X"=[1, 2, 3]}}, {{"X"=[4, 5, 6]}}, {{"X"=[7, 8, 9]}}, {{"X"=[1, 4, 7]}}, {{"X"=[2, 5, 8]}}, {{"X"=[3, 6, 9]}}, {{"X"=[1, 5, 9]}}, {{"X"=[3, 5, 7]}}
-    
-        The board is represented as follows:
-        {board_json}
-        """
-    
-    return orig_rules_prompt
+    The game flow:
+    1. The human player (X) makes the first move by picking a position (1-9) from the "empty" list.
+    2. You (O) respond with your move, always picking from the "empty" list.
+    3. The game alternates between the human player and you until there is a winner or the game ends in a draw.
 
+    Rules for picking a move:
+    - You must only pick moves from the "empty" list.
+    - You must always prioritize winning if possible.
+    - If you cannot win in this move, block the opponent if they are about to win.
+    - Otherwise, choose the best available position strategically.
+"""
 
-def find_player_intent(player_prompt: str, max_retries: int = 3, retry_delay: float = 1.0) -> Optional[Intent]:
-    prompt = f"""
-    {agent_context_prompt}
+game_prompt = PromptTemplate(GAME_RULES, purpose=Purpose.roleplay)
 
-    Given the prompt below, determine the player's intended outcome. There are three possible intents:
 
-    1. "move": The player is making a move on the board. If it is a single number that is the intended move square. Questions are not considered moves. Selecting a square or moving to a square is considered a move.
-    2. "discuss": The player is discussing the game or asking questions. These include questions about where to move next or the current board state.
-    3. "offtopic": The player is discussing something unrelated to the game.
+def rules_prompt(board: Result) -> str:
+    """
+    The changing part of a game prompt: the current board, sent after GAME_RULES.
+    """
+    return f"""
+    The board is currently:
+    {board.model_dump_json()}
 
-    prompt: {player_prompt}
+    {board.print_board()}
+    """
 
-    determine which ones of these applies and provide a one word answer.
 
-"""
+# Training phrases for the fast path. Keep them apart from the prompts in
+# test_tictactoe.py, so the tests measure how it handles wording it has not seen.
+INTENT_EXAMPLES: list[tuple[str, Intent]] = [
+    ("8", Intent.move),
+    ("go to 2", Intent.move),
+    ("I'd like square 6 please", Intent.move),
+    ("mark square 1 for me", Intent.move),
+    ("let me have the middle", Intent.move),
+    ("I choose the bottom right", Intent.move),
+    ("claim 4", Intent.move),
+    ("my X goes in the top left", Intent.move),
+    ("I'll play square 9", Intent.move),
+    ("which square is best for me now?", Intent.discuss),
+    ("how does the board look?", Intent.discuss),
+    ("am I winning?", Intent.discuss),
+    ("draw the grid for me", Intent.discuss),
+    ("how do you win at noughts and crosses?", Intent.discuss),
+    ("was my last move a mistake?", Intent.discuss),
+    ("is there any way I can still win?", Intent.discuss),
+    ("explain your strategy for this game", Intent.discuss),
+    ("who invented tic tac toe?", Intent.discuss),
+    ("what does the board look like now", Intent.discuss),
+    ("what is the score of this game so far", Intent.discuss),
+    ("which squares are still free on the board?", Intent.discuss),
+    ("is it a draw yet?", Intent.discuss),
+    ("sing me a song", Intent.offtopic),
+    ("will it rain tomorrow?", Intent.offtopic),
+    ("what's the score in the cricket?", Intent.offtopic),
+    ("name the largest ocean", Intent.offtopic),
+    ("write a haiku about the sea", Intent.offtopic),
+    ("recommend a recipe for dinner", Intent.offtopic),
+    ("what is your favourite colour", Intent.offtopic),
+    ("tell me a story about dragons", Intent.offtopic),
+    ("how tall is mount everest", Intent.offtopic),
+    ("do you like music", Intent.offtopic),
+]
+
+
+class BagOfWordsModel:
+    """
+    A tiny multinomial naive Bayes model over lowercase words.
+    """
+    def __init__(self):
+        self.word_counts: dict[Intent, Counter] = {}
+        self.doc_counts: Counter = Counter()
+        self.vocabulary: set[str] = set()
+
+    @staticmethod
+    def tokenize(text: str) -> list[str]:
+        return re.findall(r"[a-z]+|[1-9]", text.lower())
+
+    def train(self, examples: list[tuple[str, Intent]]) -> "BagOfWordsModel":
+        for text, intent in examples:
+            words = self.tokenize(text)
+            self.word_counts.setdefault(intent, Counter()).update(words)
+            self.doc_counts[intent] += 1
+            self.vocabulary.update(words)
+        return self
+
+    def predict(self, text: str) -> tuple[Optional[Intent], float]:
+        """
+        Return the most likely intent and its posterior probability.
+        """
+        words = [word for word in self.tokenize(text) if word in self.vocabulary]
+        if not words or not self.doc_counts:
+            return None, 0.0
 
-    for attempt in range(max_retries):
-        try:
-            response = agent_response(prompt).lower().replace("'","").replace("\"","").strip()
-            
-            # Validate the response
-            if response in Intent.__members__.values():
-                return Intent(response)
-            else:
-                logging.warning(f"Invalid response from agent: '{response}'. Retrying... ({attempt+1}/{max_retries})")
+        total_docs = sum(self.doc_counts.values())
+        scores = {}
+        for intent, counts in self.word_counts.items():
+            total_words = sum(counts.values())
+            score = math.log(self.doc_counts[intent] / total_docs)
+            for word in words:
+                score += math.log((counts[word] + 1) / (total_words + len(self.vocabulary)))
+            scores[intent] = score
 
-        except ValueError as e:
-            logging.error(f"Error parsing intent: {e}. Retrying... ({attempt+1}/{max_retries})")
+        best = max(scores, key=scores.get)
+        norm = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1.0 / norm
 
-        time.sleep(retry_delay)  # Wait before retrying
 
-    logging.error("All retries failed. Returning None.")
-    return None
+class IntentClassifier:
+    """
+    Local fast path ahead of the LLM. Regex rules recognise plain moves ("5",
+    "move to 7") and game questions; an optional bag-of-words model handles the
+    rest when it is confident. classify returns None when the input is ambiguous
+    and the LLM should decide.
+    """
+    square_words = {
+        "top left": 1, "top middle": 2, "top center": 2, "top right": 3,
+        "middle left": 4, "center left": 4, "center": 5, "centre": 5, "middle": 5,
+        "middle right": 6, "center right": 6, "bottom left": 7,
+        "bottom middle": 8, "bottom center": 8, "bottom right": 9,
+    }
+    move_verbs = re.compile(r"\b(move|go|play|place|put|take|pick|select|choose|mark|claim)\b|^\s*(my move|square|position|cell)\b")
+    game_words = re.compile(r"\b(board|move|moves|square|position|win|winning|turn|game|rules|tic ?tac ?toe|tictactoe|draw)\b")
+    question = re.compile(r"\?\s*$|^\s*(what|where|which|who|why|how|should|can|could|is|are|do|does|show|explain)\b")
+
+    def __init__(self, model: Optional[BagOfWordsModel] = None, threshold: float = 0.9, player: str = "X"):
+        self.model = model
+        self.threshold = threshold
+        self.player = player
+        self.hits = 0
+        self.lookups = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Fraction of inputs answered without the LLM.
+        """
+        return self.hits / self.lookups if self.lookups else 0.0
 
-def response_offtopic_intent(player_prompt: str) -> str:
-    return_prompt = f"""
-    The player prompt was: {player_prompt}
+    def classify(self, player_prompt: str) -> Optional[PlayerIntent]:
+        self.lookups += 1
+        result = self._classify(player_prompt)
+        if result is not None:
+            self.hits += 1
+        logging.debug(f"Fast intent: {result} (hit rate {self.hit_rate:.0%})")
+        return result
 
-    Explain concisely why this prompt is off-topic.
-    """
-    logging.debug(f"Off-topic prompt: {return_prompt}")
+    def parse_square(self, player_prompt: str) -> Optional[int]:
+        """
+        The single square 1-9 the prompt refers to, or None if there is not exactly one.
+        """
+        text = player_prompt.lower()
+        numbers = re.findall(r"\d+", text)
+        if numbers:
+            return int(numbers[0]) if len(numbers) == 1 and 1 <= int(numbers[0]) <= 9 else None
+        for words in sorted(self.square_words, key=len, reverse=True):
+            if re.search(rf"\b{words}\b", text):
+                return self.square_words[words]
+        return None
 
-    response = agent_response(return_prompt)
-    logging.debug(f"Off-topic response: {response}")
-    return response
+    def _classify(self, player_prompt: str) -> Optional[PlayerIntent]:
+        text = player_prompt.strip().lower()
+        if not text:
+            return None
+
+        is_question = bool(self.question.search(text))
+        square = self.parse_square(text)
+
+        if re.fullmatch(r"[1-9]", text):
+            return self._move(square)
+        if square is not None and not is_question and self.move_verbs.search(text):
+            return self._move(square)
+        if is_question and self.game_words.search(text):
+            return PlayerIntent(intent=Intent.discuss, message=player_prompt)
+
+        if self.model is not None:
+            intent, confidence = self.model.predict(text)
+            if intent is not None and confidence >= self.threshold:
+                if intent != Intent.move:
+                    return PlayerIntent(intent=intent, message=player_prompt)
+                if square is not None:
+                    return self._move(square)
+        return None
+
+    def _move(self, square: int) -> PlayerIntent:
+        return PlayerIntent(intent=Intent.move, move=Move(player=self.player, move=square))
 
-def response_discussion_intent(player_prompt: str, board: Result) -> str:
-    return_prompt = f"""
-    {rules_prompt(board) }
 
-    The player prompt was: {player_prompt}
+intent_classifier = IntentClassifier(BagOfWordsModel().train(INTENT_EXAMPLES))
 
-    Draw the board for the player then focus on the game rules and the current board state. What is your response?
+
+def parse_player_input(player_prompt: str) -> Optional[PlayerIntent]:
     """
-    logging.debug(f"Discussion prompt: {return_prompt}")
- 
-    response = agent_response(return_prompt)
-    logging.debug(f"Discussion response: {response}")
-    return response
+    Classify the player input, with the parsed square for moves. Falls back to the
+    LLM when the local classifier is unsure.
+    """
+    fast = intent_classifier.classify(player_prompt)
+    if fast is not None:
+        return fast
+    return llm_player_intent(player_prompt)
 
-def response_move_intent(player_prompt: str, board: Result, max_retries: int = 3, retry_delay: float = 1.0) -> str:
-    move_rules = """
-        You can only pick from the " " list of the current board. What is your next move?
 
-        Return your move as JSON with no markdown. For example, if you want to move to position 1, return {{"move": 1}}.
-"""
-    return_prompt = f"""
-    {rules_prompt(board) }
+def find_player_intent(player_prompt: str, max_retries: int = 2) -> Optional[Intent]:
+    fast = intent_classifier.classify(player_prompt)
+    if fast is not None:
+        return fast.intent
+    player_intent = llm_player_intent(player_prompt, max_retries)
+    return player_intent.intent if player_intent else None
+
+
+INTENT_RULES = f"""
+    {agent_context_prompt.strip()}
 
-    The player prompt was: {player_prompt}
+    Determine the player's intended outcome from their prompt, given last. There are three possible intents:
 
-    {move_rules}    
+    1. "move": The player is making a move on the board. If it is a single number that is the intended move square. Questions are not considered moves. Selecting a square or moving to a square is considered a move.
+    2. "discuss": The player is discussing the game or asking questions. These include questions about where to move next or the current board state.
+    3. "offtopic": The player is discussing something unrelated to the game.
+
+    For a move, also give the square as {{"player": "X", "move": <1-9>}}.
 """
-    logging.debug(f"Move prompt: {return_prompt}")
- 
-    response = agent_response(return_prompt)
-    logging.debug(f"Move response: {response}")
-    return response
 
-    for attempt in range(max_retries):
-        try:
-            response = agent_response(return_prompt).strip()
-            logging.debug(f"Move response: {response}")
+intent_prompt = PromptTemplate(INTENT_RULES, purpose=Purpose.intent)
 
-            # Validate the response
-            if response in Intent.__members__.values():
-                return Move.model_validate_json(response)
-            else:
-                logging.warning(f"Invalid response from agent: '{response}'. Retrying... ({attempt+1}/{max_retries})")
 
-        except ValidationError as e:
-            logging.error(f"Error parsing intent: {e}. Retrying... ({attempt+1}/{max_retries})")
+def llm_player_intent(player_prompt: str, max_retries: int = 2) -> Optional[PlayerIntent]:
+    """
+    Ask the LLM for the intent. The PlayerIntent schema is the output format, so
+    the answer is always a valid intent; None only when the call itself fails.
+    """
+    try:
+        player_intent = intent_prompt.structured(ai_model, PlayerIntent, f"prompt: {player_prompt}", max_retries=max_retries)
+    except (ConnectionError, ResponseError, StreamValidationError) as e:
+        logging.error(f"Error getting intent: {e}")
+        return None
+    logging.debug(f"Intent prompt cache: {intent_prompt.stats}")
+
+    if player_intent.move is not None:
+        # Only the square is taken from the LLM; the player is always X.
+        square = player_intent.move.move
+        player_intent.move = Move(player="X", move=square) if 1 <= square <= 9 else None
+    player_intent.message = player_prompt
+    return player_intent
+
+def game_response(*parts: str) -> str:
+    response = game_prompt.response(ai_model, *parts)
+    logging.debug(f"Game prompt cache: {game_prompt.stats}")
+    return response
 
-        time.sleep(retry_delay)  # Wait before retrying
+def response_offtopic_intent(player_prompt: str) -> str:
+    logging.debug(f"Off-topic prompt: {player_prompt}")
+    response = game_response("Explain concisely why the player's prompt below is off-topic.", f"The player prompt was: {player_prompt}")
+    logging.debug(f"Off-topic response: {response}")
+    return response
 
-    logging.error("All retries failed. Returning None.")
-    return None
+def response_discussion_intent(player_prompt: str, board: Result) -> str:
+    logging.debug(f"Discussion prompt: {player_prompt}")
+    response = game_response(
+        "Draw the board for the player then focus on the game rules and the current board state to answer the player's prompt below.",
+        rules_prompt(board),
+        f"The player prompt was: {player_prompt}",
+    )
+    logging.debug(f"Discussion response: {response}")
+    return response
+
+def response_move_intent(player_prompt: str, board: Result) -> Move:
+    """
+    The O agent's move. It comes from the precomputed solver, so it is instant
+    and always legal; the LLM is only used for flavor text (response_move_flavor).
+    """
+    move = solver_move(board)
+    logging.debug(f"Move response: {move}")
+    return move
+
+def response_move_flavor(player_prompt: str, board: Result, move: Move) -> str:
+    logging.debug(f"Move flavor prompt: {player_prompt}")
+    response = game_response(
+        "You have decided on your move, given last. In one or two sentences, taunt or encourage the player about this move. Do not pick a different square.",
+        rules_prompt(board),
+        f"The player prompt was: {player_prompt}",
+        f"Your move: {move.move}",
+    )
+    logging.debug(f"Move flavor response: {response}")
+    return response
 
 situation_player_move = """
     You are playing as X. What is your move?
 
     - Analyze the current board state.
     - Make your move.
-    - Return your move as JSON without any markdown. For example, {{"player": "X", "move": 1}}.
 """
 
 situation_agent_move = """
@@ -200,78 +391,57 @@ situation_agent_move = """
 
     - Analyze the current board state.
     - Make your move.
-    - Return your move as JSON without any markdown. For example, {{"player": "O", "move": 1}}.
 """
 
-def agent_prompt(situation: str, board: Result) -> str:
-    board_json = board.model_dump_json()
-
-    rules_prompt = f"""
-    You are a Tic Tac Toe agent playing interactively with a human player. The human player goes firth and is always "X" and you are always "O". The board has values from 1 to 9.
-
-    The possible winning conditions are:
-    [1, 2, 3], [4, 5, 6], [7, 8, 9], [1, 4, 7], [2, 5, 8], [3, 6, 9], [1, 5, 9], [3, 5, 7]
-
-    The board is represented as a dictionary:
-    {{"X": [positions occupied by X], "O": [positions occupied by O], "empty": [positions that are still empty]}}.
-
-    The game flow:
-    1. The human player (O) makes the first move by providing a position (1-9) from the " " list.
-    2. You (X) respond with your move, always picking from the " " list.
-    3. The game alternates between the human player and you until there is a winner or the game ends in a draw.
-
-    Rules:
-    - You must only pick moves from the "empty" list.
-    - You must always prioritize winning if possible.
-    - If you cannot win in this move, block the opponent if they are about to win.
-    - Otherwise, choose the best available position strategically.
-
-    The board is currently:
-    {board_json}
+def agent_prompt(situation: str, board: Result) -> tuple[str, str]:
     """
+    The parts of a move request that follow GAME_RULES: the situation, then the board.
+    """
+    return situation, rules_prompt(board)
 
-    return f"""
-    {rules_prompt}
-
-    Current board is:
-    {board.print_board()}
+def llm_move(board: Result, player: str = "O", max_retries: int = 2) -> Optional[Move]:
     """
+    Ask the LLM for a move, constrained to the Move schema. Returns None if the
+    call fails or the move is not on an empty square.
+    """
+    situation = situation_agent_move if player == "O" else situation_player_move
+    try:
+        move = game_prompt.structured(ai_model, Move, *agent_prompt(situation, board), max_retries=max_retries)
+    except (ConnectionError, ResponseError, StreamValidationError) as e:
+        logging.error(f"Error getting move: {e}")
+        return None
 
-def agent_iterator(content: str) -> Iterator[str]:
-    """Generator that yields streamed messages from the chat model."""
-    user_message = {
-        'role': 'user',
-        'content': content,
-    }
+    logging.debug(f"LLM move: {move}")
+    if move.move not in board.empty:
+        return None
+    return Move(player=player, move=move.move)
 
-    stream = chat(
-        model='llama3.2',
-        messages=[user_message],
-        stream=True,
+def agent_iterator(content: str, purpose: Optional[Purpose] = None) -> Iterator[str]:
+    """Generator that yields streamed messages from the chat model."""
+    user_message = Message(
+        role='user',
+        content=content,
     )
 
+    stream = ai_model.chat([user_message], purpose=purpose)
+
     for chunk in stream:
         yield chunk['message']['content']
 
 
-def agent_response(content: str) -> str:
+def agent_response(content: str, purpose: Optional[Purpose] = None) -> str:
     """Collects the output of agent_call_iterator into a single string."""
-    return "".join(agent_iterator(content))
+    return "".join(agent_iterator(content, purpose))
 
 
-def print_agent_call(content: str):
-    user_message = {
-        'role': 'user',
-        'content': content,
-    }
-
-
-    stream = chat(
-        model='llama3.2',
-        messages=[user_message],
-        stream=True,
+def print_agent_call(content: str, purpose: Optional[Purpose] = None):
+    user_message = Message(
+        role='user',
+        content=content,
     )
 
+    stream = ai_model.chat([user_message], purpose=purpose)
+
     for chunk in stream:
         print(chunk['message']['content'], end='', flush=True)
 
@@ -344,21 +514,348 @@ class TicTacToe:
     #        if i < 6:
     #            print("-" * 10)
 
-def game_agent():
-    game = TicTacToe()
+
+WINNING_COMBINATIONS = [
+    [0, 1, 2], [3, 4, 5], [6, 7, 8],  # Rows
+    [0, 3, 6], [1, 4, 7], [2, 5, 8],  # Columns
+    [0, 4, 8], [2, 4, 6]             # Diagonals
+]
+
+# Bit i of a side's board is set when that side occupies square i + 1.
+WIN_MASKS = tuple(sum(1 << i for i in combo) for combo in WINNING_COMBINATIONS)
+FULL_BOARD = 0x1FF
+
+# IS_WIN[b] tells whether the 9-bit board b contains a winning line.
+IS_WIN = np.array([any(b & mask == mask for mask in WIN_MASKS) for b in range(FULL_BOARD + 1)], dtype=bool)
+_IS_WIN = tuple(bool(win) for win in IS_WIN)
+
+
+def squares(bits: int) -> list[int]:
+    """Squares (1-9) set in a 9-bit board."""
+    return [i + 1 for i in range(9) if bits >> i & 1]
+
+
+class BitboardTicTacToe:
+    """
+    Same rules and Result model as TicTacToe, but each side is a 9-bit integer and
+    wins are a table lookup. The Result is only built when get_result or play is
+    called; apply is the allocation free path for self-play.
+    """
+    def __init__(self, x: int = 0, o: int = 0):
+        self.x = x
+        self.o = o
+        self.players = ["X", "O"]
+
+    @property
+    def turn(self) -> int:
+        return (self.x | self.o).bit_count()
+
+    @property
+    def board(self) -> list[str]:
+        return ["X" if self.x >> i & 1 else "O" if self.o >> i & 1 else " " for i in range(9)]
+
+    def validate_move(self, move: Move) -> str:
+        if move.player not in self.players:
+            return "Invalid player."
+        if move.move < 1 or move.move > 9:
+            return "Move must be between 1 and 9."
+        if (self.x | self.o) >> (move.move - 1) & 1:
+            return "Cell is already occupied."
+        if self.players[self.turn % 2] != move.player:
+            return "Not your turn."
+        return ""
+
+    def update_board(self, move: Move):
+        self.apply(move.move)
+
+    def apply(self, square: int):
+        """Play square (1-9) for whoever is on turn, without validation."""
+        if self.turn % 2 == 0:
+            self.x |= 1 << (square - 1)
+        else:
+            self.o |= 1 << (square - 1)
+
+    def check_winner(self) -> Optional[str]:
+        if _IS_WIN[self.x]:
+            return "X"
+        if _IS_WIN[self.o]:
+            return "O"
+        return None
+
+    def get_result(self, error: str = "") -> Result:
+        winner = self.check_winner() if not error else None
+        return Result(
+            X=squares(self.x),
+            O=squares(self.o),
+            empty=squares(FULL_BOARD & ~(self.x | self.o)),
+            winner=winner if winner else " ",
+            error=error
+        )
+
+    def play(self, move: Move) -> Result:
+        error = self.validate_move(move)
+        if error:
+            return self.get_result(error)
+
+        self.update_board(move)
+        return self.get_result()
+
+
+def batch_winners(x: np.ndarray, o: np.ndarray) -> np.ndarray:
+    """
+    Evaluate many boards at once. x and o are uint16 arrays of 9-bit boards; the
+    result is 0 for no winner, 1 when X has won and 2 when O has won.
+    """
+    x = np.asarray(x, dtype=np.uint16)
+    o = np.asarray(o, dtype=np.uint16)
+    winners = np.zeros(x.shape, dtype=np.int8)
+    winners[IS_WIN[o]] = 2
+    winners[IS_WIN[x]] = 1
+    return winners
+
+
+def batch_random_games(n: int, seed: Optional[int] = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Play n games of random moves side by side. Returns the final X boards, O
+    boards and winners (see batch_winners; 0 at the end of a game means a draw).
+    """
+    rng = np.random.default_rng(seed)
+    order = np.argsort(rng.random((n, 9)), axis=1)
+    x = np.zeros(n, dtype=np.uint16)
+    o = np.zeros(n, dtype=np.uint16)
+    winners = np.zeros(n, dtype=np.int8)
+
+    for step in range(9):
+        active = winners == 0
+        bits = np.left_shift(1, order[:, step]).astype(np.uint16)
+        if step % 2 == 0:
+            x = np.where(active, x | bits, x)
+            winners[active & IS_WIN[x]] = 1
+        else:
+            o = np.where(active, o | bits, o)
+            winners[active & IS_WIN[o]] = 2
+    return x, o, winners
+
+
+# Every symmetry of the board (4 rotations, each optionally mirrored) as a square permutation.
+_ROTATE = [6, 3, 0, 7, 4, 1, 8, 5, 2]
+_MIRROR = [2, 1, 0, 5, 4, 3, 8, 7, 6]
+
+
+def _symmetries() -> list[list[int]]:
+    perms = []
+    perm = list(range(9))
+    for _ in range(4):
+        perms.append(perm)
+        perms.append([_MIRROR[i] for i in perm])
+        perm = [_ROTATE[i] for i in perm]
+    return perms
+
+
+SYMMETRIES = _symmetries()
+# SYM_TABLE[s][b] is board b with symmetry s applied.
+SYM_TABLE = [[sum(1 << perm[i] for i in range(9) if b >> i & 1) for b in range(FULL_BOARD + 1)] for perm in SYMMETRIES]
+MOVE_ORDER = [4, 0, 2, 6, 8, 1, 3, 5, 7]  # Center, corners, edges
+# Bump when the solver or the cache file format changes, so old files are rebuilt.
+SOLVER_VERSION = 1
+# The solution is cached next to this module unless TICTACTOE_CACHE_DIR names another directory.
+SOLVER_CACHE_DIR = os.environ.get("TICTACTOE_CACHE_DIR") or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache")
+SOLVER_CACHE_PATH = os.path.join(SOLVER_CACHE_DIR, "tictactoe_solution.json")
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+def canonical(x: int, o: int) -> tuple[int, int]:
+    """
+    The canonical key of a position under the 8 symmetries and the index of the
+    symmetry that maps the position onto it.
+    """
+    return min(((SYM_TABLE[s][x] << 9) | SYM_TABLE[s][o], s) for s in range(8))
+
+
+def negamax(me: int, opp: int, alpha: int, beta: int, table: dict) -> int:
+    """
+    Score of the position for the side to move (me): 10 - plies for a win,
+    the negative of that for a loss, 0 for a draw. table is the transposition
+    table, keyed on the canonical position.
+    """
+    occupied = me | opp
+    if _IS_WIN[opp]:
+        return occupied.bit_count() - 10
+    if occupied == FULL_BOARD:
+        return 0
+
+    key = canonical(me, opp)[0]
+    entry = table.get(key)
+    if entry is not None:
+        value, flag = entry
+        if flag == EXACT:
+            return value
+        if flag == LOWER:
+            alpha = max(alpha, value)
+        else:
+            beta = min(beta, value)
+        if alpha >= beta:
+            return value
+
+    alpha_orig = alpha
+    best = -100
+    for square in MOVE_ORDER:
+        bit = 1 << square
+        if occupied & bit:
+            continue
+        best = max(best, -negamax(opp, me | bit, -beta, -alpha, table))
+        alpha = max(alpha, best)
+        if alpha >= beta:
+            break
+
+    flag = UPPER if best <= alpha_orig else LOWER if best >= beta else EXACT
+    table[key] = (best, flag)
+    return best
+
+
+def search_best_move(x: int, o: int, table: Optional[dict] = None) -> tuple[int, int]:
+    """
+    Search a position from scratch. Returns (score for the side to move, square index 0-8).
+    """
+    table = {} if table is None else table
+    me, opp = (x, o) if (x | o).bit_count() % 2 == 0 else (o, x)
+    alpha, beta = -100, 100
+    best_square = -1
+    for square in MOVE_ORDER:
+        bit = 1 << square
+        if (me | opp) & bit:
+            continue
+        value = -negamax(opp, me | bit, -beta, -alpha, table)
+        if value > alpha:
+            alpha, best_square = value, square
+    return alpha, best_square
+
+
+def build_solution() -> dict[int, tuple[int, int]]:
+    """
+    Solve every reachable, unfinished position once. The result maps each
+    canonical key to (score, square index in the canonical orientation).
+    """
+    solution = {}
+    table = {}
+    frontier = [(0, 0)]
+    while frontier:
+        x, o = frontier.pop()
+        key, s = canonical(x, o)
+        if key in solution:
+            continue
+        cx, co = SYM_TABLE[s][x], SYM_TABLE[s][o]
+        solution[key] = search_best_move(cx, co, table)
+
+        x_to_move = (cx | co).bit_count() % 2 == 0
+        for square in range(9):
+            bit = 1 << square
+            if (cx | co) & bit:
+                continue
+            nx, no = (cx | bit, co) if x_to_move else (cx, co | bit)
+            if not (_IS_WIN[nx] or _IS_WIN[no] or (nx | no) == FULL_BOARD):
+                frontier.append((nx, no))
+    return solution
+
+
+def load_solution(path: str = SOLVER_CACHE_PATH) -> dict[int, tuple[int, int]]:
+    """
+    Load the solved game from path, building and saving it if the file is missing,
+    unreadable or written by another SOLVER_VERSION.
+    """
+    try:
+        with open(path, "r") as file:
+            cached = json.load(file)
+        if cached.get("version") == SOLVER_VERSION:
+            return {int(key): tuple(value) for key, value in cached["solution"].items()}
+    except (OSError, ValueError, KeyError, AttributeError):
+        pass
+
+    solution = build_solution()
+    tmp_path = path + ".tmp"
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(tmp_path, "w") as file:
+            json.dump({"version": SOLVER_VERSION, "solution": solution}, file)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Could not cache the tic tac toe solution: {e}")
+    return solution
+
+
+_solution: Optional[dict[int, tuple[int, int]]] = None
+
+
+def get_solution() -> dict[int, tuple[int, int]]:
+    """
+    The solved game, loaded (or built) on first use rather than on import.
+    """
+    global _solution
+    if _solution is None:
+        _solution = load_solution()
+    return _solution
+
+
+def best_move(x: int, o: int) -> Optional[int]:
+    """
+    Best square (1-9) for the side to move, or None if the game is over.
+    """
+    key, s = canonical(x, o)
+    entry = get_solution().get(key)
+    if entry is None:
+        return None
+    return SYMMETRIES[s].index(entry[1]) + 1
+
+
+def solver_move(board: Result) -> Optional[Move]:
+    x = sum(1 << (i - 1) for i in board.X)
+    o = sum(1 << (i - 1) for i in board.O)
+    square = best_move(x, o)
+    if square is None:
+        return None
+    return Move(player="X" if len(board.X) == len(board.O) else "O", move=square)
+
+
+def game_over(result: Result) -> bool:
+    if result.winner != " ":
+        print(f"Game over! Winner: {result.winner}")
+        return True
+    if not result.empty:
+        print("Game over! It's a draw.")
+        return True
+    return False
+
+
+def game_agent(flavor: bool = False, llm_moves: bool = False):
+    game = BitboardTicTacToe()
 
     while True:
         result = game.get_result()
+        if game_over(result):
+            break
 
         prompt = input("> ")
-        intent = find_player_intent(prompt)
+        player_intent = parse_player_input(prompt)
+        intent = player_intent.intent if player_intent else None
         if intent == Intent.move:
-            move = Move(player="X", move=5)
-            result = game.play(move)
+            if player_intent.move is None:
+                print("Which square (1-9) do you want to move to?")
+                continue
+            result = game.play(player_intent.move)
             if result.error:
                 print(f"Error: {result.error}")
                 continue
             print(result.print_board())
+            if result.winner != " " or not result.empty:
+                continue
+
+            agent_move = (llm_move(result) if llm_moves else None) or response_move_intent(prompt, result)
+            if flavor:
+                print(response_move_flavor(prompt, result, agent_move))
+            result = game.play(agent_move)
+            print(f"O moves to {agent_move.move}")
+            print(result.print_board())
         elif intent == Intent.discuss:
             print(response_discussion_intent(prompt, result))
             continue
@@ -367,7 +864,7 @@ def game_agent():
 
 
 def game_manual():
-    game = TicTacToe()
+    game = BitboardTicTacToe()
     player = 0
     while True:
         # Check if there is a winner or a draw
@@ -403,14 +900,21 @@ def game_manual():
 def main():
     parser = argparse.ArgumentParser(description="Tic Tac Toe Game")
     parser.add_argument("--manual", action="store_true", help="Play in manual mode (two players)")
+    parser.add_argument("--flavor", action="store_true", help="Let the LLM comment on the agent's moves")
+    parser.add_argument("--llm-moves", action="store_true", help="Let the LLM pick the agent's moves, falling back to the solver")
+    parser.add_argument("--metrics", help="Write LLM call metrics to this file at the end (JSON for .json, Prometheus text otherwise)")
     args = parser.parse_args()
 
     mode = "manual" if args.manual else "agent"
     print(f"Starting Tic Tac Toe in {mode} mode.")
-    if mode == "manual":
-        game_manual()
-    else:
-        game_agent()
+    try:
+        if mode == "manual":
+            game_manual()
+        else:
+            game_agent(flavor=args.flavor, llm_moves=args.llm_moves)
+    finally:
+        if args.metrics:
+            ai_model.metrics.dump(args.metrics)
 
 
 if __name__ == "__main__":